@@ -0,0 +1,2 @@
+from .market import *  # noqa
+from .runner import *  # noqa
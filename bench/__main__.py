@@ -0,0 +1,65 @@
+from typing import List
+
+import typer
+
+from .market import generate_market
+from .runner import run_benchmarks
+from .runner import write_report
+
+cli = typer.Typer()
+
+
+@cli.command()
+def run(
+    tokens: int = 7,
+    pools: int = 100,
+    pools_per_pair: int = 4,
+    multi_token_ratio: float = 0.1,
+    seed: int = 0,
+    max_hop: List[int] = typer.Option([3, 4]),
+    optimal_lv: List[int] = typer.Option([2, 5]),
+    mode: List[str] = typer.Option(["grid", "water_fill"]),
+    amount_usd: float = 10_000,
+    max_routes: int = 4,
+    iterations: int = 20,
+    output: str = "bench_output.json",
+):
+    market = dict(
+        token_count=tokens,
+        pool_count=pools,
+        pools_per_pair=pools_per_pair,
+        multi_token_ratio=multi_token_ratio,
+        seed=seed,
+    )
+    dexes = generate_market(**market)
+
+    def log(record):
+        case = f"hop={record['max_hop']} lv={record.get('optimal_lv', '-')}"
+        case += f" {record.get('mode', '')}"
+
+        if record.get("skipped"):
+            typer.echo(f"{record['stage']:<32} {case:<24} skipped")
+            return
+
+        typer.echo(
+            f"{record['stage']:<32} {case:<24} p50={record['p50_ms']:.3f}ms "
+            f"p99={record['p99_ms']:.3f}ms {record['throughput_ops']:.1f}/s "
+            f"peak={record['peak_memory_kib']:.0f}KiB"
+        )
+
+    records = run_benchmarks(
+        dexes,
+        max_hops=max_hop,
+        optimal_lvs=optimal_lv,
+        modes=mode,  # type: ignore
+        amount_usd=amount_usd,
+        max_routes=max_routes,
+        iterations=iterations,
+        log=log,
+    )
+    write_report(output, records, market=market, iterations=iterations)
+    typer.echo(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    cli()
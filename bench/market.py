@@ -0,0 +1,72 @@
+from random import Random
+from typing import Dict
+from typing import List
+from typing import Tuple
+
+from sor import Dex
+from sor import Pool
+from sor import PoolToken
+from sor import Token
+from sor import Tokens
+from sor import TokenUnitPrices
+
+
+def generate_market(
+    token_count=len(Tokens),
+    pool_count=100,
+    pools_per_pair=4,
+    multi_token_ratio=0.1,
+    dex_count=4,
+    seed=0,
+) -> List[Dex]:
+    """Seeded synthetic market: pools spread over random token pairs (or triples) with
+    log-uniform liquidity, at most `pools_per_pair` pools on the same set of tokens.
+    Pool prices deviate a little from the reference USD prices
+    """
+    if not 2 <= token_count <= len(Tokens):
+        raise ValueError(f"token_count must be within [2, {len(Tokens)}]")
+
+    rng = Random(seed)
+    tokens: List[Token] = rng.sample(sorted(Tokens), token_count)
+    dexes = [
+        Dex(name=f"dex{i}", pools=[], gas=round(rng.uniform(0.1, 0.5), 2))
+        for i in range(dex_count)
+    ]
+    pairs_count: Dict[Tuple[Token, ...], int] = {}
+
+    for idx in range(pool_count):
+        size = 3 if token_count > 2 and rng.random() < multi_token_ratio else 2
+        pool_tokens = tuple(sorted(rng.sample(tokens, size)))
+
+        if pairs_count.get(pool_tokens, 0) >= pools_per_pair:
+            continue
+
+        pairs_count[pool_tokens] = pairs_count.get(pool_tokens, 0) + 1
+        liquidity = 10 ** rng.uniform(3, 7)
+        reserves = [
+            PoolToken(
+                token=token,
+                amount=liquidity / TokenUnitPrices[token].value * rng.uniform(0.95, 1.05),
+                weight=None,
+            )
+            for token in pool_tokens
+        ]
+        fee = rng.choice([0.0005, 0.003, 0.01])
+        pool = Pool(f"pool{idx}", fee, reserves)
+        rng.choice(dexes).pools.append(pool)
+
+    return [dex for dex in dexes if dex.pools]
+
+
+def busiest_pair(dexes: List[Dex]) -> Tuple[Token, Token]:
+    """The token pair with the most pools"""
+    counts: Dict[Tuple[Token, ...], int] = {}
+
+    for dex in dexes:
+        for pool in dex.pools:
+            if len(pool.tokens) == 2:
+                pair = tuple(sorted(t.token for t in pool.tokens))
+                counts[pair] = counts.get(pair, 0) + 1
+
+    token_in, token_out = max(counts, key=lambda pair: counts[pair])
+    return token_in, token_out
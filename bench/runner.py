@@ -0,0 +1,163 @@
+import json
+import platform
+import tracemalloc
+from datetime import datetime
+from datetime import timezone
+from statistics import mean
+from time import perf_counter
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+from sor import calc_amount_out_on_multi_routes
+from sor import construct_path
+from sor import determine_token_pair_pools
+from sor import Dex
+from sor import find_routes
+from sor import map_pool_by_name
+from sor import SplitMode
+from sor import TokenUnitPrices
+
+from .market import busiest_pair
+
+Record = Dict[str, Any]
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def measure(f: Callable[[], Any], iterations=20) -> Record:
+    """Latency percentiles & throughput over `iterations` calls, then the peak memory
+    of one more traced call (tracing is kept out of the timed calls)
+    """
+    latencies = []
+
+    for _ in range(iterations):
+        start = perf_counter()
+        f()
+        latencies.append(perf_counter() - start)
+
+    tracemalloc.start()
+    f()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": mean(latencies) * 1000,
+        "throughput_ops": iterations / sum(latencies) if sum(latencies) else 0,
+        "peak_memory_kib": peak / 1024,
+    }
+
+
+def grid_size(split_count: int, optimal_lv: int) -> int:
+    """Upper bound of the splits `batch_split` enumerates"""
+    return (optimal_lv + 1) ** max(split_count - 1, 0)
+
+
+def run_benchmarks(
+    dexes: List[Dex],
+    max_hops: Sequence[int] = (3, 4),
+    optimal_lvs: Sequence[int] = (2, 5),
+    modes: Sequence[SplitMode] = ("grid", "water_fill"),
+    amount_usd=10_000,
+    max_routes=4,
+    max_candidates=200_000,
+    iterations=20,
+    log: Optional[Callable[[Record], None]] = None,
+) -> List[Record]:
+    """Time find_routes, Edge.swap, Route.swap & calc_amount_out_on_multi_routes on the
+    busiest pair of the market. Cases whose split grid exceeds `max_candidates` are
+    recorded as skipped instead of being run
+    """
+    pools, pool_map = map_pool_by_name(dexes)
+    token_pairs_pools = determine_token_pair_pools(dexes)
+    token_in, token_out = busiest_pair(dexes)
+    amount_in = amount_usd / TokenUnitPrices[token_in].value
+    direct_edge = construct_path([token_in, token_out], token_pairs_pools, pool_map).edges[0]
+    records: List[Record] = []
+
+    def record(stage: str, f: Callable[[], Any], **params):
+        result: Record = {"stage": stage, "pair": f"{token_in}->{token_out}", **params}
+        if params.get("candidates", 0) > max_candidates:
+            result.update({"skipped": True})
+        else:
+            result.update(measure(f, iterations=iterations))
+
+        records.append(result)
+
+        if log:
+            log(result)
+
+    for max_hop in max_hops:
+
+        def trace_routes():
+            return find_routes(
+                token_in, token_out, pools, token_pairs_pools, pool_map, max_hop
+            )
+
+        routes = trace_routes()
+        record("find_routes", trace_routes, max_hop=max_hop, routes=len(routes))
+
+        # NOTE: the multi-route grid is exponential in the number of routes
+        routes = sorted(routes, key=lambda r: len(r.edges))[:max_routes]
+        widest = max(len(e.pools) for r in routes for e in r.edges)
+
+        for optimal_lv in optimal_lvs:
+            for mode in modes:
+                params = dict(max_hop=max_hop, optimal_lv=optimal_lv, mode=mode)
+                edge_candidates = 0 if mode == "water_fill" else grid_size(widest, optimal_lv)
+
+                if max_hop == max_hops[0]:
+                    record(
+                        "Edge.swap",
+                        lambda: direct_edge.swap(amount_in, optimal_lv=optimal_lv, mode=mode),
+                        pools=len(direct_edge.pools),
+                        candidates=edge_candidates,
+                        **params,
+                    )
+
+                record(
+                    "Route.swap",
+                    lambda: routes[-1].swap(amount_in, optimal_lv=optimal_lv, mode=mode),
+                    route=str(routes[-1]),
+                    candidates=edge_candidates,
+                    **params,
+                )
+                record(
+                    "calc_amount_out_on_multi_routes",
+                    lambda: calc_amount_out_on_multi_routes(
+                        routes,
+                        amount_in,
+                        optimal_lv=optimal_lv,
+                        mode=mode,
+                    ),
+                    routes=len(routes),
+                    candidates=grid_size(len(routes), optimal_lv) + edge_candidates,
+                    **params,
+                )
+
+    return records
+
+
+def write_report(path: str, records: List[Record], **meta):
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            **meta,
+        },
+        "results": records,
+    }
+
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
@@ -1,4 +1,8 @@
 import asyncio
+import json
+import sys
+from time import perf_counter
+from typing import Optional
 
 import typer
 
@@ -6,6 +10,10 @@ from repos import PolygonPoolRepository
 from repos import Redis
 from settings import Settings
 from settings import settings
+from sor import follow
+from sor import load_router
+from sor import quote_batch as quote_lines
+from sor import summarize
 
 cli = typer.Typer()
 
@@ -25,6 +33,53 @@ def keys():
     print(pools)
 
 
+@cli.command()
+def subscribe(snapshot: str, channel: str = "pools"):
+    """Keep a router warm-started from SNAPSHOT fresh with the events of CHANNEL"""
+    assert redis
+    assert loop
+    router = load_router(snapshot)
+    applied = loop.run_until_complete(follow(router, redis.subscribe(channel)))
+    print(f"{applied} events applied, graph version {router.graph.version}")
+
+
+@cli.command()
+def quote_batch(
+    snapshot: str,
+    input: str = "requests.jsonl",
+    output: str = "-",
+    workers: Optional[int] = None,
+    chunksize: int = 32,
+    max_hop: int = 3,
+    optimal_lv: int = 5,
+):
+    """Quote the JSONL requests of INPUT on every core, results are written to OUTPUT
+    (stdout by default) in input order, the summary goes to stderr
+    """
+    latencies = []
+    errors = 0
+    start = perf_counter()
+    options = dict(max_hop=max_hop, optimal_lv=optimal_lv)
+
+    out = open(output, "w") if output != "-" else sys.stdout
+
+    try:
+        with open(input) as lines:
+            for result, elapsed in quote_lines(lines, snapshot, workers, chunksize, **options):
+                out.write(result + "\n")
+
+                if elapsed is None:
+                    errors += 1
+                else:
+                    latencies.append(elapsed)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    summary = summarize(latencies, perf_counter() - start, errors)
+    typer.echo(json.dumps(summary), err=True)
+
+
 def startup(settings: Settings):
     global redis, pool_repo_polygon
     redis = Redis.init(settings.REDIS_HOST)
@@ -1,21 +1,34 @@
+from typing import Optional
+
 from repos.redis import Redis
 
 
 class PolygonPoolRepository:
-    def __init__(self, redis: Redis):
+    def __init__(self, redis: Redis, batch_size=500, concurrency=4):
         self._r = redis
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+
+    async def read_pools(self, limit: Optional[int] = None):
+        """Read the pools of every pair key, or of the first `limit` keys"""
+        keys = await self._r.scan_keys(":pairs:0x*")
+
+        if limit is not None:
+            keys = keys[:limit]
 
-    async def read_pools(self):
-        keys = await self._r.get_all_keys(":pairs:0x*")
+        pools_by_key = await self._r.get_keys_pipelined(
+            keys,
+            batch_size=self.batch_size,
+            concurrency=self.concurrency,
+        )
 
         pools = []
 
-        for key in keys[:10]:
+        for key in keys:
             tokens = set(key[7:].split("-"))
-            pool_addresses = await self._r.get_key(key)
             pairs_pools = []
 
-            for address in pool_addresses:
+            for address in pools_by_key[key]:
                 pairs_pools.append({address: tokens})
 
             pools += pairs_pools
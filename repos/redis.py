@@ -1,3 +1,6 @@
+import asyncio
+from typing import AsyncIterator
+from typing import Dict
 from typing import List
 
 from aioredis import from_url
@@ -20,3 +23,77 @@ class Redis:
     async def get_key(self, key: str) -> List[str]:
         data = await self._r.zrange(key, 0, -1)
         return data
+
+    async def scan_keys(self, pattern: str, count=1000) -> List[str]:
+        """Incremental `SCAN` instead of `KEYS`, the server is never blocked on a full
+        keyspace walk. A key may be returned twice by SCAN, so the result is deduplicated
+        """
+        keys: Dict[str, None] = {}
+
+        async for key in self._r.scan_iter(match=pattern, count=count):
+            keys[key] = None
+
+        return list(keys)
+
+    async def get_keys_pipelined(
+        self,
+        keys: List[str],
+        batch_size=500,
+        concurrency=4,
+    ) -> Dict[str, List[str]]:
+        """`ZRANGE` every key, one pipeline (one round-trip) per batch of keys,
+        at most `concurrency` pipelines in flight
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch(batch: List[str]) -> List[List[str]]:
+            async with semaphore:
+                async with self._r.pipeline(transaction=False) as pipe:
+                    for key in batch:
+                        pipe.zrange(key, 0, -1)
+
+                    return await pipe.execute()
+
+        bounds = [(start, start + batch_size) for start in range(0, len(keys), batch_size)]
+        batches = [keys[start:end] for start, end in bounds]
+        results = await asyncio.gather(*(fetch(batch) for batch in batches))
+        return {
+            key: data
+            for batch, result in zip(batches, results)
+            for key, data in zip(batch, result)
+        }
+
+    async def subscribe(self, channel: str) -> AsyncIterator[str]:
+        """Messages published on a pub/sub `channel`, from now on"""
+        pubsub = self._r.pubsub()
+        await pubsub.subscribe(channel)
+
+        try:
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    yield message["data"]
+        finally:
+            await pubsub.unsubscribe(channel)
+
+    async def read_stream(
+        self,
+        stream: str,
+        last_id="$",
+        count=100,
+        block=1000,
+    ) -> AsyncIterator[str]:
+        """`data` field of the entries appended to `stream` after `last_id`.
+        `$` is resolved once to the last entry, later reads go on from the last seen id
+        so entries appended between two reads are not missed
+        """
+        if last_id == "$":
+            last = await self._r.xrevrange(stream, count=1)
+            last_id = last[0][0] if last else "0-0"
+
+        while True:
+            entries = await self._r.xread({stream: last_id}, count=count, block=block)
+
+            for _, messages in entries or []:
+                for message_id, fields in messages:
+                    last_id = message_id
+                    yield fields["data"]
@@ -1,5 +1,13 @@
+from . import metrics  # noqa
 from .algorithm import *  # noqa
+from .batch import *  # noqa
+from .cache import *  # noqa
 from .core import *  # noqa
 from .models import *  # noqa
+from .parallel import *  # noqa
+from .paths import *  # noqa
 from .preprocess import *  # noqa
+from .rates import *  # noqa
+from .snapshot import *  # noqa
 from .sor import *  # noqa
+from .stream import *  # noqa
@@ -1,113 +1,759 @@
 from __future__ import annotations
 
+from fractions import Fraction
 from functools import cache
+from math import inf
+from math import sqrt
+from typing import Callable
+from typing import Collection
 from typing import Dict
+from typing import FrozenSet
+from typing import Iterable
 from typing import List
+from typing import Mapping
 from typing import Optional
 from typing import Set
 from typing import Tuple
+from typing import Union
 
+import numpy as np
 from pydantic import BaseModel
 from pydantic import validator
 
+from . import metrics
+from .cache import QuoteCache
+from .cache import SwapCache
+from .core import find_minimal_distribution
 from .core import find_optimal_distribution
+from .core import find_optimal_distribution_adaptive
+from .core import find_optimal_distribution_vectorized
+from .core import round_array
+from .core import split_grid
+from .core import SplitMode
+from .core import Splits
+from .models import from_units
 from .models import Pool
+from .models import PoolStateTable
+from .models import SwapOverlay
+from .models import to_units
 from .models import Token
+from .preprocess import PoolChange
+from .preprocess import PoolGraph
+from .preprocess import PoolIds
 from .preprocess import TokenPairsPools
 
 
-PoolMap = Dict[str, Pool]
+PoolMap = Mapping[str, Pool]
 
 
-class PoolSet(BaseModel):
-    pools: Set[str]
+# NOTE: ids of the pools of edges built outside a `PoolGraph`
+POOL_IDS = PoolIds()
 
-    def __init__(self, **kwargs):
-        if not kwargs:
-            return super().__init__(pools=set())
-        return super().__init__(**kwargs)
+
+class PoolSet:
+    """Immutable set of pool names, stored as a bitmask of the ids of a `PoolIds`
+    (the ids of the graph of the pools). Sets of the same ids combine with `union` or `|`
+    """
+
+    __slots__ = ("mask", "ids", "_hash")
+
+    mask: int
+    ids: PoolIds
+
+    def __init__(
+        self, pools: Iterable[str] = (), mask: int = 0, ids: Optional[PoolIds] = None
+    ):
+        ids = POOL_IDS if ids is None else ids
+
+        for name in pools:
+            mask |= 1 << ids.intern(name)
+
+        object.__setattr__(self, "mask", mask)
+        object.__setattr__(self, "ids", ids)
+        object.__setattr__(self, "_hash", hash(mask))
+
+    def __setattr__(self, *_):
+        raise AttributeError("PoolSet is immutable")
 
     def __hash__(self):
-        names = ",".join(sorted(list(self.pools)))
-        return hash(names)
+        return self._hash
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, PoolSet)
+            and self.mask == other.mask
+            and (self.ids is other.ids or not self.mask)
+        )
+
+    def __contains__(self, name: str):
+        idx = self.ids.get(name)
+        return idx is not None and bool(self.mask >> idx & 1)
+
+    def __len__(self):
+        return bin(self.mask).count("1")
+
+    def __or__(self, other: PoolSet) -> PoolSet:
+        return self.union(other)
+
+    def __repr__(self):
+        return f"PoolSet(pools={set(self.pools)})"
+
+    def __reduce__(self):
+        # NOTE: pool ids are per graph & process, pickle the names
+        return PoolSet, (tuple(self.pools),)
+
+    @property
+    def pools(self) -> FrozenSet[str]:
+        mask, names = self.mask, []
+
+        while mask:
+            low = mask & -mask
+            names.append(self.ids.name(low.bit_length() - 1))
+            mask ^= low
+
+        return frozenset(names)
 
     def copy(self):
-        return PoolSet(pools=self.pools.copy())
+        return self
+
+    def union(self, another_poolset: PoolSet) -> PoolSet:
+        """Return the union, leaving both sets untouched"""
+        if not another_poolset.mask or another_poolset == self:
+            return self
+
+        if not self.mask:
+            return another_poolset
+
+        if another_poolset.ids is not self.ids:
+            raise ValueError("PoolSets of pools of different graphs")
+
+        return PoolSet(mask=self.mask | another_poolset.mask, ids=self.ids)
+
+
+EMPTY_POOLSET = PoolSet()
+
+
+def is_cpmm(pool: Pool) -> bool:
+    """Pools still swapping with the plain x*y=k formula of `Pool.swap`"""
+    return type(pool).swap is Pool.swap
+
+
+def water_fill(
+    amount_in: float,
+    token_in: Token,
+    token_out: Token,
+    pools: List[Pool],
+    overlay: Optional[SwapOverlay] = None,
+) -> Tuple[float, Splits]:
+    """Optimal split of amount-in over x*y=k pools, by equalizing their marginal rates.
+
+    With fee-adjusted input g*a, a pool returns y*g*a / (x + g*a) so its marginal rate is
+    g*x*y / (x + g*a)^2. At the optimum every used pool shares the same rate L, which gives
+    a = sqrt(x*y/g) / sqrt(L) - x/g. Pools join by decreasing spot rate g*y/x while their
+    spot rate beats L, so the cost is dominated by the sort.
+    """
+    if amount_in == 0 or not pools:
+        return 0, []
+
+    reserves = []
+
+    for idx, pool in enumerate(pools):
+        pool_token_in = pool.get_token(token_in)
+        pool_token_out = pool.get_token(token_out)
+
+        if not pool.k or not pool_token_in or not pool_token_out or token_in == token_out:
+            continue
+
+        x, y, g = pool_token_in.amount, pool_token_out.amount, 1 - pool.fee
+
+        if overlay is not None:
+            x = overlay.amount(pool.name, pool_token_in)
+            y = overlay.amount(pool.name, pool_token_out)
+
+        if x <= 0 or y <= 0 or g <= 0:
+            continue
+
+        reserves.append((g * y / x, idx, sqrt(x * y / g), x / g))
+
+    if not reserves:
+        return 0, []
+
+    reserves.sort(reverse=True)
+    sum_sqrt, sum_in, active = float(0), float(0), 0
+
+    for spot_rate, _, root, offset in reserves:
+        if active and spot_rate * (amount_in + sum_in) ** 2 <= sum_sqrt**2:
+            # NOTE: the pool's spot rate does not beat the current level
+            break
+
+        sum_sqrt += root
+        sum_in += offset
+        active += 1
+
+    level = (amount_in + sum_in) / sum_sqrt
+    splits = [float(0)] * len(pools)
+
+    for _, idx, root, offset in reserves[:active]:
+        splits[idx] = max(root * level - offset, 0)
+
+    # NOTE: absorb float drifts so the splits add up to amount-in
+    drift = amount_in - sum(splits)
+    top = reserves[0][1]
+    splits[top] = max(splits[top] + drift, 0)
+
+    amount_out = sum(
+        pool.swap(token_in, value, token_out, overlay=overlay)
+        for pool, value in zip(pools, splits)
+        if value
+    )
+    return amount_out, splits
+
+
+def water_fill_mixed(
+    amount_in: float,
+    token_in: Token,
+    token_out: Token,
+    pools: List[Pool],
+    handler: Callable[[float, int], float],
+    optimal_lv=5,
+    overlay: Optional[SwapOverlay] = None,
+) -> Tuple[float, Splits]:
+    """`water_fill` of the x*y=k pools, entering the grid search as a single pool next to
+    the pools of other curves (swapped by `handler(value, idx)`), so the grid only splits
+    between the curves water-filling cannot model
+    """
+    cpmm = [idx for idx, pool in enumerate(pools) if is_cpmm(pool)]
+    others = [idx for idx, pool in enumerate(pools) if not is_cpmm(pool)]
+
+    @cache
+    def fill(value: float) -> Tuple[float, Splits]:
+        return water_fill(value, token_in, token_out, [pools[i] for i in cpmm], overlay)
+
+    def group_handler(value: float, idx: int) -> float:
+        if idx == 0:
+            return fill(value)[0]
+
+        return handler(value, others[idx - 1])
+
+    max_out, group_splits = find_optimal_distribution(
+        amount_in, len(others) + 1, group_handler, optimal_lv=optimal_lv
+    )
+
+    if not group_splits:
+        return max_out, []
+
+    splits = [float(0)] * len(pools)
+
+    for idx, value in zip(cpmm, fill(group_splits[0])[1]):
+        splits[idx] = value
+
+    for idx, value in zip(others, group_splits[1:]):
+        splits[idx] = value
+
+    return max_out, splits
+
+
+def water_fill_fixed(
+    amount_in: int,
+    token_in: Token,
+    token_out: Token,
+    pools: List[Pool],
+    handler: Callable[[float, int], float],
+    optimal_lv=5,
+) -> Tuple[float, Splits]:
+    """`water_fill` (`water_fill_mixed` next to pools of other curves) of integer units:
+    the split is solved in tokens, cut into whole units adding up to amount-in (the largest
+    split takes the remainder) and priced by the integer `handler(value, idx)`
+    """
+    amount = from_units(token_in, amount_in)
+
+    if all(is_cpmm(pool) for pool in pools):
+        _, token_splits = water_fill(amount, token_in, token_out, pools)
+    else:
+
+        def token_handler(value: float, idx: int) -> float:
+            return from_units(token_out, int(handler(to_units(token_in, value), idx)))
+
+        _, token_splits = water_fill_mixed(
+            amount, token_in, token_out, pools, token_handler, optimal_lv
+        )
+
+    if not token_splits:
+        return 0, []
+
+    splits: Splits = [to_units(token_in, value) for value in token_splits]
+    top = max(range(len(splits)), key=splits.__getitem__)
+    splits[top] += amount_in - sum(splits)
+    return sum(handler(value, idx) for idx, value in enumerate(splits) if value), splits
+
+
+def water_fill_many(
+    amounts_in: np.ndarray,
+    token_in: Token,
+    token_out: Token,
+    pools: List[Pool],
+) -> np.ndarray:
+    """`water_fill` of an array of amount-in, the amount-out of each.
+    Pools join in the same order for every amount, so the active pools of an amount are
+    the ones before the first pool failing its join test
+    """
+    amount_out = np.zeros(len(amounts_in))
+    reserves = []
+
+    for pool in pools:
+        pool_token_in = pool.get_token(token_in)
+        pool_token_out = pool.get_token(token_out)
+
+        if not pool.k or not pool_token_in or not pool_token_out or token_in == token_out:
+            continue
+
+        x, y, g = pool_token_in.amount, pool_token_out.amount, 1 - pool.fee
+
+        if x <= 0 or y <= 0 or g <= 0:
+            continue
+
+        reserves.append((g * y / x, sqrt(x * y / g), x / g, pool))
+
+    if not reserves:
+        return amount_out
+
+    reserves.sort(key=lambda r: r[0], reverse=True)
+    spot_rates = np.array([r[0] for r in reserves])
+    roots = np.array([r[1] for r in reserves])
+    offsets = np.array([r[2] for r in reserves])
+    sum_sqrt = np.concatenate([[0], np.cumsum(roots)])
+    sum_in = np.concatenate([[0], np.cumsum(offsets)])
+
+    joins = spot_rates * (amounts_in[:, None] + sum_in[:-1]) ** 2 > sum_sqrt[:-1] ** 2
+    joins[:, 0] = True
+    active = np.where(joins.all(axis=1), len(reserves), np.argmin(joins, axis=1))
+
+    level = (amounts_in + sum_in[active]) / sum_sqrt[active]
+    splits = np.maximum(roots * level[:, None] - offsets, 0)
+    splits[np.arange(len(reserves)) >= active[:, None]] = 0
+
+    # NOTE: absorb float drifts so the splits add up to amount-in
+    splits[:, 0] = np.maximum(splits[:, 0] + amounts_in - splits.sum(axis=1), 0)
+
+    for col, (*_, pool) in enumerate(reserves):
+        amount_out += pool.swap_many(token_in, splits[:, col], token_out)
+
+    return np.where(amounts_in > 0, amount_out, 0)
+
+
+def water_fill_out(
+    amount_out: float,
+    token_in: Token,
+    token_out: Token,
+    pools: List[Pool],
+) -> Tuple[float, Splits]:
+    """Cheapest split of amount-out over x*y=k pools, the exact-out dual of `water_fill`.
+
+    Taking o out of a pool costs x*o / (g*(y - o)), with marginal cost x*y / (g*(y - o)^2).
+    Equalizing it to M over the used pools gives o = y - sqrt(x*y/g) / sqrt(M); pools join
+    by increasing spot cost x/(g*y). Return the total amount-in (inf if the pools cannot
+    provide amount-out) and the amount-out of each pool.
+    """
+    if amount_out == 0 or not pools:
+        return 0 if amount_out == 0 else inf, []
+
+    reserves = []
+
+    for idx, pool in enumerate(pools):
+        pool_token_in = pool.get_token(token_in)
+        pool_token_out = pool.get_token(token_out)
+
+        if not pool.k or not pool_token_in or not pool_token_out or token_in == token_out:
+            continue
+
+        x, y, g = pool_token_in.amount, pool_token_out.amount, 1 - pool.fee
+
+        if x <= 0 or y <= 0 or g <= 0:
+            continue
+
+        reserves.append((x / (g * y), idx, sqrt(x * y / g), y))
+
+    if sum(y for *_, y in reserves) <= amount_out:
+        return inf, []
+
+    reserves.sort()
+    sum_sqrt, sum_out, active = float(0), float(0), 0
+
+    for spot_cost, _, root, y in reserves:
+        remain = sum_out - amount_out
+
+        if remain > 0 and spot_cost * remain**2 >= sum_sqrt**2:
+            # NOTE: the pool's spot cost does not beat the current marginal cost
+            break
+
+        sum_sqrt += root
+        sum_out += y
+        active += 1
+
+    level = (sum_out - amount_out) / sum_sqrt
+    splits = [float(0)] * len(pools)
+
+    for _, idx, root, y in reserves[:active]:
+        splits[idx] = max(y - root * level, 0)
+
+    # NOTE: absorb float drifts so the splits add up to amount-out
+    drift = amount_out - sum(splits)
+    top = reserves[0][1]
+    splits[top] = max(splits[top] + drift, 0)
+
+    amount_in = sum(
+        pool.swap_in(token_in, value, token_out) for pool, value in zip(pools, splits) if value
+    )
+    return amount_in, splits
 
-    def merge(self, another_poolset: "PoolSet"):
-        self.pools.update(another_poolset.pools)
 
+class Edge:
+    """Hop of a route over the pools of a token pair.
+    Slotted & frozen, its key & hash are computed once. Edges are built by the routing
+    itself so they are not validated, see `EdgeModel` for the validated boundary.
+    The pools are the ones of the graph (never copies), in the order they were given
+    """
+
+    __slots__ = ("token_in", "token_out", "pools", "pool_ids", "_key", "_hash")
 
-class Edge(BaseModel):
     token_in: Token
     token_out: Token
     pools: List[Pool]
+    pool_ids: PoolIds
+    _key: Tuple[Token, Token, FrozenSet[str]]
+    _hash: int
+
+    def __init__(
+        self,
+        token_in: Token,
+        token_out: Token,
+        pools: Iterable[Pool],
+        pool_ids: Optional[PoolIds] = None,
+    ):
+        pools = list(pools)
+        key = (token_in, token_out, frozenset(p.name for p in pools))
+        object.__setattr__(self, "token_in", token_in)
+        object.__setattr__(self, "token_out", token_out)
+        object.__setattr__(self, "pools", pools)
+        object.__setattr__(self, "pool_ids", POOL_IDS if pool_ids is None else pool_ids)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_hash", hash(key))
+
+    def __setattr__(self, *_):
+        raise AttributeError("Edge is immutable")
+
+    def __reduce__(self):
+        return Edge, (self.token_in, self.token_out, self.pools, self.pool_ids)
+
+    def __eq__(self, other):
+        return isinstance(other, Edge) and self._key == other._key
+
+    def __repr__(self):
+        return f"Edge({self})"
+
+    def to_model(self) -> EdgeModel:
+        return EdgeModel(token_in=self.token_in, token_out=self.token_out, pools=self.pools)
+
+    def sorted_pools(
+        self,
+        amount_in: float,
+        table: Optional[PoolStateTable] = None,
+        overlay: Optional[SwapOverlay] = None,
+        fixed=False,
+    ) -> List[Pool]:
+        """The pools by their amount-out for amount-in, best first. A sorted copy, the
+        pools of the edge are shared (e.g. by a cached route) and are left as they are
+        """
 
-    def sort_pools(self, amount_in: float):
         def test_swap(p: Pool):
-            nonlocal amount_in
-            return p.swap(self.token_in, amount_in, self.token_out)
+            if fixed:
+                return p.swap_fixed(self.token_in, int(amount_in), self.token_out)
+
+            return self.pool_swap(p, amount_in, overlay)
+
+        if table is None or overlay is not None:
+            return sorted(self.pools, key=test_swap, reverse=True)
 
-        self.pools.sort(key=test_swap, reverse=True)
+        names = [p.name for p in self.pools]
+        pool_ids = np.array([table.pool_index[name] for name in names])
+        if fixed:
+            outputs = table.swap_fixed(pool_ids, self.token_in, int(amount_in), self.token_out)
+        else:
+            outputs = table.swap(pool_ids, self.token_in, amount_in, self.token_out)
+
+        ranks = dict(zip(names, outputs.tolist()))
+        return sorted(self.pools, key=lambda p: ranks[p.name], reverse=True)
 
     def __str__(self):
         pools = f"({', '.join([p.name for p in self.pools])})"
         return f"{self.token_in}->{self.token_out} {pools}"
 
     def __hash__(self) -> int:
-        return hash(str(self))
+        return self._hash
+
+    def key(self):
+        """Identity of the edge regardless of the order of its pools"""
+        return self._key
+
+    def pool_swap(self, pool: Pool, amount_in: float, overlay: Optional[SwapOverlay] = None):
+        if overlay is None:
+            return pool.swap(self.token_in, amount_in, self.token_out)
+
+        return pool.swap(self.token_in, amount_in, self.token_out, overlay=overlay)
 
+    @metrics.timed("Edge.swap")
     def swap(
         self,
         amount_in: float,
         ignore_pools: Optional[PoolSet] = None,
         optimal_lv=5,
+        mode: SplitMode = "grid",
+        table: Optional[PoolStateTable] = None,
+        swap_cache: Optional[SwapCache] = None,
+        overlay: Optional[SwapOverlay] = None,
+        fixed=False,
     ) -> Tuple[float, Dict, PoolSet]:
+        """With a compiled `table`, the batched swaps of the table replace `Pool.swap`
+        when ranking pools and scoring vectorized splits.
+        With a shared `swap_cache`, edge & pool swaps are memoized across calls.
+        With an `overlay`, pools are read through it and the chosen split is recorded in
+        it; the table & cache hold the shared state so they are left out.
+        With `fixed`, amounts are integer token units (see `TokenDecimals`) whatever the
+        mode, swapped on the integer reserves of the table (or `Pool.swap_fixed`)
+        """
         if amount_in == 0:
-            return 0, dict(), PoolSet()
+            return 0, dict(), EMPTY_POOLSET
+
+        if overlay is not None:
+            if fixed:
+                raise ValueError("fixed-point swaps do not read through an overlay")
+
+            result = self._swap(amount_in, ignore_pools, optimal_lv, mode, None, None, overlay)
+            _, optimal_splits, _ = result
+            pools = {p.name: p for p in self.pools}
+
+            for name, value in optimal_splits.items():
+                if value > 0:
+                    pools[name].swap(
+                        self.token_in, value, self.token_out, do_swap=True, overlay=overlay
+                    )
+
+            return result
+
+        if swap_cache is not None:
+            key = (
+                "edge",
+                self.key(),
+                amount_in,
+                ignore_pools or EMPTY_POOLSET,
+                optimal_lv,
+                mode,
+                fixed,
+            )
+            return swap_cache.memo(
+                key,
+                lambda: [p.name for p in self.pools],
+                lambda: self._swap(
+                    amount_in, ignore_pools, optimal_lv, mode, table, swap_cache, fixed=fixed
+                ),
+            )
 
-        self.sort_pools(amount_in)
-        pools = self.pools
+        return self._swap(
+            amount_in, ignore_pools, optimal_lv, mode, table, swap_cache, fixed=fixed
+        )
+
+    def _swap(
+        self,
+        amount_in: float,
+        ignore_pools: Optional[PoolSet],
+        optimal_lv: int,
+        mode: SplitMode,
+        table: Optional[PoolStateTable],
+        swap_cache: Optional[SwapCache],
+        overlay: Optional[SwapOverlay] = None,
+        fixed=False,
+    ) -> Tuple[float, Dict, PoolSet]:
+        pools = self.sorted_pools(amount_in, table=table, overlay=overlay, fixed=fixed)
 
         if ignore_pools:
-            pools = [pool for pool in self.pools if pool.name not in ignore_pools.pools]
+            pools = [pool for pool in pools if pool.name not in ignore_pools]
 
         if len(pools) == 0:
-            return 0, dict(), PoolSet()
+            return 0, dict(), EMPTY_POOLSET
+
+        def swap_fixed(pool: Pool, value: int) -> int:
+            if table is None:
+                return pool.swap_fixed(self.token_in, value, self.token_out)
+
+            pool_ids = np.array([table.pool_index[pool.name]])
+            return table.swap_fixed(pool_ids, self.token_in, value, self.token_out)[0]
 
         @cache
         def handler(value, idx):
-            nonlocal pools
             pool = pools[idx]
-            return pool.swap(self.token_in, value, self.token_out)
 
-        max_out, splits = find_optimal_distribution(
-            amount_in,
-            len(pools),
-            handler,
-            optimal_lv=optimal_lv,
-        )
+            def swap():
+                if fixed:
+                    return swap_fixed(pool, value)
+
+                return pool.swap(self.token_in, value, self.token_out)
+
+            if swap_cache is not None:
+                return swap_cache.memo(
+                    ("pool", pool.name, self.token_in, value, self.token_out, fixed),
+                    lambda: [pool.name],
+                    swap,
+                )
+
+            if fixed:
+                return swap()
+
+            return self.pool_swap(pool, value, overlay)
+
+        def vectorized_handler(values, idx):
+            pool = pools[idx]
+
+            if fixed:
+                if table is None:
+                    return np.array([swap_fixed(pool, v) for v in values.tolist()], object)
+
+                pool_id = table.pool_index[pool.name]
+                return table.swap_fixed(pool_id, self.token_in, values, self.token_out)
+
+            if table is not None:
+                pool_id = table.pool_index[pool.name]
+                return table.swap(pool_id, self.token_in, values, self.token_out)
+
+            if overlay is not None:
+                return pool.swap_many(self.token_in, values, self.token_out, overlay=overlay)
+
+            return pool.swap_many(self.token_in, values, self.token_out)
+
+        cpmm_count = len([pool for pool in pools if is_cpmm(pool)])
+
+        if mode == "water_fill" and fixed and cpmm_count:
+            max_out, splits = water_fill_fixed(
+                int(amount_in), self.token_in, self.token_out, pools, handler, optimal_lv
+            )
+        elif mode == "water_fill" and cpmm_count == len(pools):
+            max_out, splits = water_fill(
+                amount_in, self.token_in, self.token_out, pools, overlay=overlay
+            )
+        elif mode == "water_fill" and cpmm_count:
+            max_out, splits = water_fill_mixed(
+                amount_in,
+                self.token_in,
+                self.token_out,
+                pools,
+                handler,
+                optimal_lv=optimal_lv,
+                overlay=overlay,
+            )
+        elif mode == "vectorized":
+            max_out, splits = find_optimal_distribution_vectorized(
+                amount_in,
+                len(pools),
+                vectorized_handler,
+                optimal_lv=optimal_lv,
+                fixed=fixed,
+            )
+        elif mode == "adaptive":
+            max_out, splits = find_optimal_distribution_adaptive(
+                amount_in,
+                len(pools),
+                handler,
+                optimal_lv=optimal_lv,
+                fixed=fixed,
+            )
+        else:
+            max_out, splits = find_optimal_distribution(
+                amount_in,
+                len(pools),
+                handler,
+                optimal_lv=optimal_lv,
+                fixed=fixed,
+            )
 
         if max_out == 0:
             # NOTE: Ineffective swap, when a pool is so much unbalanced, ignore
-            return 0, dict(), PoolSet()
+            return 0, dict(), EMPTY_POOLSET
 
         optimal_splits = {pools[i].name: val for i, val in enumerate(splits)}
         visited_pools = {name for name, value in optimal_splits.items() if value > 0}
-        return max_out, optimal_splits, PoolSet(pools=visited_pools)
+        return max_out, optimal_splits, PoolSet(pools=visited_pools, ids=self.pool_ids)
 
+    def swap_in(
+        self,
+        amount_out: float,
+        ignore_pools: Optional[PoolSet] = None,
+    ) -> Tuple[float, Dict, PoolSet]:
+        """Exact-out swap: the minimum amount-in for amount-out and its split (amount-in
+        of each pool). Return inf when the pools cannot provide amount-out or when a pool
+        is not x*y=k, so that the caller falls back to searching with `swap`
+        """
+        if amount_out == 0:
+            return 0, dict(), EMPTY_POOLSET
 
-class Route(BaseModel):
-    edges: List[Edge]
+        pools = self.pools
 
-    @validator("edges")
-    def validate_path_continuity(cls, edges: List[Edge]):
-        for i in range(len(edges) - 1):
-            current, next = edges[i], edges[i + 1]
-            if current.token_out != next.token_in:
-                raise ValueError("Broken Route")
+        if ignore_pools:
+            pools = [pool for pool in self.pools if pool.name not in ignore_pools]
+
+        if not pools or not all(is_cpmm(pool) for pool in pools):
+            return inf, dict(), EMPTY_POOLSET
+
+        min_in, splits = water_fill_out(amount_out, self.token_in, self.token_out, pools)
+
+        if min_in == inf:
+            return inf, dict(), EMPTY_POOLSET
+
+        optimal_splits = {
+            pool.name: pool.swap_in(self.token_in, value, self.token_out)
+            for pool, value in zip(pools, splits)
+        }
+        visited_pools = {name for name, value in optimal_splits.items() if value > 0}
+        return min_in, optimal_splits, PoolSet(pools=visited_pools, ids=self.pool_ids)
 
-        return edges
+
+def validate_path_continuity(edges):
+    for i in range(len(edges) - 1):
+        current, next = edges[i], edges[i + 1]
+        if current.token_out != next.token_in:
+            raise ValueError("Broken Route")
+
+    return edges
+
+
+class Route:
+    """Edges from token-in to token-out, slotted & frozen like `Edge`.
+    Routes traced on the graph are continuous by construction, routes from outside
+    are validated by `RouteModel`
+    """
+
+    __slots__ = ("edges", "_key", "_hash")
+
+    edges: Tuple[Edge, ...]
+    _key: Tuple[Tuple[Token, Token, FrozenSet[str]], ...]
+    _hash: int
+
+    def __init__(self, edges: Iterable[Edge]):
+        edges = tuple(edges)
+        key = tuple(edge.key() for edge in edges)
+        object.__setattr__(self, "edges", edges)
+        object.__setattr__(self, "_key", key)
+        object.__setattr__(self, "_hash", hash(key))
+
+    def __setattr__(self, *_):
+        raise AttributeError("Route is immutable")
+
+    def __reduce__(self):
+        return Route, (self.edges,)
+
+    def __eq__(self, other):
+        return isinstance(other, Route) and self._key == other._key
+
+    def __repr__(self):
+        return f"Route({self})"
 
     def __str__(self):
         assert self.edges
@@ -116,19 +762,85 @@ class Route(BaseModel):
         return ins + "->" + out
 
     def __hash__(self):
-        return hash(str(self))
+        return self._hash
+
+    def key(self):
+        return self._key
+
+    def to_model(self) -> RouteModel:
+        return RouteModel(edges=[edge.to_model() for edge in self.edges])
+
+    def pool_names(self) -> List[str]:
+        return [p.name for edge in self.edges for p in edge.pools]
 
+    def swap_many(self, amounts_in: np.ndarray) -> np.ndarray:
+        """Water-filling `swap` of an array of amount-in, for routes of x*y=k pools that
+        appear on a single edge (no pool to ignore along the route)
+        """
+        current_in = amounts_in
+
+        for edge in self.edges:
+            current_in = water_fill_many(current_in, edge.token_in, edge.token_out, edge.pools)
+
+        return current_in
+
+    @metrics.timed("Route.swap")
     def swap(
         self,
         amount_in: float,
         ignore_pools: Optional[PoolSet] = None,
         optimal_lv=5,
+        mode: SplitMode = "grid",
+        table: Optional[PoolStateTable] = None,
+        swap_cache: Optional[SwapCache] = None,
+        overlay: Optional[SwapOverlay] = None,
+        fixed=False,
     ) -> Tuple[float, List[Dict], PoolSet]:
+        """With an `overlay`, every edge trades on the reserves left by the previous ones
+        (see `Edge.swap`), so a pool may be reused by a later edge at its post-trade state.
+        With `fixed`, amounts are integer token units
+        """
         if not amount_in:
-            return 0, [], ignore_pools or PoolSet()
+            return 0, [], ignore_pools or EMPTY_POOLSET
 
+        if overlay is not None:
+            if fixed:
+                raise ValueError("fixed-point swaps do not read through an overlay")
+
+            return self._simulate(amount_in, ignore_pools, optimal_lv, mode, overlay)
+
+        if swap_cache is not None:
+            key = (
+                "route",
+                self.key(),
+                amount_in,
+                ignore_pools or EMPTY_POOLSET,
+                optimal_lv,
+                mode,
+                fixed,
+            )
+            return swap_cache.memo(
+                key,
+                self.pool_names,
+                lambda: self._swap(
+                    amount_in, ignore_pools, optimal_lv, mode, table, swap_cache, fixed
+                ),
+            )
+
+        return self._swap(amount_in, ignore_pools, optimal_lv, mode, table, swap_cache, fixed)
+
+    def _swap(
+        self,
+        amount_in: float,
+        ignore_pools: Optional[PoolSet],
+        optimal_lv: int,
+        mode: SplitMode,
+        table: Optional[PoolStateTable],
+        swap_cache: Optional[SwapCache],
+        fixed=False,
+    ) -> Tuple[float, List[Dict], PoolSet]:
         current_in = amount_in
-        visited_pools = PoolSet() if not ignore_pools else ignore_pools.copy()
+        visited_pools = ignore_pools or EMPTY_POOLSET
         path_splits: List[Dict] = []
 
         @cache
@@ -142,6 +854,10 @@ class Route(BaseModel):
                 current_amount_in,
                 optimal_lv=optimal,
                 ignore_pools=current_visited_pools,
+                mode=mode,
+                table=table,
+                swap_cache=swap_cache,
+                fixed=fixed,
             )
 
         for edge in self.edges:
@@ -151,16 +867,91 @@ class Route(BaseModel):
                 visited_pools,
                 optimal_lv,
             )
-            visited_pools.merge(just_visisted_pools)
+            visited_pools = visited_pools.union(just_visisted_pools)
+            path_splits.append(splits)
+
+        return current_in, path_splits, visited_pools
+
+    def _simulate(
+        self,
+        amount_in: float,
+        ignore_pools: Optional[PoolSet],
+        optimal_lv: int,
+        mode: SplitMode,
+        overlay: SwapOverlay,
+    ) -> Tuple[float, List[Dict], PoolSet]:
+        current_in = amount_in
+        visited_pools = ignore_pools or EMPTY_POOLSET
+        path_splits: List[Dict] = []
+
+        for edge in self.edges:
+            current_in, splits, just_visisted_pools = edge.swap(
+                current_in,
+                optimal_lv=optimal_lv,
+                ignore_pools=ignore_pools,
+                mode=mode,
+                overlay=overlay,
+            )
+            visited_pools = visited_pools.union(just_visisted_pools)
             path_splits.append(splits)
 
         return current_in, path_splits, visited_pools
 
+    def swap_in(
+        self,
+        amount_out: float,
+        ignore_pools: Optional[PoolSet] = None,
+    ) -> Tuple[float, List[Dict], PoolSet]:
+        """Exact-out swap, inverting the edges from the last one"""
+        if not amount_out:
+            return 0, [], ignore_pools or EMPTY_POOLSET
+
+        current_out = amount_out
+        visited_pools = ignore_pools or EMPTY_POOLSET
+        path_splits: List[Dict] = []
+
+        for edge in reversed(self.edges):
+            current_out, splits, just_visisted_pools = edge.swap_in(
+                current_out,
+                ignore_pools=visited_pools,
+            )
+
+            if current_out == inf:
+                return inf, [], visited_pools
+
+            visited_pools = visited_pools.union(just_visisted_pools)
+            path_splits.insert(0, splits)
+
+        return current_out, path_splits, visited_pools
+
+
+class EdgeModel(BaseModel):
+    """Validated & serializable form of an `Edge`"""
+
+    token_in: Token
+    token_out: Token
+    pools: List[Pool]
+
+    def to_edge(self) -> Edge:
+        return Edge(self.token_in, self.token_out, self.pools)
+
+
+class RouteModel(BaseModel):
+    """Validated & serializable form of a `Route`, for routes from outside the router"""
+
+    edges: List[EdgeModel]
+
+    _continuity = validator("edges", allow_reuse=True)(validate_path_continuity)
+
+    def to_route(self) -> Route:
+        return Route(edge.to_edge() for edge in self.edges)
+
 
 def construct_path(
     tokens: List[Token],
     tpp: TokenPairsPools,
     pool_map: PoolMap,
+    pool_ids: Optional[PoolIds] = None,
 ) -> Route:
     edges: List[Edge] = []
 
@@ -168,20 +959,146 @@ def construct_path(
         token_in, token_out = tokens[i], tokens[i + 1]
         pool_names = tpp[token_in][token_out]
         pools = [pool_map[name] for name in pool_names]
-        edge = Edge(token_in=token_in, token_out=token_out, pools=pools)
-        edges.append(edge)
+        edges.append(Edge(token_in, token_out, pools, pool_ids))
+
+    return Route(edges)
+
+
+PairBound = Tuple[float, float]
+
+
+def pair_bound(token_in: Token, token_out: Token, pools: Iterable[Pool]) -> PairBound:
+    """Best spot rate (amount-out per amount-in, fees included) & liquidity (reserve-out)
+    of the pools of a pair: an x*y=k pool swapping `a` returns less than `a * rate`
+    and no pool returns more than its reserve. A pool of another curve has no rate bound
+    """
+    rate, liquidity = float(0), float(0)
+
+    for pool in pools:
+        pool_token_in = pool.get_token(token_in)
+        pool_token_out = pool.get_token(token_out)
+
+        if not pool_token_in or not pool_token_out:
+            continue
+
+        liquidity += pool_token_out.amount
+
+        if not is_cpmm(pool):
+            rate = inf
+        elif pool_token_in.amount > 0:
+            spot = (1 - pool.fee) * pool_token_out.amount / pool_token_in.amount
+            rate = max(rate, spot)
+
+    return rate, liquidity
+
+
+def route_bound(route: Route, amount_in: float) -> float:
+    """Upper bound of the amount-out of a route, whatever the split of its edges"""
+    bound = amount_in
+
+    for edge in route.edges:
+        rate, liquidity = pair_bound(edge.token_in, edge.token_out, edge.pools)
+        bound = min(bound * rate, liquidity)
+
+    return bound
+
+
+def greedy_quote(route: Route, amount_in: float) -> float:
+    """Amount-out of a route swapping everything through the best pool of every edge,
+    a pool is used once like in `Route.swap`, of which this is a lower bound
+    """
+    amount = amount_in
+    visited_pools: Set[str] = set()
+
+    for edge in route.edges:
+        quotes = [
+            (p.swap(edge.token_in, amount, edge.token_out), p.name)
+            for p in edge.pools
+            if p.name not in visited_pools
+        ]
+
+        if not quotes:
+            return 0
 
-    return Route(edges=edges)
+        amount, name = max(quotes)
+        visited_pools.add(name)
 
+    return amount
 
+
+def best_rates_to(
+    token_out: Token,
+    token_pairs_pools: TokenPairsPools,
+    pool_map: PoolMap,
+    max_edges: int,
+) -> List[Dict[Token, float]]:
+    """`rates[h][t]` is the best product of spot rates from `t` to `token_out`
+    in `h` edges or less
+    """
+    rates: List[Dict[Token, float]] = [{token_out: 1}]
+    pairs = {
+        (token_in, token): pair_bound(token_in, token, [pool_map[n] for n in names])[0]
+        for token_in, neighbours in token_pairs_pools.items()
+        for token, names in neighbours.items()
+    }
+
+    for _ in range(max_edges):
+        previous = rates[-1]
+        current = dict(previous)
+
+        for (token_in, token), rate in pairs.items():
+            if not previous.get(token):
+                continue
+
+            current[token_in] = max(current.get(token_in, 0), rate * previous[token])
+
+        rates.append(current)
+
+    return rates
+
+
+def select_routes(
+    routes: List[Route],
+    amount_in: float,
+    max_routes: Optional[int] = None,
+    prune_ratio=0.5,
+) -> List[Route]:
+    """Drop the routes bounded under `prune_ratio` of the best greedy quote, then keep the
+    `max_routes` routes of best greedy quote (in that order)
+    """
+    quotes = [greedy_quote(route, amount_in) for route in routes]
+    best = max(quotes, default=0)
+    kept = [
+        (quote, idx)
+        for idx, (route, quote) in enumerate(zip(routes, quotes))
+        if route_bound(route, amount_in) >= prune_ratio * best
+    ]
+    kept.sort(key=lambda item: item[0], reverse=True)
+    return [routes[idx] for _, idx in kept[:max_routes]]
+
+
+@metrics.timed("find_routes")
 def find_routes(
     token_in: Token,
     token_out: Token,
-    pool_list: List[Pool],
+    pool_list: Collection[Pool],
     token_pairs_pools: TokenPairsPools,
     pool_map: PoolMap,
     max_hop=4,
+    amount_in: Optional[float] = None,
+    max_routes: Optional[int] = None,
+    prune_ratio=0.5,
+    rates_to: Optional[List[Dict[Token, float]]] = None,
+    pool_ids: Optional[PoolIds] = None,
 ) -> List[Route]:
+    """With `amount_in`, branch & bound: a partial path is dropped when the best it can
+    give (product of spot rates & liquidity so far, best rates to token-out for the rest)
+    is under `prune_ratio` of the best greedy quote of the routes found so far.
+    `max_routes` keeps the routes of best greedy quote (the first found without amount-in).
+    `rates_to` are precomputed `best_rates_to` (e.g. of a `SpotRateMatrix`), used when
+    they cover `max_hop - 1` edges. Edges get the `pool_ids` of the graph of the pools.
+    `pool_list` is only checked for emptiness, a view of a lazy pool map builds no pool
+    """
     if token_in not in token_pairs_pools:
         return []
 
@@ -195,9 +1112,29 @@ def find_routes(
         return []
 
     result: List[Route] = []
-
-    def trace(token: Token, queue=None):
-        nonlocal token_out, max_hop, token_pairs_pools, pool_map, result
+    pruned = 0
+    best = float(0)
+    bounded = amount_in is not None
+    pairs: Dict[Tuple[Token, Token], PairBound] = {}
+    if not bounded:
+        rates_to = []
+    elif rates_to is None or len(rates_to) < max_hop - 1:
+        rates_to = best_rates_to(token_out, token_pairs_pools, pool_map, max_hop)
+
+    def bound_to(
+        token: Token, node: Token, bound: float, hops_left: int
+    ) -> Tuple[float, float]:
+        if (token, node) not in pairs:
+            names = token_pairs_pools[token][node]
+            pairs[(token, node)] = pair_bound(token, node, [pool_map[n] for n in names])
+
+        rate, liquidity = pairs[(token, node)]
+        node_bound = min(bound * rate, liquidity)
+        rate_to = rates_to[hops_left].get(node, 0) if hops_left >= 0 else 0
+        return node_bound, node_bound * rate_to if node_bound else 0
+
+    def trace(token: Token, queue=None, bound=inf):
+        nonlocal token_out, max_hop, token_pairs_pools, pool_map, result, pruned, best
 
         if not queue:
             queue = []
@@ -208,8 +1145,12 @@ def find_routes(
             return
 
         if token == token_out:
-            route = construct_path(queue.copy(), token_pairs_pools, pool_map)
+            route = construct_path(queue.copy(), token_pairs_pools, pool_map, pool_ids)
             result.append(route)
+
+            if bounded:
+                best = max(best, greedy_quote(route, amount_in))  # type: ignore
+
             return
 
         nodes = list(token_pairs_pools[token].keys())
@@ -218,34 +1159,487 @@ def find_routes(
             if len(queue) >= 2 and node == queue[-2]:
                 continue
 
-            trace(node, queue=queue)
+            node_bound = inf
+
+            if bounded:
+                hops_left = max_hop - len(queue) - 1
+                node_bound, path_bound = bound_to(token, node, bound, hops_left)
+
+                if path_bound < prune_ratio * best:
+                    pruned += 1
+                    continue
+
+            trace(node, queue=queue, bound=node_bound)
 
             while queue[-1] != token:
                 queue.pop()
 
-    trace(token_in)
+    trace(token_in, bound=amount_in if bounded else inf)
+
+    if bounded:
+        # NOTE: the best quote only grows, so re-check the routes found before it
+        kept = select_routes(result, amount_in, max_routes, prune_ratio)  # type: ignore
+        pruned += len(result) - len(kept)
+        result = kept
+    elif max_routes is not None:
+        result = result[:max_routes]
+
+    metrics.count("routes_found", len(result))
+
+    if pruned:
+        # NOTE: partial paths & routes dropped by their bound
+        metrics.count("routes_pruned", pruned)
+
     return result
 
 
+class RouteIndex:
+    """Routes of `find_routes` cached per (token_in, token_out, max_hop).
+    Routes are traced on the first lookup and kept until a pool is added to or removed
+    from the graph, reserve updates need no invalidation since routes hold the pools.
+    A pool on known token pairs only drops the routes crossing those pairs,
+    a pool opening a new pair may create paths anywhere so it drops every route
+    """
+
+    graph: PoolGraph
+
+    def __init__(self, graph: PoolGraph):
+        self.graph = graph
+        self._routes: Dict[Tuple[Token, Token, int], List[Route]] = {}
+        graph.subscribe(self.on_change)
+
+    def __len__(self):
+        return len(self._routes)
+
+    def find_routes(
+        self,
+        token_in: Token,
+        token_out: Token,
+        max_hop=4,
+        amount_in: Optional[float] = None,
+        max_routes: Optional[int] = None,
+        prune_ratio=0.5,
+        rates_to: Optional[List[Dict[Token, float]]] = None,
+    ) -> List[Route]:
+        """With `amount_in`, the routes `select_routes` keeps for it: picked among the
+        cached routes of the pair, or else traced by the branch & bound of `find_routes`
+        (bounded by `rates_to`), which is not cached since it depends on the amount
+        """
+        key = (token_in, token_out, max_hop)
+        routes = self._routes.get(key)
+
+        if routes is None and amount_in is not None:
+            return find_routes(
+                token_in,
+                token_out,
+                self.graph.pool_map.values(),
+                self.graph.token_pairs_pools,
+                self.graph.pool_map,
+                max_hop=max_hop,
+                amount_in=amount_in,
+                max_routes=max_routes,
+                prune_ratio=prune_ratio,
+                rates_to=rates_to,
+                pool_ids=self.graph.pool_ids,
+            )
+
+        if routes is None:
+            routes = find_routes(
+                token_in,
+                token_out,
+                self.graph.pool_map.values(),
+                self.graph.token_pairs_pools,
+                self.graph.pool_map,
+                max_hop=max_hop,
+                pool_ids=self.graph.pool_ids,
+            )
+            self._routes[key] = routes
+
+        if amount_in is not None:
+            return select_routes(routes, amount_in, max_routes, prune_ratio)
+
+        return routes
+
+    def invalidate(self, tokens: Optional[Iterable[Token]] = None):
+        """Drop every route, or only the routes with an edge between two of `tokens`"""
+        if tokens is None:
+            self._routes.clear()
+            return
+
+        touched = set(tokens)
+
+        def crosses(route: Route) -> bool:
+            return any(e.token_in in touched and e.token_out in touched for e in route.edges)
+
+        for key, routes in list(self._routes.items()):
+            if any(crosses(route) for route in routes):
+                self._routes.pop(key)
+
+    def on_change(self, change: PoolChange):
+        if change.kind == "update":
+            return
+
+        pairs = self.graph.token_pairs_pools
+        opens_pair = change.kind == "add" and any(
+            pairs.get(token_in, {}).get(token_out) == {change.pool}
+            for token_in in change.tokens
+            for token_out in change.tokens
+            if token_in != token_out
+        )
+
+        self.invalidate(None if opens_pair else change.tokens)
+
+
+@metrics.timed("calc_amount_out_on_multi_routes")
 def calc_amount_out_on_multi_routes(
     routes: List[Route],
     amount_in: float,
     optimal_lv=5,
+    mode: SplitMode = "grid",
+    table: Optional[PoolStateTable] = None,
+    swap_cache: Optional[SwapCache] = None,
+    quote_cache: Optional[QuoteCache] = None,
+    fixed=False,
 ):
-    max_out = float(0)
-    route_splits = []
-    amount_outs = []
-    visited_pools: PoolSet = PoolSet()
+    """Split amount-in across routes, the `mode` is used by every edge of the routes.
+    Routes share pools so the route-level split always uses the sequential grid,
+    refined around its best split in the adaptive mode.
+    With a `quote_cache`, amounts of a known bucket re-price its plan (see `price_plan`).
+    With `fixed`, amounts are integer token units
+    """
+
+    def compute():
+        if swap_cache is not None:
+            key = (
+                "routes",
+                tuple(r.key() for r in routes),
+                amount_in,
+                optimal_lv,
+                mode,
+                fixed,
+            )
+            return swap_cache.memo(
+                key,
+                lambda: [name for r in routes for name in r.pool_names()],
+                lambda: _calc_amount_out_on_multi_routes(
+                    routes, amount_in, optimal_lv, mode, table, swap_cache, fixed
+                ),
+            )
+
+        return _calc_amount_out_on_multi_routes(
+            routes, amount_in, optimal_lv, mode, table, swap_cache, fixed
+        )
+
+    if quote_cache is not None:
+        return quote_through(
+            quote_cache, routes, amount_in, optimal_lv, mode, compute, fixed, table
+        )
+
+    return compute()
+
+
+@metrics.timed("calc_amount_out_curve")
+def calc_amount_out_curve(
+    routes: List[Route],
+    amounts: Iterable[float],
+    optimal_lv=5,
+    mode: SplitMode = "grid",
+    table: Optional[PoolStateTable] = None,
+    swap_cache: Optional[SwapCache] = None,
+    quote_cache: Optional[QuoteCache] = None,
+    fixed=False,
+) -> List[Tuple]:
+    """`calc_amount_out_on_multi_routes` of many amounts in one pass, a result per amount.
+    The split grid is scored as a (candidates x amounts) matrix, route by route as in the
+    sequential search: each cell ignores the pools visited by the previous routes of its
+    split, cells ignoring the same pools of a route share its swaps (at once with
+    `Route.swap_many` in the water-filling mode, when no later route shares its pools).
+    The adaptive mode & `fixed` integer units refine per amount, so their amounts are
+    quoted one by one, sharing the routes & caches.
+    With a `quote_cache`, amounts of a known bucket re-price its plan, the others are
+    searched together and record their plans
+    """
+    amounts = [amount if fixed else float(amount) for amount in amounts]
+
+    if quote_cache is not None:
+        keys = [quote_key(quote_cache, routes, a, optimal_lv, mode, fixed) for a in amounts]
+        plans = [quote_cache.get(key) for key in keys]
+        missing = [idx for idx, plan in enumerate(plans) if plan is None]
+        computed = calc_amount_out_curve(
+            routes,
+            [amounts[idx] for idx in missing],
+            optimal_lv,
+            mode,
+            table,
+            swap_cache,
+            fixed=fixed,
+        )
+        searched = dict(zip(missing, computed))
+        pools = [name for r in routes for name in r.pool_names()]
+
+        for idx, result in searched.items():
+            if result[0] > 0:
+                plan = quote_plan(routes, amounts[idx], result, fixed=fixed)
+                quote_cache.put(keys[idx], pools, plan)
+
+        return [
+            searched[idx] if plan is None else price_plan(routes, plan, amount, fixed, table)
+            for idx, (amount, plan) in enumerate(zip(amounts, plans))
+        ]
+
+    if len(routes) < 2 or mode == "adaptive" or fixed:
+        return [
+            calc_amount_out_on_multi_routes(
+                routes, amount, optimal_lv, mode, table, swap_cache, fixed=fixed
+            )
+            for amount in amounts
+        ]
+
+    _, cache_swap = route_split_handler(routes, optimal_lv, mode, table, swap_cache)
+    fractions = split_grid(1.0, len(routes), optimal_lv=optimal_lv)
+    scores = np.zeros((len(fractions), len(amounts)))
+    visited = np.full(scores.shape, EMPTY_POOLSET, dtype=object)
+    route_pools = [set(route.pool_names()) for route in routes]
+    metrics.count("candidate_splits", scores.size)
+
+    for idx, route in enumerate(routes):
+        own = route_pools[idx]
+        later = [route_pools[n] for n in range(idx + 1, len(routes))]
+        shared = own & set().union(*later)
+        volumes = round_array(fractions[:, idx, None] * np.array(amounts))
+        vectorized = (
+            mode == "water_fill"
+            and not shared
+            and len(own) == len(route.pool_names())
+            and all(is_cpmm(pool) for edge in route.edges for pool in edge.pools)
+        )
+
+        # NOTE: the visited pools of a cell only matter to the route through its own pools,
+        # cells are grouped by the pools they make the route ignore
+        groups: Dict[PoolSet, int] = {}
+        labels_of: Dict[PoolSet, int] = {}
+
+        for pool_set in set(visited.flat):
+            ignore = PoolSet(pool_set.pools & own, ids=pool_set.ids)
+            labels_of.update({pool_set: groups.setdefault(ignore, len(groups))})
+
+        labels = np.array([labels_of[pool_set] for pool_set in visited.flat])
+        labels = labels.reshape(scores.shape)
+
+        for ignore, label in groups.items():
+            cells = labels == label
+            values, inverse = np.unique(volumes[cells], return_inverse=True)
+            inverse = inverse.reshape(-1)
+
+            if vectorized and not ignore:
+                scores[cells] += route.swap_many(values)[inverse]
+                continue
+
+            swaps = [cache_swap(route, value, ignore, optimal_lv) for value in values]
+            scores[cells] += np.array([current_out for current_out, _, _ in swaps])[inverse]
+
+            if shared:
+                just_visited = np.empty(len(swaps), dtype=object)
+                just_visited[:] = [pool_set for _, _, pool_set in swaps]
+                visited[cells] = [
+                    a.union(b) for a, b in zip(visited[cells], just_visited[inverse])
+                ]
+
+    # NOTE: the first best split wins, as in the sequential search
+    best = np.argmax(scores, axis=0)
+    results: List[Tuple] = []
+
+    for col, amount in enumerate(amounts):
+        row = int(best[col])
+
+        if scores[row, col] <= 0:
+            results.append((0, [], [], [], []))
+            continue
+
+        # NOTE: only the best split of each amount is explained
+        splits = [round(fraction * amount, 5) for fraction in fractions[row].tolist()]
+        route_splits, amount_outs, used_paths = explain_route_splits(
+            routes, splits, cache_swap, optimal_lv
+        )
+        results.append((sum(amount_outs), splits, route_splits, amount_outs, used_paths))
+
+    return results
+
+
+# NOTE: a share of an amount, exact integer ratios (`Fraction`) for integer token units
+Share = Union[float, Fraction]
+
+# NOTE: per used route, its index & share of the amount-in
+# then per edge, the share of each pool in the amount-in of the edge
+QuotePlan = List[Tuple[int, Share, List[List[Tuple[Pool, Share]]]]]
+
+
+def share_of(value: float, total: float, fixed=False) -> Share:
+    return Fraction(int(value), int(total)) if fixed else value / total
+
+
+def quote_plan(routes: List[Route], amount_in: float, result, fixed=False) -> QuotePlan:
+    """The shares of a `calc_amount_out_on_multi_routes` result"""
+    _, _, route_splits, _, used_paths = result
+    index = {route: idx for idx, route in enumerate(routes)}
+    plan: QuotePlan = []
+
+    for route, route_split in zip(used_paths, route_splits):
+        route_in = sum(route_split[0].values())
+        edges = []
+
+        for edge, edge_split in zip(route.edges, route_split):
+            edge_in = sum(edge_split.values())
+            shares = [
+                (p, share_of(edge_split.get(p.name, 0), edge_in, fixed)) for p in edge.pools
+            ]
+            edges.append([(pool, share) for pool, share in shares if share])
+
+        plan.append((index[route], share_of(route_in, amount_in, fixed), edges))
+
+    return plan
+
+
+def rescale(amount: float, shares: List[Share], fixed=False) -> Splits:
+    if not fixed:
+        return [amount * float(share) for share in shares]
+
+    # NOTE: exact integer parts, the last one takes the remainder
+    values: Splits = [int(int(amount) * Fraction(share)) for share in shares[:-1]]
+    return values + [amount - sum(values)]
+
+
+def price_plan(
+    routes: List[Route],
+    plan: QuotePlan,
+    amount_in: float,
+    fixed=False,
+    table: Optional[PoolStateTable] = None,
+):
+    """Swap `amount_in` along a quote plan, rescaled & re-priced on the current pools
+    (on the `table` the quote was searched on, when given). A swap per planned pool & edge,
+    no search; return the tuple of `calc_amount_out_on_multi_routes`
+    """
+    splits: Splits = [0 if fixed else float(0)] * len(routes)
+    route_splits: List[List[Dict]] = []
+    amount_outs: List[float] = []
+    used_paths: List[Route] = []
+    route_amounts = rescale(amount_in, [share for _, share, _ in plan], fixed)
+
+    def swap(edge: Edge, pools: List[Pool], values: Splits) -> float:
+        if table is not None:
+            pool_ids = np.array([table.pool_index[pool.name] for pool in pools])
+
+            if fixed:
+                amounts = np.array(values, dtype=object)
+                return sum(table.swap_fixed(pool_ids, edge.token_in, amounts, edge.token_out))
+
+            return float(
+                table.swap(pool_ids, edge.token_in, np.array(values), edge.token_out).sum()
+            )
+
+        if fixed:
+            return sum(
+                pool.swap_fixed(edge.token_in, int(value), edge.token_out)
+                for pool, value in zip(pools, values)
+            )
+
+        return sum(
+            pool.swap(edge.token_in, value, edge.token_out)
+            for pool, value in zip(pools, values)
+        )
+
+    for (idx, _, edges), route_in in zip(plan, route_amounts):
+        route = routes[idx]
+        current_in = route_in
+        path_splits = []
+
+        for edge, pool_shares in zip(route.edges, edges):
+            pools = [pool for pool, _ in pool_shares]
+            values = rescale(current_in, [share for _, share in pool_shares], fixed)
+            current_in = swap(edge, pools, values)
+            path_splits.append({pool.name: value for pool, value in zip(pools, values)})
+
+        splits[idx] = route_in
+
+        if current_in > 0:
+            used_paths.append(route)
+            amount_outs.append(current_in)
+            route_splits.append(path_splits)
+
+    return sum(amount_outs), splits, route_splits, amount_outs, used_paths
+
+
+def quote_key(
+    quote_cache: QuoteCache,
+    routes: List[Route],
+    amount_in: float,
+    optimal_lv: int,
+    mode: SplitMode,
+    fixed=False,
+):
+    bucket = quote_cache.bucket(amount_in)
+    return ("quote", tuple(r.key() for r in routes), bucket, optimal_lv, mode, fixed)
+
+
+def quote_through(
+    quote_cache: QuoteCache,
+    routes: List[Route],
+    amount_in: float,
+    optimal_lv: int,
+    mode: SplitMode,
+    compute: Callable[[], Tuple],
+    fixed=False,
+    table: Optional[PoolStateTable] = None,
+):
+    """Re-price the cached plan of the bucket of `amount_in`, or compute the quote and
+    record its plan for the next amounts of the bucket
+    """
+    key = quote_key(quote_cache, routes, amount_in, optimal_lv, mode, fixed)
+    plan = quote_cache.get(key)
+
+    if plan is not None:
+        return price_plan(routes, plan, amount_in, fixed=fixed, table=table)
+
+    result = compute()
+
+    if result[0] > 0:
+        pools = [name for r in routes for name in r.pool_names()]
+        quote_cache.put(key, pools, quote_plan(routes, amount_in, result, fixed=fixed))
+
+    return result
+
+
+def route_split_handler(
+    routes: List[Route],
+    optimal_lv: int,
+    mode: SplitMode,
+    table: Optional[PoolStateTable] = None,
+    swap_cache: Optional[SwapCache] = None,
+    fixed=False,
+):
+    """Handler of the route-level split search & the memoized route swap behind it.
+    The routes of a split are swapped in order, each ignoring the pools of the previous
+    """
+    visited_pools = EMPTY_POOLSET
 
     @cache
     def cache_swap(route: Route, value: float, ignore_pools: PoolSet, optimal: int):
-        return route.swap(value, ignore_pools=ignore_pools, optimal_lv=optimal)
+        return route.swap(
+            value,
+            ignore_pools=ignore_pools,
+            optimal_lv=optimal,
+            mode=mode,
+            table=table,
+            swap_cache=swap_cache,
+            fixed=fixed,
+        )
 
     def handler(value: float, idx: int):
         nonlocal routes, visited_pools
 
         if idx == 0:
-            visited_pools.pools = set()
+            visited_pools = EMPTY_POOLSET
 
         current_path = routes[idx]
         current_out, _, just_visisted_pools = cache_swap(
@@ -254,18 +1648,19 @@ def calc_amount_out_on_multi_routes(
             visited_pools,
             optimal_lv,
         )
-        visited_pools.merge(just_visisted_pools)
+        visited_pools = visited_pools.union(just_visisted_pools)
         return current_out
 
-    max_out, splits = find_optimal_distribution(
-        amount_in,
-        len(routes),
-        optimal_lv=optimal_lv,
-        handler=handler,
-    )
+    return handler, cache_swap
+
 
-    visited_pools.pools = set()
+def explain_route_splits(routes: List[Route], splits: Splits, cache_swap, optimal_lv: int):
+    """Pool splits, amount-out & route of every used route of the optimal splits"""
+    route_splits = []
+    amount_outs = []
+    visited_pools = EMPTY_POOLSET
     used_paths: List[Route] = []
+    metrics.count("route_explanations", len(splits))
 
     for idx, split in enumerate(splits):
         # NOTE: recalculate to explain the detail data
@@ -277,10 +1672,105 @@ def calc_amount_out_on_multi_routes(
             visited_pools,
             optimal_lv,
         )
-        visited_pools.merge(just_visisted_pools)
+        visited_pools = visited_pools.union(just_visisted_pools)
         if current_out > 0:
             used_paths.append(route)
             amount_outs.append(current_out)
             route_splits.append(path_splits)
 
+    return route_splits, amount_outs, used_paths
+
+
+def _calc_amount_out_on_multi_routes(
+    routes: List[Route],
+    amount_in: float,
+    optimal_lv: int,
+    mode: SplitMode,
+    table: Optional[PoolStateTable],
+    swap_cache: Optional[SwapCache],
+    fixed=False,
+):
+    handler, cache_swap = route_split_handler(
+        routes, optimal_lv, mode, table, swap_cache, fixed
+    )
+
+    if mode == "adaptive":
+        max_out, splits = find_optimal_distribution_adaptive(
+            amount_in, len(routes), optimal_lv=optimal_lv, handler=handler, fixed=fixed
+        )
+    else:
+        max_out, splits = find_optimal_distribution(
+            amount_in,
+            len(routes),
+            optimal_lv=optimal_lv,
+            handler=handler,
+            fixed=fixed,
+        )
+
+    route_splits, amount_outs, used_paths = explain_route_splits(
+        routes, splits, cache_swap, optimal_lv
+    )
     return max_out, splits, route_splits, amount_outs, used_paths
+
+
+@metrics.timed("calc_amount_in_on_multi_routes")
+def calc_amount_in_on_multi_routes(
+    routes: List[Route],
+    amount_out: float,
+    optimal_lv=5,
+):
+    """Exact-out counterpart of `calc_amount_out_on_multi_routes`: split amount-out across
+    routes for the minimum amount-in, inf when the routes cannot be inverted
+    """
+    visited_pools = EMPTY_POOLSET
+
+    @cache
+    def cache_swap(route: Route, value: float, ignore_pools: PoolSet):
+        return route.swap_in(value, ignore_pools=ignore_pools)
+
+    def handler(value: float, idx: int):
+        nonlocal routes, visited_pools
+
+        if idx == 0:
+            visited_pools = EMPTY_POOLSET
+
+        current_in, _, just_visisted_pools = cache_swap(
+            routes[idx],
+            value,
+            visited_pools,
+        )
+        visited_pools = visited_pools.union(just_visisted_pools)
+        return current_in
+
+    min_in, splits = find_minimal_distribution(
+        amount_out,
+        len(routes),
+        optimal_lv=optimal_lv,
+        handler=handler,
+    )
+
+    visited_pools = EMPTY_POOLSET
+    route_splits: List[List[Dict]] = []
+    amount_ins: List[float] = []
+    used_paths: List[Route] = []
+
+    if min_in == inf:
+        return min_in, splits, route_splits, amount_ins, used_paths
+
+    metrics.count("route_explanations", len(splits))
+
+    for idx, split in enumerate(splits):
+        route = routes[idx]
+        current_in, path_splits, just_visisted_pools = cache_swap(
+            route,
+            split,
+            visited_pools,
+        )
+        visited_pools = visited_pools.union(just_visisted_pools)
+
+        if current_in > 0:
+            used_paths.append(route)
+            amount_ins.append(current_in)
+            route_splits.append(path_splits)
+
+    return min_in, splits, route_splits, amount_ins, used_paths
@@ -0,0 +1,151 @@
+import json
+import os
+from math import isfinite
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Literal
+from typing import Optional
+from typing import Tuple
+
+import numpy as np
+from pydantic import BaseModel
+from pydantic import validator
+
+from .models import Token
+from .snapshot import load_router
+from .sor import SmartOrderRouter
+
+QuoteKind = Literal["exact_in", "exact_out"]
+# NOTE: a quote result line (JSON) & the time spent quoting it (seconds, None on error)
+QuoteResult = Tuple[str, Optional[float]]
+
+
+class QuoteRequest(BaseModel):
+    """One JSONL line of a batch, `amount` is the amount-in of an exact-in quote
+    and the amount-out of an exact-out quote
+    """
+
+    token_in: Token
+    token_out: Token
+    amount: float
+    kind: QuoteKind = "exact_in"
+    id: Optional[str]
+
+    @validator("amount")
+    def check_amount(cls, amount: float) -> float:
+        # NOTE: JSON lines may carry Infinity & NaN, pydantic takes them as floats
+        if not isfinite(amount) or amount <= 0:
+            raise ValueError(f"amount must be a finite positive number, got {amount}")
+
+        return amount
+
+
+# NOTE: the router of a worker process, loaded once by `init_worker`
+ROUTER: Optional[SmartOrderRouter] = None
+
+
+def init_worker(snapshot: str, options: Dict[str, Any]):
+    global ROUTER
+    ROUTER = load_router(snapshot, **options)
+
+
+def quote(router: SmartOrderRouter, line: str) -> QuoteResult:
+    start = perf_counter()
+
+    try:
+        request = QuoteRequest.parse_raw(line)
+    except ValueError as e:
+        return json.dumps({"error": str(e)}), None
+
+    response = request.dict(exclude_none=True)
+
+    try:
+        if request.kind == "exact_in":
+            result, allocations = router.find_best_price_out(
+                request.token_in, request.amount, request.token_out
+            )
+        else:
+            result, allocations = router.find_best_price_in(
+                request.token_out, request.amount, request.token_in
+            )
+    except Exception as e:
+        # NOTE: a failed quote is an error line, the rest of the batch goes on
+        response.update(error=f"{type(e).__name__}: {e}")
+        return json.dumps(response), None
+
+    elapsed = perf_counter() - start
+    response.update(
+        result=result,
+        allocations=[[dex.name, volume] for dex, volume in allocations],
+        elapsed_ms=elapsed * 1000,
+    )
+    return json.dumps(response), elapsed
+
+
+def quote_chunk(lines: List[str]) -> List[QuoteResult]:
+    assert ROUTER, "worker is not initialized"
+    return [quote(ROUTER, line) for line in lines]
+
+
+def quote_batch(
+    lines: Iterable[str],
+    snapshot: str,
+    workers: Optional[int] = None,
+    chunksize=32,
+    **options,
+) -> Iterator[QuoteResult]:
+    """Quote JSONL requests on a pool of processes, each with its own router loaded
+    from `snapshot`. Results are yielded in input order, only a few chunks per worker
+    are in flight so the input is streamed rather than read at once
+    """
+    with ProcessPoolExecutor(
+        workers,
+        initializer=init_worker,
+        initargs=(snapshot, options),
+    ) as executor:
+        window = 2 * (workers or os.cpu_count() or 1)
+        pending: Deque[Future] = deque()
+        chunk: List[str] = []
+
+        def submit():
+            pending.append(executor.submit(quote_chunk, chunk.copy()))
+            chunk.clear()
+
+        for line in lines:
+            if not line.strip():
+                continue
+
+            chunk.append(line)
+
+            if len(chunk) == chunksize:
+                submit()
+
+            while len(pending) > window:
+                yield from pending.popleft().result()
+
+        if chunk:
+            submit()
+
+        while pending:
+            yield from pending.popleft().result()
+
+
+def summarize(latencies: List[float], seconds: float, errors=0) -> Dict[str, float]:
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "quotes": len(latencies),
+        "errors": errors,
+        "seconds": seconds,
+        "throughput_qps": len(latencies) / seconds if seconds else 0,
+        "p50_ms": float(np.percentile(values, 50)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "mean_ms": float(values.mean()),
+    }
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from math import floor
+from math import log
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
+
+from . import metrics
+
+T = TypeVar("T")
+PoolVersion = Callable[[str], int]
+CacheEntry = Tuple[object, Tuple[Tuple[str, int], ...]]
+AmountBucket = Callable[[float], Hashable]
+
+MISSING = object()
+
+
+def no_version(_: str) -> int:
+    return 0
+
+
+class SwapCache:
+    """Bounded LRU memo of swap results (pool, edge, route...) shared across quotes.
+    Every entry remembers the version of the pools it read, a hit on an entry whose
+    pools moved to a newer state is dropped and recomputed
+    """
+
+    maxsize: int
+    pool_version: PoolVersion
+    hits: int
+    misses: int
+    evictions: int
+    stales: int
+    _entries: "OrderedDict[Hashable, CacheEntry]"
+
+    def __init__(self, maxsize=100_000, pool_version: Optional[PoolVersion] = None):
+        self.maxsize = maxsize
+        self.pool_version = pool_version or no_version
+        self._entries = OrderedDict()
+        self.hits = self.misses = self.evictions = self.stales = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return key in self._entries
+
+    def get(self, key: Hashable, default=None):
+        """Cached value of `key`, `default` if missing or if its pools moved"""
+        entry = self._entries.get(key)
+        sink = metrics.SINK
+
+        if entry is not None:
+            value, versions = entry
+
+            if all(self.pool_version(name) == version for name, version in versions):
+                self.hits += 1
+                self._entries.move_to_end(key)
+
+                if sink is not None:
+                    sink.count("cache_hits")
+
+                return value
+
+            self.stales += 1
+            self._entries.pop(key)
+
+        self.misses += 1
+
+        if sink is not None:
+            sink.count("cache_misses")
+
+        return default
+
+    def put(self, key: Hashable, pools: Iterable[str], value: object):
+        """Store `value`, read from the current state of `pools`"""
+        versions = tuple((name, self.pool_version(name)) for name in set(pools))
+        self._entries[key] = (value, versions)
+
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def memo(
+        self,
+        key: Hashable,
+        pools: Callable[[], Iterable[str]],
+        compute: Callable[[], T],
+    ) -> T:
+        """Return the cached value of `key`, or compute & store it.
+        `pools` names the pools the value depends on, it is only called on a miss
+        """
+        value = self.get(key, MISSING)
+
+        if value is not MISSING:
+            return value  # type: ignore
+
+        value = compute()
+        self.put(key, pools(), value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "stales": self.stales,
+            "hit_ratio": self.hits / lookups if lookups else 0,
+        }
+
+
+def log_buckets(ratio=1.05) -> AmountBucket:
+    """Amounts within a factor `ratio` of each other (mostly) share a bucket"""
+    step = log(ratio)
+    return lambda amount: floor(log(amount) / step) if amount > 0 else None
+
+
+class QuoteCache(SwapCache):
+    """Quote plans shared by the amounts of a bucket (see `log_buckets`).
+    A plan records how a quote split its amount over routes & pools, amounts of the same
+    bucket reuse it rescaled and re-priced on their own amount; plans of pools moved to
+    a newer state are dropped like any `SwapCache` entry
+    """
+
+    bucket: AmountBucket
+
+    def __init__(
+        self,
+        maxsize=10_000,
+        pool_version: Optional[PoolVersion] = None,
+        bucket: Optional[AmountBucket] = None,
+    ):
+        super().__init__(maxsize, pool_version)
+        self.bucket = bucket or log_buckets()
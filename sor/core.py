@@ -1,24 +1,52 @@
 from collections.abc import Callable
+from math import inf
 from typing import List
+from typing import Literal
 from typing import Optional
 from typing import Tuple
 
+import numpy as np
+
+from . import metrics
+
 
 Splits = List[float]
 BatchSplitCallback = Callable[[Splits], None]
+VectorHandler = Callable[[np.ndarray, int], np.ndarray]
+
+# Split search strategies, each one runs on float amounts or (with `fixed=True`)
+# on integer token units
+SplitMode = Literal["grid", "vectorized", "water_fill", "adaptive"]
+
+
+def split_step(volume: float, i: int, optimal_lv: int, fixed=False) -> Tuple[float, float]:
+    """Head (i/optimal_lv of the volume) & remain of a split step. Integer volumes of the
+    fixed mode are split exactly, floats are rounded to 5 decimals
+    """
+    if fixed:
+        head = volume * i // optimal_lv
+        return head, volume - head
 
+    head = round(volume * i / optimal_lv, 5)
+    return head, round(volume - head, 5)
 
+
+@metrics.timed("batch_split")
 def batch_split(
     batch_volume: float,
     batch_count: int,
     optimal_lv=5,
     callback: Optional[BatchSplitCallback] = None,
+    fixed=False,
 ) -> Optional[List[Splits]]:
     result: List[Splits] = []
 
     if batch_count == 0:
         return None
 
+    if callback:
+        callback = metrics.counted("splits_enumerated", callback)
+
     if batch_count == 1:
         result = [[batch_volume]]
         return result if not callback else callback(result[0])
@@ -41,8 +69,7 @@ def batch_split(
             return
 
         for i in range(optimal_lv + 1):
-            split_head = round(current_batch_volume * i / optimal_lv, 5)
-            split_remain = round(current_batch_volume - split_head, 5)
+            split_head, split_remain = split_step(current_batch_volume, i, optimal_lv, fixed)
             queue.append(split_head)
 
             if split_remain > 0:
@@ -56,14 +83,20 @@ def batch_split(
             queue.pop()
 
     split(batch_volume)
+
+    if not callback:
+        metrics.count("splits_enumerated", len(result))
+
     return result if not callback else None
 
 
+@metrics.timed("find_optimal_distribution")
 def find_optimal_distribution(
     volume_in: float,
     split_count: int,
     handler: Callable[[float, int], float],
     optimal_lv=5,
+    fixed=False,
 ) -> Tuple[float, Splits]:
 
     if volume_in == 0:
@@ -75,6 +108,8 @@ def find_optimal_distribution(
     if split_count == 1:
         return handler(volume_in, 0), [volume_in]
 
+    handler = metrics.counted("handler_calls", handler)
+
     def try_each_split(splits: Splits):
         nonlocal result, optimal_splits
         current_result = sum([handler(value, i) for i, value in enumerate(splits)])
@@ -87,7 +122,322 @@ def find_optimal_distribution(
         volume_in,
         split_count,
         optimal_lv=optimal_lv,
-        callback=try_each_split,
+        callback=metrics.counted("candidate_splits", try_each_split),
+        fixed=fixed,
     )
 
     return result, optimal_splits
+
+
+def refine_distribution(
+    volume_in: float,
+    result: float,
+    splits: Splits,
+    handler: Callable[[float, int], float],
+    split_count: int,
+    optimal_lv=5,
+    tolerance=1e-3,
+    fixed=False,
+) -> Tuple[float, Splits]:
+    """Pattern search around the best split of an `optimal_lv` grid: move a step of volume
+    from one split to another while it improves, then halve the step, until the step falls
+    under `tolerance` of the volume. Integer volumes of the fixed mode move by whole units
+    """
+    if split_count == 1 or not splits:
+        return result, splits
+
+    def settle(value: float) -> float:
+        return value if fixed else round(value, 5)
+
+    splits = splits + [0 if fixed else float(0)] * (split_count - len(splits))
+    step = volume_in // optimal_lv // 2 if fixed else volume_in / optimal_lv / 2
+    min_step = max(tolerance * volume_in, 1) if fixed else tolerance * volume_in
+
+    def evaluate(candidate: Splits) -> float:
+        return sum([handler(value, i) for i, value in enumerate(candidate)])
+
+    while step >= min_step and settle(step) > 0:
+        best, best_splits = result, splits
+
+        for i in range(split_count):
+            moved = settle(min(step, splits[i]))
+
+            if moved <= 0:
+                continue
+
+            for j in range(split_count):
+                if i == j:
+                    continue
+
+                candidate = splits.copy()
+                candidate[i] = settle(candidate[i] - moved)
+                candidate[j] = settle(candidate[j] + moved)
+                current = evaluate(candidate)
+
+                if current > best:
+                    best, best_splits = current, candidate
+
+        if best > result:
+            result, splits = best, best_splits
+        else:
+            step = step // 2 if fixed else step / 2
+
+    return result, splits
+
+
+@metrics.timed("find_optimal_distribution")
+def find_optimal_distribution_adaptive(
+    volume_in: float,
+    split_count: int,
+    handler: Callable[[float, int], float],
+    optimal_lv=5,
+    tolerance=1e-3,
+    fixed=False,
+) -> Tuple[float, Splits]:
+    """Coarse-to-fine `find_optimal_distribution`: a coarse `optimal_lv` grid, then
+    `refine_distribution` zooms into the neighborhood of its best split
+    """
+    result, splits = find_optimal_distribution(
+        volume_in, split_count, handler, optimal_lv, fixed=fixed
+    )
+    return refine_distribution(
+        volume_in, result, splits, handler, split_count, optimal_lv, tolerance, fixed
+    )
+
+
+SplitPrefix = Tuple[Splits, float]
+
+
+def split_prefixes(
+    batch_volume: float,
+    batch_count: int,
+    optimal_lv=5,
+    min_count=1,
+    fixed=False,
+) -> List[SplitPrefix]:
+    """Cut the splits of `batch_split` into (prefix, remain) parts, in enumeration order.
+    A prefix with a remain is continued by `batch_split(remain, ...)`, a remain of 0 marks
+    a complete split. Prefixes are deepened until there are at least `min_count` parts
+    """
+    depth = 1
+
+    while True:
+        prefixes: List[SplitPrefix] = []
+
+        def walk(remain: float, prefix: Splits):
+            if len(prefix) == batch_count - 1:
+                prefixes.append((prefix + [remain], 0))
+                return
+
+            if len(prefix) == depth:
+                prefixes.append((prefix, remain))
+                return
+
+            for i in range(optimal_lv + 1):
+                split_head, split_remain = split_step(remain, i, optimal_lv, fixed)
+
+                if split_remain > 0:
+                    walk(split_remain, prefix + [split_head])
+                else:
+                    prefixes.append((prefix + [split_head], 0))
+
+        walk(batch_volume, [])
+
+        if len(prefixes) >= min_count or depth >= batch_count - 1:
+            return prefixes
+
+        depth += 1
+
+
+def find_optimal_distribution_from(
+    prefix: Splits,
+    remain: float,
+    split_count: int,
+    handler: Callable[[float, int], float],
+    optimal_lv=5,
+    fixed=False,
+) -> Tuple[float, Splits]:
+    """`find_optimal_distribution` restricted to the splits starting with `prefix`"""
+    result = float(0)
+    optimal_splits: List[float] = []
+
+    def try_each_split(splits: Splits):
+        nonlocal result, optimal_splits
+        current_result = sum([handler(value, i) for i, value in enumerate(splits)])
+
+        if current_result > result:
+            result = current_result
+            optimal_splits = splits
+
+    if not remain:
+        try_each_split(prefix)
+        return result, optimal_splits
+
+    batch_split(
+        remain,
+        split_count - len(prefix),
+        optimal_lv=optimal_lv,
+        callback=lambda splits: try_each_split(prefix + splits),
+        fixed=fixed,
+    )
+    return result, optimal_splits
+
+
+@metrics.timed("find_minimal_distribution")
+def find_minimal_distribution(
+    volume_out: float,
+    split_count: int,
+    handler: Callable[[float, int], float],
+    optimal_lv=5,
+) -> Tuple[float, Splits]:
+    """Counterpart of `find_optimal_distribution` for exact-out: the handler returns the
+    volume-in needed for a split of volume-out (inf if impossible), the smallest total wins
+    """
+    if volume_out == 0:
+        return 0, []
+
+    result = inf
+    optimal_splits: List[float] = []
+
+    if split_count == 1:
+        return handler(volume_out, 0), [volume_out]
+
+    handler = metrics.counted("handler_calls", handler)
+
+    def try_each_split(splits: Splits):
+        nonlocal result, optimal_splits
+        current_result = sum([handler(value, i) for i, value in enumerate(splits)])
+
+        if current_result < result:
+            result = current_result
+            optimal_splits = splits
+
+    batch_split(
+        volume_out,
+        split_count,
+        optimal_lv=optimal_lv,
+        callback=metrics.counted("candidate_splits", try_each_split),
+    )
+
+    return result, optimal_splits
+
+
+def bisect_volume_in(
+    volume_out: float,
+    handler: Callable[[float], float],
+    volume_hint: float = 1,
+    tolerance=1e-5,
+    max_iteration=100,
+) -> float:
+    """Smallest volume-in whose output (by `handler`) reaches volume-out, inf if none is found.
+    The search brackets the answer by doubling, then bisects within `max_iteration` calls
+    """
+    if volume_out == 0:
+        return 0
+
+    low, high = float(0), max(volume_hint, tolerance)
+    iteration = 0
+
+    while handler(high) < volume_out:
+        low, high = high, high * 2
+        iteration += 1
+
+        if iteration >= max_iteration:
+            return inf
+
+    while high - low > tolerance * max(high, 1) and iteration < max_iteration:
+        middle = (low + high) / 2
+
+        if handler(middle) >= volume_out:
+            high = middle
+        else:
+            low = middle
+
+        iteration += 1
+
+    return high
+
+
+def round_array(values: np.ndarray, ndigits=5) -> np.ndarray:
+    """Python's `round` on every element, np.round may disagree on the last digit"""
+    uniques, inverse = np.unique(values, return_inverse=True)
+    rounded = np.array([round(value, ndigits) for value in uniques.tolist()])
+    return rounded[inverse.reshape(-1)].reshape(values.shape)
+
+
+def split_grid(batch_volume: float, batch_count: int, optimal_lv=5, fixed=False) -> np.ndarray:
+    """Build every split `batch_split` would produce as one (candidates x batch_count) array.
+    Candidates keep the same order, splits ending early are padded with zeros.
+    Integer volumes of the fixed mode are split exactly, in an array of Python ints
+    """
+    if batch_count == 0:
+        return np.zeros((0, 0))
+
+    dtype = object if fixed else float
+    grid = np.zeros((1, batch_count), dtype=dtype)
+    remain = np.array([batch_volume if fixed else float(batch_volume)], dtype=dtype)
+
+    for col in range(batch_count - 1):
+        active = remain > 0
+        repeats = np.where(active, optimal_lv + 1, 1)
+        starts = np.cumsum(repeats) - repeats
+
+        grid = np.repeat(grid, repeats, axis=0)
+        remain = np.repeat(remain, repeats)
+        active = np.repeat(active, repeats)
+        steps = np.arange(len(grid)) - np.repeat(starts, repeats)
+
+        if fixed:
+            split_head = remain * steps // optimal_lv
+            split_remain = remain - split_head
+        else:
+            split_head = round_array(remain * steps / optimal_lv)
+            split_remain = round_array(remain - split_head)
+
+        grid[active, col] = split_head[active]
+        remain = np.where(active, split_remain, 0)
+
+    grid[:, -1] = np.where(remain > 0, remain, 0)
+    return grid
+
+
+@metrics.timed("find_optimal_distribution")
+def find_optimal_distribution_vectorized(
+    volume_in: float,
+    split_count: int,
+    handler: VectorHandler,
+    optimal_lv=5,
+    fixed=False,
+) -> Tuple[float, Splits]:
+    """Same search as `find_optimal_distribution`, but every candidate split is scored at once.
+    The handler receives an array of amounts for the split at `idx` and returns their outputs,
+    object arrays of Python ints in the fixed mode
+    """
+    if volume_in == 0:
+        return 0, []
+
+    if split_count == 0:
+        return float(0), []
+
+    dtype = object if fixed else float
+
+    if split_count == 1:
+        output = handler(np.array([volume_in], dtype=dtype), 0)[0]
+        return (output if fixed else float(output)), [volume_in]
+
+    grid = split_grid(volume_in, split_count, optimal_lv=optimal_lv, fixed=fixed)
+    scores = np.zeros(len(grid), dtype=dtype)
+    metrics.count("candidate_splits", len(grid))
+
+    for idx in range(split_count):
+        # NOTE: the grid repeats a few amounts many times, only score the unique ones
+        values, inverse = np.unique(grid[:, idx], return_inverse=True)
+        metrics.count("handler_calls")
+        scores += handler(values, idx)[inverse.reshape(-1)]
+
+    best = int(np.argmax(scores))
+
+    if scores[best] <= 0:
+        return float(0), []
+
+    return (scores[best] if fixed else float(scores[best])), grid[best].tolist()
@@ -0,0 +1,186 @@
+import sys
+from contextlib import contextmanager
+from functools import wraps
+from time import perf_counter
+from types import ModuleType
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Protocol
+from typing import Tuple
+from typing import TypeVar
+
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+class Sink(Protocol):
+    def record(self, stage: str, elapsed: float):
+        ...
+
+    def count(self, counter: str, value: int = 1):
+        ...
+
+
+class StatsSink:
+    """Collect stage timers (seconds, inclusive of nested stages) & counters in dicts"""
+
+    timers: Dict[str, float]
+    calls: Dict[str, int]
+    counters: Dict[str, int]
+
+    def __init__(self):
+        self.timers, self.calls, self.counters = {}, {}, {}
+
+    def record(self, stage: str, elapsed: float):
+        self.timers[stage] = self.timers.get(stage, 0) + elapsed
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def count(self, counter: str, value: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def reset(self):
+        self.timers.clear()
+        self.calls.clear()
+        self.counters.clear()
+
+    def report(self) -> Dict[str, Any]:
+        hits = self.counters.get("cache_hits", 0)
+        lookups = hits + self.counters.get("cache_misses", 0)
+        return {
+            "timers": dict(self.timers),
+            "calls": dict(self.calls),
+            "counters": dict(self.counters),
+            "cache_hit_ratio": hits / lookups if lookups else 0,
+        }
+
+
+class CallbackSink:
+    """Forward every measure to `callback(kind, name, value)`, kind is "timer" or "counter" """
+
+    def __init__(self, callback: Callable[[str, str, float], None]):
+        self.callback = callback
+
+    def record(self, stage: str, elapsed: float):
+        self.callback("timer", stage, elapsed)
+
+    def count(self, counter: str, value: int = 1):
+        self.callback("counter", counter, value)
+
+
+# NOTE: instrumentation is off while no sink is installed,
+# call sites only pay for reading this global
+SINK: Optional[Sink] = None
+
+# NOTE: the stages of `timed` are the undecorated functions while no sink is installed,
+# installing one swaps every reference to them (module & class attributes) for a timing
+# wrapper, uninstalling it puts the functions back
+STAGES: Dict[int, Tuple[Callable, str]] = {}
+PATCHES: List[Tuple[object, str, Callable, Callable]] = []
+
+
+def install(sink: Optional[Sink]) -> Optional[Sink]:
+    """Install a sink (None disables instrumentation), return the previous one"""
+    global SINK
+    previous, SINK = SINK, sink
+
+    if sink is not None and not PATCHES:
+        patch_stages()
+    elif sink is None and PATCHES:
+        restore_stages()
+
+    return previous
+
+
+def timing(stage: str, f: F) -> F:
+    @wraps(f)
+    def wrapper(*args, **kwargs):
+        sink = SINK
+
+        if sink is None:
+            return f(*args, **kwargs)
+
+        start = perf_counter()
+
+        try:
+            return f(*args, **kwargs)
+        finally:
+            sink.record(stage, perf_counter() - start)
+
+    return wrapper  # type: ignore
+
+
+def patch_stages():
+    wrappers = {idx: timing(stage, f) for idx, (f, stage) in STAGES.items()}
+
+    for module in list(sys.modules.values()):
+        if not isinstance(module, ModuleType):
+            continue
+
+        namespace = vars(module)
+        owners: List[object] = [module]
+        owners += [
+            value
+            for value in namespace.values()
+            if isinstance(value, type) and value.__module__ == module.__name__
+        ]
+
+        for owner in owners:
+            for name, value in list(vars(owner).items()):
+                wrapper = wrappers.get(id(value))
+
+                if wrapper is not None and STAGES[id(value)][0] is value:
+                    setattr(owner, name, wrapper)
+                    PATCHES.append((owner, name, value, wrapper))
+
+
+def restore_stages():
+    while PATCHES:
+        owner, name, f, wrapper = PATCHES.pop()
+
+        if vars(owner).get(name) is wrapper:
+            setattr(owner, name, f)
+
+
+@contextmanager
+def instrument(sink: Optional[Sink] = None):
+    sink = sink or StatsSink()
+    previous = install(sink)
+
+    try:
+        yield sink
+    finally:
+        install(previous)
+
+
+def count(counter: str, value: int = 1):
+    if SINK is not None:
+        SINK.count(counter, value)
+
+
+def timed(stage: str) -> Callable[[F], F]:
+    """Record the duration of every call of the decorated function as `stage`, while a
+    sink is installed (the function is left as is otherwise, see `install`)
+    """
+
+    def decorator(f: F) -> F:
+        STAGES[id(f)] = (f, stage)
+        return f
+
+    return decorator
+
+
+def counted(counter: str, f: F) -> F:
+    """Wrap `f` to count its calls, only used while a sink is installed"""
+    sink = SINK
+
+    if sink is None:
+        return f
+
+    def wrapper(*args, **kwargs):
+        sink.count(counter)
+        return f(*args, **kwargs)
+
+    return wrapper  # type: ignore
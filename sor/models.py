@@ -1,13 +1,21 @@
 from functools import reduce
+from math import ceil
+from math import inf
 from typing import Dict
 from typing import List
 from typing import Literal
 from typing import Optional
 from typing import Set
+from typing import Tuple
+from typing import Union
 
+import numpy as np
 from pydantic import BaseModel
 from terminaltables import AsciiTable
 
+from . import metrics
+from .core import round_array
+
 
 class USDPrice:
     """Token price to USD"""
@@ -45,6 +53,21 @@ TokenUnitPrices: Dict[Token, USDPrice] = {
     "SOL": USDPrice(34.99),
 }
 
+# Token decimals as on-chain, amounts of the fixed-point mode are integers of
+# 10^-decimals token (e.g. satoshis, wei)
+TokenDecimals: Dict[Token, int] = {
+    "BTC": 8,
+    "ETH": 18,
+    "USDC": 6,
+    "TOMO": 18,
+    "KNC": 18,
+    "USDT": 6,
+    "SOL": 9,
+}
+
+# Fees of the fixed-point mode are in millionths (pips)
+FEE_UNITS = 1_000_000
+
 PRICE_TABLE = AsciiTable(
     [
         ["Symbol", "Price (USD)"],
@@ -71,6 +94,34 @@ def amm_swap(delta_x: float, x: float, y: float) -> float:
     return (y * delta_x) / (x + delta_x)
 
 
+def to_units(token: Token, amount: float) -> int:
+    return round(amount * 10 ** TokenDecimals[token])
+
+
+def from_units(token: Token, units: int) -> float:
+    return units / 10 ** TokenDecimals[token]
+
+
+def amm_swap_fixed(delta_x: int, x: int, y: int) -> int:
+    """`amm_swap` on integer units, rounded down as on-chain.
+    The formula holds for the amounts as well as for their values in USD
+    """
+    if x + delta_x <= 0:
+        return 0
+
+    return y * delta_x // (x + delta_x)
+
+
+def amm_swap_in(delta_y: float, x: float, y: float) -> float:
+    """Inverse of `amm_swap`, the delta_x needed to take delta_y out
+    ==> delta_x = (x * delta_y) / (y - delta_y)
+    """
+    if delta_y >= y:
+        return inf
+
+    return (x * delta_y) / (y - delta_y)
+
+
 # models & classes
 class PoolToken(BaseModel):
     token: Token
@@ -88,6 +139,48 @@ class PoolToken(BaseModel):
         return price * self.amount
 
 
+class SwapOverlay:
+    """Copy-on-write reserves of a simulation over the shared pools.
+    Swaps given the overlay read the token amounts through it and record their trades in
+    it, the pools are never mutated nor copied. Dropping (or `reset`) the overlay
+    discards the trades, many overlays may run over the same pools
+    """
+
+    __slots__ = ("amounts",)
+
+    amounts: Dict[Tuple[str, Token], float]
+
+    def __init__(self):
+        self.amounts = {}
+
+    def __len__(self):
+        return len(self.amounts)
+
+    def amount(self, pool: str, pool_token: PoolToken) -> float:
+        return self.amounts.get((pool, pool_token.token), pool_token.amount)
+
+    def reserve(self, pool: str, pool_token: PoolToken) -> float:
+        return calc_value(pool_token.token, self.amount(pool, pool_token))
+
+    def trade(
+        self,
+        pool: str,
+        pool_token_in: PoolToken,
+        amount_in: float,
+        pool_token_out: PoolToken,
+        amount_out: float,
+    ):
+        self.amounts[(pool, pool_token_in.token)] = (
+            self.amount(pool, pool_token_in) + amount_in
+        )
+        self.amounts[(pool, pool_token_out.token)] = (
+            self.amount(pool, pool_token_out) - amount_out
+        )
+
+    def reset(self):
+        self.amounts = {}
+
+
 class Pool(BaseModel):
     """Swap calculation based on Constant product market maker (x*y=k)"""
 
@@ -119,6 +212,15 @@ class Pool(BaseModel):
         for tk in self.tokens:
             tk.weight = tk.reserve / self.tvl
 
+    def update_reserves(self, reserves: Dict[Token, float]):
+        for tk in self.tokens:
+            if tk.token in reserves:
+                tk.amount = reserves[tk.token]
+
+        self._update_tvl()
+        self._update_k()
+        self._set_token_weights()
+
     def get_token(self, token: Token) -> Optional[PoolToken]:
         return next((t for t in self.tokens if t.token == token), None)
 
@@ -128,8 +230,14 @@ class Pool(BaseModel):
         amount_in: float,
         token_out: Token,
         do_swap=False,
+        overlay: Optional[SwapOverlay] = None,
     ) -> float:
-        """Return amount-in and amount-out"""
+        """Return amount-in and amount-out.
+        With an `overlay`, reserves are read through it & `do_swap` records the trade in it
+        """
+        if metrics.SINK is not None:
+            metrics.SINK.count("pool_swaps")
+
         if not self.k:
             return 0
 
@@ -143,12 +251,24 @@ class Pool(BaseModel):
             return 0
 
         amount_in_after_fee = amount_in * (1 - self.fee)
-        x, y = pool_token_in.reserve, pool_token_out.reserve
+        x = (
+            overlay.reserve(self.name, pool_token_in)
+            if overlay is not None
+            else pool_token_in.reserve
+        )
+        y = (
+            overlay.reserve(self.name, pool_token_out)
+            if overlay is not None
+            else pool_token_out.reserve
+        )
+
         delta_x = calc_value(token_in, amount_in_after_fee)
         delta_y = amm_swap(delta_x, x, y)
         amount_out = price_to_amount(token_out, delta_y)
 
-        if do_swap:
+        if do_swap and overlay is not None:
+            overlay.trade(self.name, pool_token_in, amount_in, pool_token_out, amount_out)
+        elif do_swap:
             pool_token_in.amount += amount_in
             pool_token_out.amount -= amount_out
             self._update_tvl()
@@ -157,11 +277,352 @@ class Pool(BaseModel):
 
         return round(amount_out, 5)
 
+    def swap_fixed(self, token_in: Token, amount_in: int, token_out: Token) -> int:
+        """`swap` on integer token units (see `TokenDecimals`), exact & rounded down"""
+        if metrics.SINK is not None:
+            metrics.SINK.count("pool_swaps")
+
+        if not self.k or token_in == token_out:
+            return 0
+
+        pool_token_in = self.get_token(token_in)
+        pool_token_out = self.get_token(token_out)
+
+        if not pool_token_in or not pool_token_out:
+            return 0
+
+        fee = round(self.fee * FEE_UNITS)
+        amount_in_after_fee = amount_in * (FEE_UNITS - fee) // FEE_UNITS
+        x = to_units(token_in, pool_token_in.amount)
+        y = to_units(token_out, pool_token_out.amount)
+        return amm_swap_fixed(amount_in_after_fee, x, y)
+
+    def swap_in(self, token_in: Token, amount_out: float, token_out: Token) -> float:
+        """Return the amount-in needed for amount-out, inf if the pool cannot provide it"""
+        if amount_out == 0:
+            return 0
+
+        if not self.k or token_in == token_out:
+            return inf
+
+        pool_token_in = self.get_token(token_in)
+        pool_token_out = self.get_token(token_out)
+
+        if not pool_token_in or not pool_token_out:
+            return inf
+
+        x, y = pool_token_in.reserve, pool_token_out.reserve
+        delta_y = calc_value(token_out, amount_out)
+        delta_x = amm_swap_in(delta_y, x, y)
+        amount_in = price_to_amount(token_in, delta_x) / (1 - self.fee)
+
+        if amount_in == inf:
+            return inf
+
+        # NOTE: round up, so swapping the amount-in gives at least amount-out
+        return ceil(amount_in * 1e5) / 1e5
+
+    def swap_many(
+        self,
+        token_in: Token,
+        amounts_in: np.ndarray,
+        token_out: Token,
+        overlay: Optional[SwapOverlay] = None,
+    ) -> np.ndarray:
+        """Vectorized `swap` over an array of amount-in, the pool is never updated"""
+        metrics.count("pool_swaps", len(amounts_in))
+
+        if not self.k or token_in == token_out:
+            return np.zeros(len(amounts_in))
+
+        pool_token_in = self.get_token(token_in)
+        pool_token_out = self.get_token(token_out)
+
+        if not pool_token_in or not pool_token_out:
+            return np.zeros(len(amounts_in))
+
+        amount_in_after_fee = amounts_in * (1 - self.fee)
+        x = (
+            overlay.reserve(self.name, pool_token_in)
+            if overlay is not None
+            else pool_token_in.reserve
+        )
+        y = (
+            overlay.reserve(self.name, pool_token_out)
+            if overlay is not None
+            else pool_token_out.reserve
+        )
+
+        # NOTE: `amm_swap` on arrays, amounts are valued as in `calc_value`
+        delta_x = TokenUnitPrices[token_in].value * amount_in_after_fee
+        delta_y = y * delta_x / (x + delta_x)
+        return round_array(delta_y / TokenUnitPrices[token_out].value)
+
     def clone(self):
         cloned_tokens = [PoolToken(**tk.dict()) for tk in self.tokens]
         return Pool(self.name, self.fee, cloned_tokens)
 
 
+class PoolStateTable:
+    """Compiled state of a whole pool universe, one flat array per field.
+    Token reserves of pool `i` sit in slots `offsets[i]:offsets[i + 1]`
+    and `slots[i, t]` locates the slot of token index `t` (-1 if missing).
+    `units` holds the reserves in integer token units for fixed-point swaps,
+    built on first use & kept in sync with `amounts`.
+    Added pools get a new row, removed pools leave a tombstone row (out of `pool_index`,
+    swapping nothing) until the table is compacted
+    """
+
+    tokens: List[Token]
+    token_index: Dict[Token, int]
+    names: List[str]
+    pool_index: Dict[str, int]
+    prices: np.ndarray
+    fees: np.ndarray
+    ks: np.ndarray
+    offsets: np.ndarray
+    token_ids: np.ndarray
+    amounts: np.ndarray
+    slots: np.ndarray
+    removed: int
+
+    def __init__(self, pools: List[Pool]):
+        tokens = sorted({t.token for p in pools for t in p.tokens})
+        token_index = {token: idx for idx, token in enumerate(tokens)}
+        offsets = np.zeros(len(pools) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(p.tokens) for p in pools])
+        token_ids = [token_index[t.token] for p in pools for t in p.tokens]
+
+        self._load(
+            tokens,
+            [p.name for p in pools],
+            np.array([p.fee for p in pools], dtype=float),
+            np.array([p.k or 0 for p in pools], dtype=float),
+            offsets,
+            np.array(token_ids, dtype=np.int64),
+            np.array([t.amount for p in pools for t in p.tokens], dtype=float),
+        )
+
+    @classmethod
+    def from_arrays(
+        cls,
+        tokens: List[Token],
+        names: List[str],
+        fees: np.ndarray,
+        ks: np.ndarray,
+        offsets: np.ndarray,
+        token_ids: np.ndarray,
+        amounts: np.ndarray,
+    ) -> "PoolStateTable":
+        """Table over already compiled arrays (e.g. a snapshot), no pool is visited"""
+        table = cls.__new__(cls)
+        table._load(tokens, names, fees, ks, offsets, token_ids, amounts)
+        return table
+
+    def _load(
+        self,
+        tokens: List[Token],
+        names: List[str],
+        fees: np.ndarray,
+        ks: np.ndarray,
+        offsets: np.ndarray,
+        token_ids: np.ndarray,
+        amounts: np.ndarray,
+    ):
+        self.tokens = tokens
+        self.token_index = {token: idx for idx, token in enumerate(tokens)}
+        self.names = names
+        self.pool_index = {name: idx for idx, name in enumerate(names)}
+        self.prices = np.array([TokenUnitPrices[t].value for t in tokens])
+        self.fees = fees
+        self.ks = ks
+        self.offsets = offsets
+        self.token_ids = token_ids
+        self.amounts = amounts
+
+        self.slots = np.full((len(names), len(tokens)), -1, dtype=np.int64)
+        pool_ids = np.repeat(np.arange(len(names)), np.diff(offsets))
+        self.slots[pool_ids, token_ids] = np.arange(len(token_ids))
+        self._units: Optional[np.ndarray] = None
+        self.removed = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, pool: Pool) -> int:
+        """Append the row of a new pool (and a column per new token), return its index.
+        The arrays are copied, no other pool is visited
+        """
+        new_tokens = [t.token for t in pool.tokens if t.token not in self.token_index]
+
+        if new_tokens:
+            # NOTE: new lists, the token & pool lists may be shared (e.g. by a snapshot)
+            self.tokens = [*self.tokens, *new_tokens]
+            self.token_index = {token: idx for idx, token in enumerate(self.tokens)}
+            prices = [TokenUnitPrices[token].value for token in new_tokens]
+            self.prices = np.concatenate([self.prices, prices])
+            columns = np.full((len(self.names), len(new_tokens)), -1, dtype=np.int64)
+            self.slots = np.hstack([self.slots, columns])
+
+        idx, start = len(self.names), len(self.token_ids)
+        token_ids = [self.token_index[t.token] for t in pool.tokens]
+        row = np.full((1, len(self.tokens)), -1, dtype=np.int64)
+        row[0, token_ids] = np.arange(start, start + len(token_ids))
+
+        self.names = [*self.names, pool.name]
+        self.pool_index.update({pool.name: idx})
+        self.fees = np.append(self.fees, pool.fee)
+        self.ks = np.append(self.ks, pool.k or 0)
+        self.offsets = np.append(self.offsets, start + len(token_ids))
+        self.token_ids = np.append(self.token_ids, np.array(token_ids, dtype=np.int64))
+        self.amounts = np.append(self.amounts, [t.amount for t in pool.tokens])
+        self.slots = np.vstack([self.slots, row])
+
+        if self._units is not None:
+            units = np.array([to_units(t.token, t.amount) for t in pool.tokens], dtype=object)
+            self._units = np.concatenate([self._units, units])
+
+        return idx
+
+    def remove(self, name: str):
+        """Tombstone the row of a removed pool"""
+        idx = self.pool_index.pop(name)
+        self.ks[idx] = 0
+        self.slots[idx] = -1
+        self.removed += 1
+
+    def compact(self) -> "PoolStateTable":
+        """A new table of the live rows, built from the arrays (no pool is visited).
+        This table is left as it is, for the readers of its rows (e.g. a snapshot)
+        """
+        rows = np.array(sorted(self.pool_index.values()), dtype=np.int64)
+        counts = np.diff(self.offsets)[rows]
+        offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        slots = np.repeat(self.offsets[rows] - offsets[:-1], counts) + np.arange(offsets[-1])
+
+        table = PoolStateTable.from_arrays(
+            self.tokens,
+            [self.names[idx] for idx in rows.tolist()],
+            self.fees[rows],
+            self.ks[rows],
+            offsets,
+            self.token_ids[slots],
+            self.amounts[slots],
+        )
+
+        if self._units is not None:
+            table._units = self._units[slots]
+
+        return table
+
+    def sync(self, pool: Pool):
+        """Copy the reserves of an updated pool back to the table"""
+        idx = self.pool_index[pool.name]
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        self.amounts[start:end] = [t.amount for t in pool.tokens]
+        self.ks[idx] = pool.k or 0
+
+        if self._units is not None:
+            self._units[start:end] = [to_units(t.token, t.amount) for t in pool.tokens]
+
+    @property
+    def units(self) -> np.ndarray:
+        """Reserves in integer token units (Python ints, they overflow int64)"""
+        if self._units is None:
+            decimals = [TokenDecimals[self.tokens[t]] for t in self.token_ids.tolist()]
+            self._units = np.array(
+                [
+                    round(amount * 10**decimal)
+                    for amount, decimal in zip(self.amounts.tolist(), decimals)
+                ],
+                dtype=object,
+            )
+
+        return self._units
+
+    def pool(self, idx: int) -> Pool:
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        tokens = [
+            PoolToken(token=self.tokens[token_id], amount=amount, weight=None)
+            for token_id, amount in zip(
+                self.token_ids[start:end].tolist(),
+                self.amounts[start:end].tolist(),
+            )
+        ]
+        return Pool(self.names[idx], float(self.fees[idx]), tokens)
+
+    def swap(
+        self,
+        pool_ids: np.ndarray,
+        token_in: Token,
+        amounts_in: Union[float, np.ndarray],
+        token_out: Token,
+    ) -> np.ndarray:
+        """Batched `Pool.swap` of `amounts_in[i]` on pool `pool_ids[i]`, nothing is updated"""
+        pool_ids, amounts_in = np.broadcast_arrays(pool_ids, np.asarray(amounts_in, float))
+        result = np.zeros(pool_ids.shape)
+        metrics.count("pool_swaps", result.size)
+
+        if token_in == token_out:
+            return result
+
+        if token_in not in self.token_index or token_out not in self.token_index:
+            return result
+
+        tin, tout = self.token_index[token_in], self.token_index[token_out]
+        slot_in, slot_out = self.slots[pool_ids, tin], self.slots[pool_ids, tout]
+        valid = (slot_in >= 0) & (slot_out >= 0) & (self.ks[pool_ids] != 0)
+
+        if not valid.any():
+            return result
+
+        price_in, price_out = self.prices[tin], self.prices[tout]
+        amount_in_after_fee = amounts_in[valid] * (1 - self.fees[pool_ids[valid]])
+        x = price_in * self.amounts[slot_in[valid]]
+        y = price_out * self.amounts[slot_out[valid]]
+        delta_x = price_in * amount_in_after_fee
+        delta_y = amm_swap(delta_x, x, y)
+        result[valid] = round_array(delta_y / price_out)
+        return result
+
+    def swap_fixed(
+        self,
+        pool_ids: np.ndarray,
+        token_in: Token,
+        amounts_in: Union[int, np.ndarray],
+        token_out: Token,
+    ) -> np.ndarray:
+        """Batched `Pool.swap_fixed` over the integer reserves of the table,
+        an object array of Python ints
+        """
+        pool_ids, amounts_in = np.broadcast_arrays(pool_ids, np.asarray(amounts_in, object))
+        result = np.zeros(pool_ids.shape, dtype=object)
+        metrics.count("pool_swaps", result.size)
+
+        if token_in == token_out:
+            return result
+
+        if token_in not in self.token_index or token_out not in self.token_index:
+            return result
+
+        tin, tout = self.token_index[token_in], self.token_index[token_out]
+        slot_in, slot_out = self.slots[pool_ids, tin], self.slots[pool_ids, tout]
+        valid = (slot_in >= 0) & (slot_out >= 0) & (self.ks[pool_ids] != 0)
+
+        if not valid.any():
+            return result
+
+        fees = [round(fee * FEE_UNITS) for fee in self.fees[pool_ids[valid]].tolist()]
+        amount_in_after_fee = [
+            amount * (FEE_UNITS - fee) // FEE_UNITS
+            for amount, fee in zip(amounts_in[valid].tolist(), fees)
+        ]
+        x, y = self.units[slot_in[valid]].tolist(), self.units[slot_out[valid]].tolist()
+        result[valid] = [amm_swap_fixed(*args) for args in zip(amount_in_after_fee, x, y)]
+        return result
+
+
 class Dex(BaseModel):
     name: str
     pools: List[Pool]
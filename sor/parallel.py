@@ -0,0 +1,277 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .algorithm import Edge
+from .algorithm import explain_route_splits
+from .algorithm import quote_through
+from .algorithm import Route
+from .algorithm import route_split_handler
+from .cache import QuoteCache
+from .cache import SwapCache
+from .core import find_optimal_distribution
+from .core import find_optimal_distribution_from
+from .core import refine_distribution
+from .core import split_prefixes
+from .core import SplitMode
+from .core import Splits
+from .models import Pool
+from .models import PoolStateTable
+from .models import Token
+
+# NOTE: a route by the names of its pools, what is shipped to the workers per task
+RoutePlan = Tuple[Tuple[Token, Token, Tuple[str, ...]], ...]
+Handler = Callable[[float, int], float]
+
+
+def route_plan(route: Route) -> RoutePlan:
+    return tuple(
+        (e.token_in, e.token_out, tuple(p.name for p in e.pools)) for e in route.edges
+    )
+
+
+# NOTE: reserves of the pools updated since the workers started, by pool name,
+# tagged with the graph version of the update
+Reserves = Dict[str, Tuple[int, Dict[Token, float]]]
+# NOTE: pools added since the workers started, by pool name, tagged with the graph
+# version of the addition
+AddedPools = Dict[str, Tuple[int, Pool]]
+HandlerKey = Tuple[Tuple[RoutePlan, ...], int, SplitMode, bool, Tuple[Tuple[str, int], ...]]
+
+# NOTE: state of a worker process, the pools are shipped once by `init_split_worker`
+# and the handlers are kept so their memoized swaps serve the next tasks
+POOL_MAP: Dict[str, Pool] = {}
+POOL_VERSIONS: Dict[str, int] = {}
+HANDLERS: Dict[HandlerKey, Handler] = {}
+MAX_HANDLERS = 64
+
+
+def init_split_worker(pools: List[Pool]):
+    global POOL_MAP
+    POOL_MAP = {pool.name: pool for pool in pools}
+    POOL_VERSIONS.clear()
+    HANDLERS.clear()
+
+
+def apply_pools(added: AddedPools):
+    """Bring the pools added since a worker started into it"""
+    for name, (version, pool) in added.items():
+        if POOL_VERSIONS.get(name, 0) < version:
+            POOL_MAP[name] = pool
+            POOL_VERSIONS[name] = version
+
+
+def apply_reserves(reserves: Reserves):
+    """Bring the pools of a worker up to the reserves shipped with a task"""
+    for name, (version, amounts) in reserves.items():
+        if POOL_VERSIONS.get(name, 0) < version:
+            POOL_MAP[name].update_reserves(amounts)
+            POOL_VERSIONS[name] = version
+
+
+def build_route(plan: RoutePlan) -> Route:
+    edges = [
+        Edge(token_in=token_in, token_out=token_out, pools=[POOL_MAP[n] for n in names])
+        for token_in, token_out, names in plan
+    ]
+    return Route(edges=edges)
+
+
+def search_prefix(
+    plans: Tuple[RoutePlan, ...],
+    optimal_lv: int,
+    mode: SplitMode,
+    prefix: Splits,
+    remain: float,
+    reserves: Optional[Reserves] = None,
+    fixed=False,
+    added: Optional[AddedPools] = None,
+) -> Tuple[float, Splits]:
+    apply_pools(added or {})
+    apply_reserves(reserves or {})
+    # NOTE: the versions of the shipped pools are in the key, a handler never serves
+    # swaps memoized on older pools or reserves
+    shipped = {*(reserves or {}), *(added or {})}
+    versions = tuple(sorted((name, POOL_VERSIONS.get(name, 0)) for name in shipped))
+    key = (plans, optimal_lv, mode, fixed, versions)
+    handler = HANDLERS.get(key)
+
+    if handler is None:
+        if len(HANDLERS) >= MAX_HANDLERS:
+            HANDLERS.clear()
+
+        routes = [build_route(plan) for plan in plans]
+        handler, _ = route_split_handler(routes, optimal_lv, mode, fixed=fixed)
+        HANDLERS[key] = handler
+
+    return find_optimal_distribution_from(
+        prefix, remain, len(plans), handler, optimal_lv, fixed=fixed
+    )
+
+
+class ParallelSplitSearch:
+    """Route-level split search over a pool of processes.
+    The candidate splits are cut by prefix into a few tasks per worker, every task
+    returns its earliest best split and the earliest best of all wins, so the result is
+    the one of the sequential search. Workers hold a copy of the pools (e.g. of the live
+    graph) taken when the search is created, added pools (`add`) & reserve updates
+    (`update`) are shipped with the next tasks on these pools. Removed pools are left in
+    the workers, no route reaches them
+    """
+
+    workers: int
+    reserves: Reserves
+    added: AddedPools
+
+    def __init__(self, pools: List[Pool], workers: Optional[int] = None, tasks_per_worker=4):
+        self.workers = workers or os.cpu_count() or 1
+        self.tasks_per_worker = tasks_per_worker
+        self.reserves = {}
+        self.added = {}
+        self.executor = ProcessPoolExecutor(
+            self.workers,
+            initializer=init_split_worker,
+            initargs=(pools,),
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def add(self, pool: Pool, version: int):
+        """Record a pool added to the graph, for the workers to pick up"""
+        self.added.update({pool.name: (version, pool)})
+
+    def update(self, pool: Pool, version: int):
+        """Record the new reserves of a pool, for the workers to pick up"""
+        amounts = {t.token: t.amount for t in pool.tokens}
+        self.reserves.update({pool.name: (version, amounts)})
+
+    def find_optimal_distribution(
+        self,
+        routes: List[Route],
+        amount_in: float,
+        optimal_lv=5,
+        mode: SplitMode = "grid",
+        fixed=False,
+    ) -> Tuple[float, Splits]:
+        if amount_in == 0:
+            return 0, []
+
+        plans = tuple(route_plan(r) for r in routes)
+        names = {name for plan in plans for _, _, pool_names in plan for name in pool_names}
+        reserves = {name: self.reserves[name] for name in names & self.reserves.keys()}
+        added = {name: self.added[name] for name in names & self.added.keys()}
+        prefixes = split_prefixes(
+            amount_in,
+            len(routes),
+            optimal_lv=optimal_lv,
+            min_count=self.workers * self.tasks_per_worker,
+            fixed=fixed,
+        )
+        futures = [
+            self.executor.submit(
+                search_prefix,
+                plans,
+                optimal_lv,
+                mode,
+                prefix,
+                remain,
+                reserves,
+                fixed,
+                added,
+            )
+            for prefix, remain in prefixes
+        ]
+
+        result = float(0)
+        optimal_splits: Splits = []
+
+        for future in futures:
+            current_result, splits = future.result()
+
+            if current_result > result:
+                result = current_result
+                optimal_splits = splits
+
+        return result, optimal_splits
+
+    def calc_amount_out_on_multi_routes(
+        self,
+        routes: List[Route],
+        amount_in: float,
+        optimal_lv=5,
+        mode: SplitMode = "grid",
+        table: Optional[PoolStateTable] = None,
+        swap_cache: Optional[SwapCache] = None,
+        quote_cache: Optional[QuoteCache] = None,
+        fixed=False,
+    ):
+        """Parallel `calc_amount_out_on_multi_routes`, with the same results & cache keys"""
+
+        def calc():
+            return self._calc(routes, amount_in, optimal_lv, mode, table, swap_cache, fixed)
+
+        def compute():
+            if swap_cache is not None:
+                key = (
+                    "routes",
+                    tuple(r.key() for r in routes),
+                    amount_in,
+                    optimal_lv,
+                    mode,
+                    fixed,
+                )
+                return swap_cache.memo(
+                    key, lambda: [name for r in routes for name in r.pool_names()], calc
+                )
+
+            return calc()
+
+        if quote_cache is not None:
+            return quote_through(
+                quote_cache, routes, amount_in, optimal_lv, mode, compute, fixed, table
+            )
+
+        return compute()
+
+    def _calc(
+        self,
+        routes: List[Route],
+        amount_in: float,
+        optimal_lv: int,
+        mode: SplitMode,
+        table: Optional[PoolStateTable],
+        swap_cache: Optional[SwapCache],
+        fixed=False,
+    ):
+        handler, cache_swap = route_split_handler(
+            routes, optimal_lv, mode, table, swap_cache, fixed
+        )
+
+        if len(routes) == 1:
+            max_out, splits = find_optimal_distribution(amount_in, 1, handler, optimal_lv)
+        else:
+            max_out, splits = self.find_optimal_distribution(
+                routes, amount_in, optimal_lv, mode, fixed
+            )
+
+        if mode == "adaptive":
+            # NOTE: the coarse grid runs on the workers, the refinement is sequential
+            max_out, splits = refine_distribution(
+                amount_in, max_out, splits, handler, len(routes), optimal_lv, fixed=fixed
+            )
+
+        route_splits, amount_outs, used_paths = explain_route_splits(
+            routes, splits, cache_swap, optimal_lv
+        )
+        return max_out, splits, route_splits, amount_outs, used_paths
@@ -0,0 +1,237 @@
+from heapq import heappop
+from heapq import heappush
+from math import inf
+from math import log
+from typing import cast
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from . import metrics
+from .algorithm import construct_path
+from .algorithm import pair_bound
+from .algorithm import PoolMap
+from .algorithm import Route
+from .algorithm import RouteIndex
+from .algorithm import select_routes
+from .models import Token
+from .models import TokenUnitPrices
+from .preprocess import PoolChange
+from .preprocess import PoolGraph
+from .preprocess import PoolIds
+from .preprocess import TokenPairsPools
+
+# NOTE: token -> neighbour -> weight, tokens are plain strings here
+# so the search runs on any graph, not only on the tokens of the models
+LogRateGraph = Dict[str, Dict[str, float]]
+Path = Tuple[str, ...]
+
+
+def log_rate_graph(token_pairs_pools: TokenPairsPools, pool_map: PoolMap) -> LogRateGraph:
+    """Weight every pair by -log of its best spot rate (fees included) in USD, i.e. the
+    token rate times the price potential `price_out / price_in`. Weights are clamped to 0
+    so that shortest paths exist, a pair of unbounded rate (not x*y=k) weighs 0
+    """
+    graph: LogRateGraph = {}
+
+    for token_in, neighbours in token_pairs_pools.items():
+        edges = graph.setdefault(token_in, {})
+
+        for token_out, names in neighbours.items():
+            rate, _ = pair_bound(token_in, token_out, [pool_map[n] for n in names])
+
+            if rate <= 0:
+                continue
+
+            if rate == inf:
+                edges[token_out] = 0
+                continue
+
+            potential = TokenUnitPrices[token_out].value / TokenUnitPrices[token_in].value
+            edges[token_out] = max(-log(rate * potential), 0)
+
+    return graph
+
+
+def shortest_path(
+    graph: LogRateGraph,
+    source: str,
+    target: str,
+    max_edges: int,
+    banned_nodes: Optional[Set[str]] = None,
+    banned_edges: Optional[Set[Tuple[str, str]]] = None,
+) -> Optional[Tuple[float, Path]]:
+    """Cheapest loop-free path of `max_edges` edges or less, by relaxing one edge count at
+    a time (a label per node & edge count). Ties go to the path with fewer edges
+    """
+    # NOTE: a node keeps the cheapest of its paths per edge count only,
+    # a costlier path is lost if the cheapest one crosses a later node
+    banned_nodes = banned_nodes or set()
+    banned_edges = banned_edges or set()
+    layer: Dict[str, Tuple[float, Path]] = {source: (0, (source,))}
+    best: Optional[Tuple[float, Path]] = None
+
+    for _ in range(max_edges):
+        next_layer: Dict[str, Tuple[float, Path]] = {}
+
+        for node, (cost, path) in layer.items():
+            for neighbour, weight in graph.get(node, {}).items():
+                if neighbour in banned_nodes or neighbour in path:
+                    continue
+
+                if (node, neighbour) in banned_edges:
+                    continue
+
+                label = (cost + weight, path + (neighbour,))
+
+                if neighbour not in next_layer or label < next_layer[neighbour]:
+                    next_layer[neighbour] = label
+
+        if target in next_layer and (best is None or next_layer[target][0] < best[0]):
+            best = next_layer[target]
+
+        # NOTE: paths end at the target
+        next_layer.pop(target, None)
+        layer = next_layer
+
+        if not layer:
+            break
+
+    return best
+
+
+def k_shortest_paths(
+    graph: LogRateGraph,
+    source: str,
+    target: str,
+    k: int,
+    max_edges: int,
+) -> List[Tuple[float, Path]]:
+    """Yen's k shortest loop-free paths, cheapest first"""
+    first = shortest_path(graph, source, target, max_edges)
+
+    if source == target or not first:
+        return []
+
+    paths = [first]
+    candidates: List[Tuple[float, int, Path]] = []
+    seen = {first[1]}
+
+    def edge_cost(path: Path) -> float:
+        return sum(graph[path[i]][path[i + 1]] for i in range(len(path) - 1))
+
+    while len(paths) < k:
+        _, previous = paths[-1]
+
+        for i in range(len(previous) - 1):
+            size = i + 1
+            root = previous[:size]
+            banned_edges = {(p[i], p[size]) for _, p in paths if p[:size] == root}
+            spur = shortest_path(
+                graph,
+                previous[i],
+                target,
+                max_edges - i,
+                banned_nodes=set(root[:-1]),
+                banned_edges=banned_edges,
+            )
+
+            if not spur:
+                continue
+
+            path = root[:-1] + spur[1]
+
+            if path not in seen:
+                seen.add(path)
+                heappush(candidates, (edge_cost(root) + spur[0], len(path), path))
+
+        if not candidates:
+            break
+
+        cost, _, path = heappop(candidates)
+        paths.append((cost, path))
+
+    return paths
+
+
+@metrics.timed("find_k_best_routes")
+def find_k_best_routes(
+    token_in: str,
+    token_out: str,
+    token_pairs_pools: TokenPairsPools,
+    pool_map: PoolMap,
+    k=8,
+    max_hop=4,
+    graph: Optional[LogRateGraph] = None,
+    pool_ids: Optional[PoolIds] = None,
+) -> List[Route]:
+    """The `k` loop-free routes of best spot rate, an alternative to the exhaustive
+    `find_routes` (`max_hop` also counts the tokens of a route). Pass a prebuilt `graph`
+    to search many pairs of the same pool state
+    """
+    if token_in not in token_pairs_pools or token_out not in token_pairs_pools:
+        return []
+
+    graph = graph if graph is not None else log_rate_graph(token_pairs_pools, pool_map)
+    paths = k_shortest_paths(graph, token_in, token_out, k, max_hop - 1)
+    # NOTE: the nodes of a graph built by `log_rate_graph` are the tokens of the pools
+    tokens = [cast(List[Token], list(path)) for _, path in paths]
+    routes = [construct_path(t, token_pairs_pools, pool_map, pool_ids) for t in tokens]
+    metrics.count("routes_found", len(routes))
+    return routes
+
+
+class KBestRouteIndex(RouteIndex):
+    """`RouteIndex` of the k loop-free routes of best spot rate per pair.
+    The ranking reads the reserves of the time of the search, it is redone on topology
+    changes only: a pool added or removed drops every route & the log-rate graph
+    """
+
+    k: int
+
+    def __init__(self, graph: PoolGraph, k=8):
+        super().__init__(graph)
+        self.k = k
+        self._graph: Optional[LogRateGraph] = None
+
+    def find_routes(
+        self,
+        token_in: Token,
+        token_out: Token,
+        max_hop=4,
+        amount_in: Optional[float] = None,
+        max_routes: Optional[int] = None,
+        prune_ratio=0.5,
+        rates_to: Optional[List[Dict[Token, float]]] = None,
+    ) -> List[Route]:
+        """With `amount_in`, the k best routes `select_routes` keeps for it"""
+        key = (token_in, token_out, max_hop)
+        routes = self._routes.get(key)
+
+        if routes is None:
+            if self._graph is None:
+                self._graph = log_rate_graph(self.graph.token_pairs_pools, self.graph.pool_map)
+
+            routes = find_k_best_routes(
+                token_in,
+                token_out,
+                self.graph.token_pairs_pools,
+                self.graph.pool_map,
+                k=self.k,
+                max_hop=max_hop,
+                graph=self._graph,
+                pool_ids=self.graph.pool_ids,
+            )
+            self._routes[key] = routes
+
+        if amount_in is not None:
+            return select_routes(routes, amount_in, max_routes, prune_ratio)
+
+        return routes
+
+    def on_change(self, change: PoolChange):
+        if change.kind != "update":
+            self._graph = None
+            self.invalidate()
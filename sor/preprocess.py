@@ -1,9 +1,16 @@
+from heapq import heappop
+from heapq import heappush
 from typing import Callable
 from typing import Dict
 from typing import List
+from typing import Literal
+from typing import MutableMapping
+from typing import Optional
 from typing import Set
 from typing import Tuple
 
+from pydantic import BaseModel
+
 from .models import Dex
 from .models import Pool
 from .models import Token
@@ -28,7 +35,43 @@ def map_pool_by_name(dexes: List[Dex]) -> Tuple[List[Pool], Dict[str, Pool]]:
     return poollist, poolmap
 
 
-TokenPairsPools = Dict[Token, Dict[Token, Set[str]]]
+TokenPairsPools = MutableMapping[Token, Dict[Token, Set[str]]]
+
+
+def add_token_pair_pool(pairs: TokenPairsPools, pool: Pool):
+    for from_token in pool.tokens:
+        if from_token.token not in pairs:
+            pairs.update({from_token.token: dict()})
+
+        for to_token in pool.tokens:
+            if to_token.token == from_token.token:
+                continue
+
+            if to_token.token not in pairs[from_token.token]:
+                pairs[from_token.token].update({to_token.token: set()})
+
+            pairs[from_token.token][to_token.token].add(pool.name)
+
+
+def remove_token_pair_pool(pairs: TokenPairsPools, pool: Pool):
+    """Undo `add_token_pair_pool`, dropping pairs & tokens left without any pool"""
+    for from_token in pool.tokens:
+        if from_token.token not in pairs:
+            continue
+
+        neighbours = pairs[from_token.token]
+
+        for to_token in pool.tokens:
+            if to_token.token not in neighbours:
+                continue
+
+            neighbours[to_token.token].discard(pool.name)
+
+            if not neighbours[to_token.token]:
+                neighbours.pop(to_token.token)
+
+        if not neighbours:
+            pairs.pop(from_token.token)
 
 
 def determine_token_pair_pools(dexes: List[Dex]) -> TokenPairsPools:
@@ -36,18 +79,189 @@ def determine_token_pair_pools(dexes: List[Dex]) -> TokenPairsPools:
 
     def handle_pool(pool: Pool):
         nonlocal pairs
-        for from_token in pool.tokens:
-            if from_token.token not in pairs:
-                pairs.update({from_token.token: dict()})
+        add_token_pair_pool(pairs, pool)
 
-            for to_token in pool.tokens:
-                if to_token.token == from_token.token:
-                    continue
+    each_pool(dexes, handle_pool)
+    return pairs
 
-                if to_token.token not in pairs[from_token.token]:
-                    pairs[from_token.token].update({to_token.token: set()})
 
-                pairs[from_token.token][to_token.token].add(pool.name)
+class PoolIds:
+    """Pool names interned to the bit positions of `PoolSet` masks.
+    The ids of a `PoolGraph` are released with its removed pools and reused (lowest
+    first) by the next new pools, so masks stay as wide as the number of live pools
+    """
 
-    each_pool(dexes, handle_pool)
-    return pairs
+    __slots__ = ("ids", "names", "free")
+
+    ids: Dict[str, int]
+    names: List[Optional[str]]
+    free: List[int]
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.free = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def get(self, name: str) -> Optional[int]:
+        return self.ids.get(name)
+
+    def intern(self, name: str) -> int:
+        idx = self.ids.get(name)
+
+        if idx is not None:
+            return idx
+
+        if self.free:
+            idx = heappop(self.free)
+            self.names[idx] = name
+        else:
+            idx = len(self.names)
+            self.names.append(name)
+
+        self.ids[name] = idx
+        return idx
+
+    def release(self, name: str):
+        idx = self.ids.pop(name, None)
+
+        if idx is not None:
+            self.names[idx] = None
+            heappush(self.free, idx)
+
+    def name(self, idx: int) -> str:
+        name = self.names[idx]
+        assert name is not None, f"pool id {idx} was released"
+        return name
+
+
+ChangeKind = Literal["add", "remove", "update"]
+
+
+class PoolChange(BaseModel):
+    kind: ChangeKind
+    pool: str
+    tokens: List[Token]
+    version: int
+
+
+PoolChangeListener = Callable[[PoolChange], None]
+
+
+class PoolGraph:
+    """Pool map & token pairs adjacency patched pool by pool.
+    Every change bumps `version` and is published to the listeners,
+    so caches built on the graph know what went stale
+    """
+
+    pool_map: MutableMapping[str, Pool]
+    token_pairs_pools: TokenPairsPools
+    pool_dex: Dict[str, Dex]
+    pool_versions: Dict[str, int]
+    pool_ids: PoolIds
+    version: int
+
+    def __init__(self, dexes: Optional[List[Dex]] = None):
+        self.pool_map = {}
+        self.token_pairs_pools = {}
+        self.pool_ids = PoolIds()
+        self.pool_dex = {}
+        self.pool_versions = {}
+        self.version = 0
+        self._listeners: List[PoolChangeListener] = []
+
+        for dex in dexes or []:
+            for pool in dex.pools:
+                self._add(pool, dex)
+
+    @classmethod
+    def restore(
+        cls,
+        pool_map: MutableMapping[str, Pool],
+        token_pairs_pools: TokenPairsPools,
+        pool_dex: Dict[str, Dex],
+    ) -> "PoolGraph":
+        """Graph over an already built pool map & adjacency (e.g. a snapshot)"""
+        graph = cls()
+        graph.pool_map = pool_map
+        graph.token_pairs_pools = token_pairs_pools
+        graph.pool_dex = pool_dex
+        graph.pool_versions = dict.fromkeys(pool_map, 0)
+
+        for name in pool_map:
+            graph.pool_ids.intern(name)
+
+        return graph
+
+    def __len__(self):
+        return len(self.pool_map)
+
+    def __contains__(self, name: str):
+        return name in self.pool_map
+
+    @property
+    def pool_list(self) -> List[Pool]:
+        return list(self.pool_map.values())
+
+    def subscribe(self, listener: PoolChangeListener):
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener: PoolChangeListener):
+        self._listeners.remove(listener)
+
+    def pool_version(self, name: str) -> int:
+        return self.pool_versions.get(name, 0)
+
+    def _add(self, pool: Pool, dex: Optional[Dex]):
+        self.pool_map.update({pool.name: pool})
+        self.pool_versions.update({pool.name: self.version})
+        self.pool_ids.intern(pool.name)
+        add_token_pair_pool(self.token_pairs_pools, pool)
+
+        if dex:
+            self.pool_dex.update({pool.name: dex})
+
+    def _publish(self, kind: ChangeKind, pool: Pool) -> int:
+        self.version += 1
+        self.pool_versions.update({pool.name: self.version})
+        tokens = [t.token for t in pool.tokens]
+        change = PoolChange(kind=kind, pool=pool.name, tokens=tokens, version=self.version)
+
+        for listener in self._listeners:
+            listener(change)
+
+        return self.version
+
+    def add_pool(self, pool: Pool, dex: Optional[Dex] = None) -> int:
+        """Add or replace a pool, return the new version"""
+        if pool.name in self.pool_map:
+            self.remove_pool(pool.name)
+
+        self._add(pool, dex)
+        return self._publish("add", pool)
+
+    def remove_pool(self, name: str) -> int:
+        pool = self.pool_map.pop(name, None)
+
+        if not pool:
+            return self.version
+
+        remove_token_pair_pool(self.token_pairs_pools, pool)
+        self.pool_dex.pop(name, None)
+        version = self._publish("remove", pool)
+        self.pool_versions.pop(name, None)
+        # NOTE: the routes of the pool are dropped & cached swaps read its version,
+        # so no live PoolSet keeps the id when the next new pool reuses it
+        self.pool_ids.release(name)
+        return version
+
+    def update_reserves(self, name: str, reserves: Dict[Token, float]) -> int:
+        pool = self.pool_map.get(name)
+
+        if not pool:
+            return self.version
+
+        pool.update_reserves(reserves)
+        return self._publish("update", pool)
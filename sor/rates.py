@@ -0,0 +1,181 @@
+from math import ceil
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import numpy as np
+
+from . import metrics
+from .algorithm import pair_bound
+from .models import Token
+from .preprocess import PoolChange
+from .preprocess import PoolGraph
+
+
+# NOTE: products of the pairs of a row chunk are built at once, about this many floats
+CHUNK_SIZE = 1 << 22
+
+# NOTE: products may round differently along other paths, near ties count as ties
+TIE_TOLERANCE = 1e-9
+
+
+class SpotRateMatrix:
+    """Best spot rate (amount-out per amount-in, fees included) between every two tokens
+    of a graph, the max-product of the pair rates over paths of `max_edges` edges or less.
+    Like `pair_bound`, no quote of a path beats its rate, a pair with a pool of another
+    curve has an unbounded (inf) rate.
+
+    `pairs` holds the best rate of every pair, `rates[h]` the best products in h edges or
+    less. A pool change re-reads the pairs of its tokens and propagates each moved pair
+    through the rows & columns it reaches: a higher rate relaxes the products through the
+    pair, a lower one recomputes the rows of a product that went through it. A pool
+    bringing a new token rebuilds everything. Lookups only read the products
+    """
+
+    tokens: List[Token]
+    index: Dict[Token, int]
+    pairs: np.ndarray
+    rates: np.ndarray
+    max_edges: int
+
+    def __init__(self, graph: PoolGraph, max_edges=3):
+        self.graph = graph
+        self.max_edges = max_edges
+        self._build()
+        graph.subscribe(self.on_change)
+
+    def _build(self):
+        self.tokens = sorted(self.graph.token_pairs_pools)
+        self.index = {token: idx for idx, token in enumerate(self.tokens)}
+        self.pairs = np.zeros((len(self.tokens), len(self.tokens)))
+
+        for token_in in self.tokens:
+            for token_out in self.graph.token_pairs_pools[token_in]:
+                i, j = self.index[token_in], self.index[token_out]
+                self.pairs[i, j] = self._pair_rate(token_in, token_out)
+
+        self.refresh()
+
+    def _pair_rate(self, token_in: Token, token_out: Token) -> float:
+        names = self.graph.token_pairs_pools.get(token_in, {}).get(token_out, set())
+        rate, _ = pair_bound(token_in, token_out, [self.graph.pool_map[n] for n in names])
+        return rate
+
+    @metrics.timed("SpotRateMatrix.refresh")
+    def refresh(self):
+        """Rebuild the products of every row"""
+        size = len(self.tokens)
+        self.rates = np.zeros((self.max_edges + 1, size, size))
+        self.rates[0] = np.eye(size)
+        self._recompute(np.arange(size))
+
+    def _recompute(self, rows: np.ndarray):
+        """Rebuild the products of `rows` hop by hop, by (max, *) products of the pair
+        rates: a row of `rates[h]` only depends on the same row of `rates[h - 1]`
+        """
+        metrics.count("spot_rate_rows", len(rows))
+        sources, targets = np.nonzero(self.pairs)
+
+        if not len(sources):
+            return
+
+        # NOTE: the pairs by target token, to reduce the products of a column at once
+        order = np.argsort(targets, kind="stable")
+        sources, targets = sources[order], targets[order]
+        columns, starts = np.unique(targets, return_index=True)
+        rates = self.pairs[sources, targets]
+        chunks = ceil(len(rows) * len(sources) / CHUNK_SIZE)
+
+        for chunk_rows in np.array_split(rows, max(chunks, 1)):
+            for hops in range(1, self.max_edges + 1):
+                previous = self.rates[hops - 1][chunk_rows]
+                current = previous.copy()
+
+                # NOTE: inf * 0 (no pair after an unbounded one) is no path
+                products = previous[:, sources] * rates
+                products[np.isnan(products)] = 0
+                best = np.maximum.reduceat(products, starts, axis=1)
+                current[:, columns] = np.maximum(current[:, columns], best)
+                self.rates[hops][chunk_rows] = current
+
+    def _through(self, i: int, j: int, rate: float, hops: int, head: int):
+        """Rows, columns & products of the paths of `hops` edges or less through the
+        pair (i, j) at `rate`, with `head` edges or less before it
+        """
+        to_pair = self.rates[head][:, i]
+        from_pair = self.rates[hops - 1 - head][j, :]
+        rows, cols = np.nonzero(to_pair)[0], np.nonzero(from_pair)[0]
+        return rows, cols, np.outer(to_pair[rows] * rate, from_pair[cols])
+
+    def _raise(self, i: int, j: int):
+        """Relax the products through the raised pair (i, j), hop by hop. The shorter
+        products already went through the new rate, so paths using it again count
+        """
+        rate = self.pairs[i, j]
+
+        for hops in range(1, self.max_edges + 1):
+            for head in range(hops):
+                rows, cols, products = self._through(i, j, rate, hops, head)
+                block = np.ix_(rows, cols)
+                self.rates[hops][block] = np.maximum(self.rates[hops][block], products)
+
+    def _lower(self, i: int, j: int, previous: float):
+        """Recompute the rows of a product that may have gone through the previous rate
+        of the lowered pair (i, j)
+        """
+        rows = np.zeros(len(self.tokens), dtype=bool)
+
+        for hops in range(1, self.max_edges + 1):
+            for head in range(hops):
+                through_rows, cols, products = self._through(i, j, previous, hops, head)
+                block = self.rates[hops][np.ix_(through_rows, cols)]
+                ties = products >= block * (1 - TIE_TOLERANCE)
+                rows[through_rows[ties.any(axis=1)]] = True
+
+        if rows.any():
+            self._recompute(np.nonzero(rows)[0])
+
+    @metrics.timed("SpotRateMatrix.on_change")
+    def on_change(self, change: PoolChange):
+        if any(token not in self.index for token in change.tokens):
+            self._build()
+            return
+
+        for token_in in change.tokens:
+            for token_out in change.tokens:
+                if token_in == token_out:
+                    continue
+
+                i, j = self.index[token_in], self.index[token_out]
+                previous, rate = self.pairs[i, j], self._pair_rate(token_in, token_out)
+
+                if rate == previous:
+                    continue
+
+                self.pairs[i, j] = rate
+
+                if rate > previous:
+                    self._raise(i, j)
+                else:
+                    self._lower(i, j, previous)
+
+    def rate(
+        self, token_in: Token, token_out: Token, max_edges: Optional[int] = None
+    ) -> float:
+        """Best spot rate from token-in to token-out, 0 if there is no path"""
+        if token_in not in self.index or token_out not in self.index:
+            return 0
+
+        hops = self.max_edges if max_edges is None else min(max_edges, self.max_edges)
+        return float(self.rates[hops, self.index[token_in], self.index[token_out]])
+
+    def rates_to(self, token_out: Token) -> List[Dict[Token, float]]:
+        """The rates to token-out in the layout of `best_rates_to`"""
+        if token_out not in self.index:
+            return [{token_out: 1} for _ in range(self.max_edges + 1)]
+
+        column = self.rates[:, :, self.index[token_out]]
+        return [
+            {token: rate for token, rate in zip(self.tokens, row.tolist()) if rate}
+            for row in column
+        ]
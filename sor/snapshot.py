@@ -0,0 +1,321 @@
+import json
+import mmap
+import os
+import struct
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import MutableMapping
+from typing import MutableSequence
+from typing import overload
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+import numpy as np
+
+from .models import Dex
+from .models import Pool
+from .models import PoolStateTable
+from .models import PoolToken
+from .models import Token
+from .preprocess import PoolGraph
+from .sor import SmartOrderRouter
+
+# NOTE: layout of a snapshot file
+# MAGIC | metadata length (u64) | JSON metadata | raw arrays, each aligned on 8 bytes
+# the metadata holds the names (tokens, pools, dexes) & where every array sits
+MAGIC = b"SORSNAP1"
+HEADER = struct.Struct("<8sQ")
+ALIGN = 8
+
+
+def _align(size: int) -> int:
+    return -size % ALIGN
+
+
+class SnapshotPools(MutableMapping[str, Pool]):
+    """Pool map backed by the table of a snapshot, a pool is built on its first lookup
+    from the current reserves of the table. Pools set afterwards are kept as given
+    """
+
+    def __init__(self, table: PoolStateTable, weights: np.ndarray, tvls: np.ndarray):
+        self.table = table
+        self.weights = weights
+        self.tvls = tvls
+        # NOTE: -1 is a pool that is not in the table
+        self._index: Dict[str, int] = dict(table.pool_index)
+        self._pools: Dict[str, Pool] = {}
+
+    def _build(self, idx: int) -> Pool:
+        table = self.table
+        start, end = table.offsets[idx], table.offsets[idx + 1]
+        pool_tokens = [
+            PoolToken.construct(
+                token=table.tokens[token_id], amount=amount, weight=None if w != w else w
+            )
+            for token_id, amount, w in zip(
+                table.token_ids[start:end].tolist(),
+                table.amounts[start:end].tolist(),
+                self.weights[start:end].tolist(),
+            )
+        ]
+        return Pool.construct(
+            name=table.names[idx],
+            tokens=pool_tokens,
+            fee=float(table.fees[idx]),
+            k=float(table.ks[idx]),
+            tvl=float(self.tvls[idx]),
+        )
+
+    def __getitem__(self, name: str) -> Pool:
+        pool = self._pools.get(name)
+
+        if pool is None:
+            idx = self._index[name]
+
+            if idx < 0:
+                raise KeyError(name)
+
+            pool = self._build(idx)
+            self._pools[name] = pool
+
+        return pool
+
+    def __setitem__(self, name: str, pool: Pool):
+        self._index.setdefault(name, -1)
+        self._pools[name] = pool
+
+    def __delitem__(self, name: str):
+        del self._index[name]
+        self._pools.pop(name, None)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._index)
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+
+class SnapshotPairs(MutableMapping[Token, Dict[Token, Set[str]]]):
+    """Token pairs adjacency backed by the `pairs` array of a snapshot,
+    the neighbours of a token are built on its first lookup
+    """
+
+    def __init__(self, tokens: List[Token], names: List[str], pairs: np.ndarray):
+        self.tokens = tokens
+        self.names = names
+        self.pairs = pairs[np.argsort(pairs[:, 0], kind="stable")]
+        token_ids, starts = np.unique(self.pairs[:, 0], return_index=True)
+        ends = np.append(starts[1:], len(self.pairs))
+        self._rows: Dict[Token, Tuple[int, int]] = {
+            tokens[token_id]: (start, end)
+            for token_id, start, end in zip(token_ids.tolist(), starts.tolist(), ends.tolist())
+        }
+        self._neighbours: Dict[Token, Dict[Token, Set[str]]] = {}
+
+    def __getitem__(self, token: Token) -> Dict[Token, Set[str]]:
+        neighbours = self._neighbours.get(token)
+
+        if neighbours is None:
+            start, end = self._rows[token]
+            neighbours = {}
+
+            for _, to_id, pool_id in self.pairs[start:end].tolist():
+                neighbours.setdefault(self.tokens[to_id], set()).add(self.names[pool_id])
+
+            self._neighbours[token] = neighbours
+
+        return neighbours
+
+    def __setitem__(self, token: Token, neighbours: Dict[Token, Set[str]]):
+        self._rows.setdefault(token, (0, 0))
+        self._neighbours[token] = neighbours
+
+    def __delitem__(self, token: Token):
+        del self._rows[token]
+        self._neighbours.pop(token, None)
+
+    def __contains__(self, token: object) -> bool:
+        return token in self._rows
+
+    def __iter__(self) -> Iterator[Token]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+
+class SnapshotDexPools(MutableSequence[Pool]):
+    """Pools of a snapshot dex, held by name & looked up in the pool map when read"""
+
+    def __init__(self, pool_map: SnapshotPools, names: List[str]):
+        self.pool_map = pool_map
+        self._items: List[Union[str, Pool]] = list(names)
+
+    def _resolve(self, item: Union[str, Pool]) -> Pool:
+        return self.pool_map[item] if isinstance(item, str) else item
+
+    @overload
+    def __getitem__(self, idx: int) -> Pool:
+        ...
+
+    @overload
+    def __getitem__(self, idx: slice) -> List[Pool]:
+        ...
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self._resolve(item) for item in self._items[idx]]
+
+        return self._resolve(self._items[idx])
+
+    def __setitem__(self, idx, value):
+        self._items[idx] = list(value) if isinstance(idx, slice) else value
+
+    def __delitem__(self, idx):
+        del self._items[idx]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def insert(self, idx: int, pool: Pool):
+        self._items.insert(idx, pool)
+
+
+def write_snapshot(path: str, dexes: List[Dex]):
+    """Write the pools, reserves & token-pair adjacency of the dexes to `path`.
+    The file is replaced atomically, readers never map a half-written snapshot
+    """
+    graph = PoolGraph(dexes)
+    pools = graph.pool_list
+    table = PoolStateTable(pools)
+    pool_index = table.pool_index
+    token_index = table.token_index
+
+    dex_pools = [pool_index[p.name] for dex in dexes for p in dex.pools]
+    dex_offsets = np.zeros(len(dexes) + 1, dtype=np.int64)
+    dex_offsets[1:] = np.cumsum([len(dex.pools) for dex in dexes])
+
+    pairs = [
+        (token_index[from_token], token_index[to_token], pool_index[name])
+        for from_token, neighbours in graph.token_pairs_pools.items()
+        for to_token, names in neighbours.items()
+        for name in sorted(names)
+    ]
+    pairs_array = np.array(pairs, dtype=np.int64).reshape(-1, 3)
+
+    arrays: Dict[str, np.ndarray] = {
+        "fees": table.fees,
+        "ks": table.ks,
+        "tvls": np.array([p.tvl or 0 for p in pools], dtype=float),
+        "offsets": table.offsets,
+        "token_ids": table.token_ids,
+        "amounts": table.amounts,
+        "weights": np.array(
+            [np.nan if t.weight is None else t.weight for p in pools for t in p.tokens],
+            dtype=float,
+        ),
+        "dex_offsets": dex_offsets,
+        "dex_pools": np.array(dex_pools, dtype=np.int64),
+        "pairs": pairs_array,
+    }
+
+    layout: Dict[str, Dict] = {}
+    offset = 0
+
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        arrays[name] = array
+        layout[name] = {"dtype": array.dtype.str, "shape": array.shape, "offset": offset}
+        offset += array.nbytes + _align(array.nbytes)
+
+    metadata = json.dumps(
+        {
+            "tokens": table.tokens,
+            "pools": table.names,
+            "dexes": [{"name": dex.name, "gas": dex.gas} for dex in dexes],
+            "arrays": layout,
+        }
+    ).encode()
+    start = HEADER.size + len(metadata)
+
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(metadata)))
+        f.write(metadata)
+        f.write(bytes(_align(start)))
+
+        for array in arrays.values():
+            f.write(array.tobytes())
+            f.write(bytes(_align(array.nbytes)))
+
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> Tuple[List[Dex], PoolGraph, PoolStateTable]:
+    """Map a snapshot in memory, the arrays are copy-on-write views of the file.
+    Pools & adjacency rows are built from the table (without validation) on first use
+    """
+    with open(path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    magic, size = HEADER.unpack_from(buffer)
+
+    if magic != MAGIC:
+        raise ValueError(f"{path} is not a pool snapshot")
+
+    begin, end = HEADER.size, HEADER.size + size
+    metadata = json.loads(buffer[begin:end])
+    start = end + _align(end)
+
+    arrays: Dict[str, np.ndarray] = {}
+
+    for name, info in metadata["arrays"].items():
+        dtype, shape = np.dtype(info["dtype"]), tuple(info["shape"])
+        count = int(np.prod(shape))
+        array = np.frombuffer(buffer, dtype, count=count, offset=start + info["offset"])
+        arrays[name] = array.reshape(shape)
+
+    tokens: List = metadata["tokens"]
+    names: List[str] = metadata["pools"]
+    table = PoolStateTable.from_arrays(
+        tokens,
+        names,
+        arrays["fees"],
+        arrays["ks"],
+        arrays["offsets"],
+        arrays["token_ids"],
+        arrays["amounts"],
+    )
+    pool_map = SnapshotPools(table, arrays["weights"], arrays["tvls"])
+    token_pairs_pools = SnapshotPairs(tokens, names, arrays["pairs"])
+
+    dexes: List[Dex] = []
+    pool_dex: Dict[str, Dex] = {}
+    dex_offsets = arrays["dex_offsets"].tolist()
+    dex_pools = arrays["dex_pools"]
+
+    for idx, info in enumerate(metadata["dexes"]):
+        first, last = dex_offsets[idx], dex_offsets[idx + 1]
+        members = [names[i] for i in dex_pools[first:last].tolist()]
+        dex = Dex.construct(
+            name=info["name"], pools=SnapshotDexPools(pool_map, members), gas=info["gas"]
+        )
+        dexes.append(dex)
+        pool_dex.update(dict.fromkeys(members, dex))
+
+    graph = PoolGraph.restore(pool_map, token_pairs_pools, pool_dex)
+    return dexes, graph, table
+
+
+def load_router(path: str, **options) -> SmartOrderRouter:
+    """A ready-to-query router warm-started from a snapshot, `options` go to the router"""
+    dexes, graph, table = read_snapshot(path)
+    router = SmartOrderRouter(**options)
+    router.attach(dexes, graph, table)
+    return router
@@ -1,19 +1,80 @@
+from math import inf
 from typing import Dict
 from typing import List
+from typing import MutableMapping
 from typing import Optional
 from typing import Tuple
 
+from .algorithm import calc_amount_in_on_multi_routes
+from .algorithm import calc_amount_out_curve
+from .algorithm import calc_amount_out_on_multi_routes
+from .algorithm import Route
+from .algorithm import RouteIndex
+from .algorithm import select_routes
+from .cache import log_buckets
+from .cache import QuoteCache
+from .cache import SwapCache
+from .core import bisect_volume_in
+from .core import SplitMode
 from .models import Dex
+from .models import from_units
 from .models import Pool
+from .models import PoolStateTable
+from .models import to_units
 from .models import Token
-from .preprocess import map_pool_by_name
+from .parallel import ParallelSplitSearch
+from .paths import KBestRouteIndex
+from .preprocess import PoolChange
+from .preprocess import PoolGraph
+from .rates import SpotRateMatrix
 
 
 class SmartOrderRouter:
-    """TO BE IMPLEMENTED"""
+    """Quotes from a long-lived routing context: the pool graph, the cached routes
+    and the compiled pool state are built once when `dexes` is set
+    """
 
     _dexes: Optional[List[Dex]] = None
-    pools: Tuple[List[Pool], Dict[str, Pool]]
+    graph: PoolGraph
+    route_index: RouteIndex
+    table: PoolStateTable
+    swap_cache: SwapCache
+    quote_cache: Optional[QuoteCache] = None
+
+    def __init__(
+        self,
+        max_hop=3,
+        optimal_lv=5,
+        mode: SplitMode = "water_fill",
+        cache_size=100_000,
+        workers: Optional[int] = None,
+        max_routes: Optional[int] = None,
+        prune_ratio=0.5,
+        k_routes: Optional[int] = None,
+        quote_buckets: Optional[float] = None,
+        fixed=False,
+    ):
+        """With `workers`, the route-level split search runs on a pool of processes.
+        With `max_routes`, exact-in quotes only split over the few routes of best bounds
+        (see `select_routes`). With `k_routes`, routes are the k best loop-free paths
+        (see `find_k_best_routes`) instead of every path.
+        With `fixed`, exact-in quotes run on integer token units in any mode, amounts
+        are converted at the boundary so quotes & allocations stay in tokens.
+        With `quote_buckets` (a ratio, e.g. 1.05), exact-in quotes of amounts within that
+        ratio share a plan re-priced on each amount (see `QuoteCache`)
+        """
+        self.max_hop = max_hop
+        self.optimal_lv = optimal_lv
+        self.mode = mode
+        self.cache_size = cache_size
+        self.workers = workers
+        self.max_routes = max_routes
+        self.prune_ratio = prune_ratio
+        self.k_routes = k_routes
+        self.quote_buckets = quote_buckets
+        self.fixed = fixed
+        self.parallel: Optional[ParallelSplitSearch] = None
+        self._spot_rates: Optional[SpotRateMatrix] = None
 
     @property
     def dexes(self):
@@ -21,21 +82,294 @@ class SmartOrderRouter:
 
     @dexes.setter
     def dexes(self, dexes: List[Dex]):
+        self.attach(dexes, PoolGraph(dexes))
+
+    def attach(
+        self, dexes: List[Dex], graph: PoolGraph, table: Optional[PoolStateTable] = None
+    ):
+        """Route over an already built graph (and compiled table) of the dexes"""
+        self.close()
         self._dexes = dexes
-        self.pools = map_pool_by_name(dexes)
+        self.graph = graph
+        self.route_index = (
+            KBestRouteIndex(self.graph, self.k_routes)
+            if self.k_routes
+            else RouteIndex(self.graph)
+        )
+        self.table = table if table is not None else PoolStateTable(self.graph.pool_list)
+        self.swap_cache = SwapCache(self.cache_size, self.graph.pool_version)
+
+        if self.quote_buckets:
+            self.quote_cache = QuoteCache(
+                self.cache_size, self.graph.pool_version, log_buckets(self.quote_buckets)
+            )
+        self.graph.subscribe(self.on_change)
+        self._spot_rates = None
+
+    @property
+    def pools(self) -> Tuple[List[Pool], MutableMapping[str, Pool]]:
+        """Pool list & map of the live graph"""
+        return self.graph.pool_list, self.graph.pool_map
+
+    def on_change(self, change: PoolChange):
+        if change.kind == "update":
+            pool = self.graph.pool_map[change.pool]
+            self.table.sync(pool)
+
+            if self.parallel:
+                self.parallel.update(pool, change.version)
+
+            return
+
+        if change.kind == "add":
+            pool = self.graph.pool_map[change.pool]
+            self.table.add(pool)
+
+            if self.parallel:
+                self.parallel.add(pool, change.version)
+
+            return
+
+        self.table.remove(change.pool)
+
+        # NOTE: compact once the tombstones outnumber the live rows
+        if 2 * self.table.removed > len(self.table):
+            self.table = self.table.compact()
+
+    @property
+    def spot_rates(self) -> SpotRateMatrix:
+        """Best spot rates between every two tokens within `max_hop`, built on first use
+        and kept in sync with the graph
+        """
+        if self._spot_rates is None:
+            self._spot_rates = SpotRateMatrix(self.graph, max_edges=max(self.max_hop - 1, 1))
+
+        return self._spot_rates
+
+    def spot_rate(self, token_in: Token, token_out: Token) -> float:
+        """0 while no dexes are set, like a pair without path"""
+        if not self._dexes:
+            return 0
+
+        return self.spot_rates.rate(token_in, token_out)
+
+    def estimate_price_out(self, token_in: Token, amount_in: float, token_out: Token) -> float:
+        """O(1) estimate of `find_best_price_out`, its upper bound & its limit for small
+        amounts (inf when a pool of another curve is on the way)
+        """
+        return amount_in * self.spot_rate(token_in, token_out)
+
+    def close(self):
+        if self.parallel:
+            self.parallel.close(wait=False)
+            self.parallel = None
+
+    def calc_amount_out(self, routes: List[Route], amount_in: float):
+        calc = calc_amount_out_on_multi_routes
+
+        if self.workers and self._dexes:
+            if not self.parallel:
+                # NOTE: the pools of the graph, pools added to it are not in the dexes
+                pools = list(self.graph.pool_map.values())
+                self.parallel = ParallelSplitSearch(pools, self.workers)
+
+            calc = self.parallel.calc_amount_out_on_multi_routes
+
+        return calc(
+            routes,
+            amount_in,
+            optimal_lv=self.optimal_lv,
+            mode=self.mode,
+            table=self.table,
+            swap_cache=self.swap_cache,
+            quote_cache=self.quote_cache,
+            fixed=self.fixed,
+        )
+
+    def quote(self, routes: List[Route], amount_in: float) -> Tuple[float, List[List[Dict]]]:
+        """Best amount-out & route splits of `calc_amount_out`, in token amounts"""
+        if not self.fixed:
+            max_out, _, route_splits, _, _ = self.calc_amount_out(routes, amount_in)
+            return max_out, route_splits
+
+        token_in, token_out = routes[0].edges[0].token_in, routes[0].edges[-1].token_out
+        units_in = to_units(token_in, amount_in)
+        max_out, _, route_splits, _, used_paths = self.calc_amount_out(routes, units_in)
+        route_splits = [
+            [
+                {name: from_units(edge.token_in, value) for name, value in edge_split.items()}
+                for edge, edge_split in zip(route.edges, route_split)
+            ]
+            for route, route_split in zip(used_paths, route_splits)
+        ]
+        return from_units(token_out, max_out), route_splits
+
+    def allocate(self, route_splits: List[List[Dict]]) -> List[Tuple[Dex, float]]:
+        """Volume (in token-in) routed through the pools of each Dex. A route counts once
+        per Dex, for the largest share of its amount-in the Dex trades on one of its hops
+        """
+        volumes: Dict[str, float] = {}
+
+        for route_split in route_splits:
+            if not route_split:
+                continue
+
+            route_in = sum(route_split[0].values())
+            shares: Dict[str, float] = {}
+
+            for edge_split in route_split:
+                edge_in = sum(edge_split.values())
+                edge_shares: Dict[str, float] = {}
+
+                for pool_name, value in edge_split.items():
+                    if not value:
+                        continue
+
+                    dex = self.graph.pool_dex[pool_name]
+                    edge_shares.update(
+                        {dex.name: edge_shares.get(dex.name, 0) + value / edge_in}
+                    )
+
+                for name, share in edge_shares.items():
+                    shares.update({name: max(shares.get(name, 0), share)})
+
+            for name, share in shares.items():
+                volumes.update({name: volumes.get(name, 0) + route_in * share})
+
+        return [(dex, volumes[dex.name]) for dex in self._dexes or [] if dex.name in volumes]
+
+    def find_routes(self, token_in: Token, amount_in: float, token_out: Token) -> List[Route]:
+        """Routes of an exact-in quote. With `max_routes`, the few of best bounds for the
+        amount, the branch & bound of an untraced pair is bounded by the spot rates
+        """
+        if self.max_routes is None:
+            return self.route_index.find_routes(token_in, token_out, max_hop=self.max_hop)
+
+        return self.route_index.find_routes(
+            token_in,
+            token_out,
+            max_hop=self.max_hop,
+            amount_in=amount_in,
+            max_routes=self.max_routes,
+            prune_ratio=self.prune_ratio,
+            rates_to=self.spot_rates.rates_to(token_out),
+        )
 
     def find_best_price_out(
-        self, token_in: Token, amount_in: int, token_out: Token
+        self, token_in: Token, amount_in: float, token_out: Token
     ) -> Tuple[float, List[Tuple[Dex, float]]]:
         """Return the maximum amount of token out for result
         If not possible, return -1
         """
-        return -1, []
+        if not self._dexes or not 0 < amount_in < inf:
+            return -1, []
+
+        routes = self.find_routes(token_in, amount_in, token_out)
+
+        if not routes:
+            return -1, []
+
+        max_out, route_splits = self.quote(routes, amount_in)
+
+        if max_out <= 0:
+            return -1, []
+
+        return max_out, self.allocate(route_splits)
+
+    def find_best_price_out_curve(
+        self, token_in: Token, amounts_in: List[float], token_out: Token
+    ) -> List[Tuple[float, List[Tuple[Dex, float]]]]:
+        """`find_best_price_out` of many amounts (a depth chart) in one pass over the same
+        routes, see `calc_amount_out_curve`. With `max_routes`, amounts selecting the same
+        routes share a pass
+        """
+        results: List[Tuple[float, List[Tuple[Dex, float]]]] = [(-1, [])] * len(amounts_in)
+
+        if not self._dexes:
+            return results
+
+        routes = self.route_index.find_routes(token_in, token_out, max_hop=self.max_hop)
+
+        if not routes:
+            return results
+
+        if self.fixed:
+            return [self.find_best_price_out(token_in, a, token_out) for a in amounts_in]
+
+        groups: Dict[Tuple[Route, ...], List[int]] = {}
+
+        for idx, amount in enumerate(amounts_in):
+            if not 0 < amount < inf:
+                continue
+
+            selected = tuple(routes)
+
+            if self.max_routes is not None:
+                selected = tuple(
+                    select_routes(routes, amount, self.max_routes, self.prune_ratio)
+                )
+
+            if selected:
+                groups.setdefault(selected, []).append(idx)
+
+        for selected, indices in groups.items():
+            curve = calc_amount_out_curve(
+                list(selected),
+                [amounts_in[idx] for idx in indices],
+                optimal_lv=self.optimal_lv,
+                mode=self.mode,
+                table=self.table,
+                swap_cache=self.swap_cache,
+                quote_cache=self.quote_cache,
+            )
+
+            for idx, (max_out, _, route_splits, _, _) in zip(indices, curve):
+                if max_out > 0:
+                    results[idx] = (max_out, self.allocate(route_splits))
+
+        return results
 
     def find_best_price_in(
-        self, token_out: Token, amount_out: int, token_in: Token
+        self, token_out: Token, amount_out: float, token_in: Token
     ) -> Tuple[float, List[Tuple[Dex, float]]]:
         """Return the minimum amount of token in for result
         If not possible, return -1
         """
-        return -1, []
+        if not self._dexes or not 0 < amount_out < inf:
+            return -1, []
+
+        routes = self.route_index.find_routes(token_in, token_out, max_hop=self.max_hop)
+
+        if not routes:
+            return -1, []
+
+        min_in, _, route_splits, _, _ = calc_amount_in_on_multi_routes(
+            routes,
+            amount_out,
+            optimal_lv=self.optimal_lv,
+        )
+
+        if min_in == inf:
+            # NOTE: some pools cannot be inverted, search the amount-in with exact-in quotes
+            min_in, route_splits = self.bisect_amount_in(routes, amount_out)
+
+        if min_in == inf:
+            return -1, []
+
+        return min_in, self.allocate(route_splits)
+
+    def bisect_amount_in(self, routes: List[Route], amount_out: float):
+        quotes: Dict[float, Tuple] = {}
+
+        def quote(amount_in: float) -> float:
+            if amount_in not in quotes:
+                quotes[amount_in] = self.quote(routes, amount_in)
+
+            return quotes[amount_in][0]
+
+        amount_in = bisect_volume_in(amount_out, quote, volume_hint=amount_out)
+
+        if amount_in == inf:
+            return inf, []
+
+        return amount_in, quotes[amount_in][1]
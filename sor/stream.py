@@ -0,0 +1,99 @@
+from typing import AsyncIterable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+
+from pydantic import BaseModel
+from pydantic import root_validator
+from pydantic import ValidationError
+
+from . import metrics
+from .models import Pool
+from .models import PoolToken
+from .models import Token
+from .preprocess import ChangeKind
+from .sor import SmartOrderRouter
+
+
+class PoolEvent(BaseModel):
+    """A pool delta published by the pool indexer.
+    `update` carries the new `reserves`, `add` the whole pool (`fee`, `tokens`, `dex`)
+    """
+
+    kind: ChangeKind
+    pool: str
+    reserves: Optional[Dict[Token, float]]
+    fee: Optional[float]
+    tokens: Optional[List[PoolToken]]
+    dex: Optional[str]
+
+    @root_validator(skip_on_failure=True)
+    def check_kind_fields(cls, values: Dict) -> Dict:
+        if values["kind"] == "update" and values.get("reserves") is None:
+            raise ValueError(f"update of {values['pool']} has no reserves")
+
+        if values["kind"] == "add" and (values.get("fee") is None or not values.get("tokens")):
+            raise ValueError(f"event adding {values['pool']} has no fee or tokens")
+
+        return values
+
+
+def apply_event(router: SmartOrderRouter, event: PoolEvent) -> int:
+    """Patch the live graph of the router, return the new graph version.
+    The graph publishes the change so only the affected routes & quotes are dropped
+    """
+    graph = router.graph
+
+    if event.kind == "update":
+        return graph.update_reserves(event.pool, event.reserves or {})
+
+    previous_dex = graph.pool_dex.get(event.pool)
+
+    if event.kind == "remove":
+        if previous_dex:
+            previous_dex.pools[:] = [p for p in previous_dex.pools if p.name != event.pool]
+
+        return graph.remove_pool(event.pool)
+
+    dex = next((d for d in router.dexes or [] if d.name == event.dex), None)
+
+    # NOTE: rejected by the validator already, checked again for the type checker
+    if event.fee is None or not event.tokens:
+        raise ValueError(f"event adding {event.pool} has no fee or tokens")
+
+    if not dex:
+        raise ValueError(f"event adding {event.pool} has an unknown dex {event.dex}")
+
+    if previous_dex:
+        previous_dex.pools[:] = [p for p in previous_dex.pools if p.name != event.pool]
+
+    pool = Pool(event.pool, event.fee, event.tokens)
+    dex.pools.append(pool)
+    return graph.add_pool(pool, dex)
+
+
+async def follow(
+    router: SmartOrderRouter,
+    messages: AsyncIterable[Union[str, bytes]],
+    limit: Optional[int] = None,
+) -> int:
+    """Apply the JSON events of `messages` (a pub/sub channel, a stream...) as they come,
+    until the source ends or `limit` events are applied. Malformed events are skipped
+    """
+    applied = 0
+
+    async for message in messages:
+        try:
+            apply_event(router, PoolEvent.parse_raw(message))
+        except (ValidationError, ValueError):
+            metrics.count("stream_errors")
+            continue
+
+        applied += 1
+        metrics.count("stream_events")
+
+        if limit is not None and applied >= limit:
+            break
+
+    return applied
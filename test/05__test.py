@@ -0,0 +1,152 @@
+from test.mock import mock
+from typing import List
+from unittest import TestCase
+
+import numpy as np
+
+from sor import batch_split
+from sor import Edge
+from sor import find_optimal_distribution
+from sor import find_optimal_distribution_vectorized
+from sor import find_routes
+from sor import Pool
+from sor import PoolStateTable
+from sor import PoolToken
+from sor import split_grid
+
+
+class VectorizedSplitTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Vectorized Swaps ***********************")
+
+    def test_1(self):
+        for count in range(1, 5):
+            for optimal_lv in [2, 5, 7]:
+                for volume in [10, 3.33333, 0.1]:
+                    expected = batch_split(volume, count, optimal_lv=optimal_lv)
+                    grid = split_grid(volume, count, optimal_lv=optimal_lv)
+                    assert expected is not None
+                    assert len(expected) == len(grid)
+
+                    for splits, row in zip(expected, grid.tolist()):
+                        size = len(splits)
+                        assert splits == row[:size]
+                        assert not any(row[size:])
+
+    def test_2(self):
+        def handler(value: float, idx: int):
+            return value * (idx + 1) - value * value * 0.1
+
+        def vectorized_handler(values, idx: int):
+            return values * (idx + 1) - values * values * 0.1
+
+        expected = find_optimal_distribution(30, 3, handler, optimal_lv=10)
+        result = find_optimal_distribution_vectorized(30, 3, vectorized_handler, optimal_lv=10)
+        assert result[0] == expected[0]
+        assert result[1][: len(expected[1])] == expected[1]
+
+    def test_3(self):
+        pools: List[Pool] = []
+
+        for idx in range(4):
+            tokens = [
+                PoolToken(token="BTC", amount=100 + idx * 37),
+                PoolToken(token="ETH", amount=1300 + idx * 101),
+            ]
+            pools.append(Pool(f"pool{idx}", 0.01, tokens))
+
+        edge = Edge(token_in="BTC", token_out="ETH", pools=pools)
+
+        for optimal_lv in [5, 10, 20]:
+            expected = edge.swap(100, optimal_lv=optimal_lv)
+            result = edge.swap(100, optimal_lv=optimal_lv, mode="vectorized")
+            print(f"optimal_lv={optimal_lv}", result[0], result[1])
+            assert result[0] == expected[0]
+            assert result[2] == expected[2]
+
+    def test_4(self):
+        _, pools, _, _ = mock()
+        amounts = [0, 1, 10.5, 1000]
+
+        for pool in pools:
+            for token_in in pool.tokens:
+                for token_out in pool.tokens:
+                    expected = [pool.swap(token_in.token, a, token_out.token) for a in amounts]
+                    result = pool.swap_many(token_in.token, np.array(amounts), token_out.token)
+                    assert expected == result.tolist()
+
+    def test_5(self):
+        _, pools, _, _ = mock()
+        table = PoolStateTable(pools)
+        amounts = np.array([0, 1, 10.5, 1000])
+
+        for idx, pool in enumerate(pools):
+            assert table.pool(idx).dict() == pool.dict()
+
+            for token_in in table.tokens:
+                for token_out in table.tokens:
+                    expected = [pool.swap(token_in, a, token_out) for a in amounts.tolist()]
+                    result = table.swap(idx, token_in, amounts, token_out)
+                    assert expected == result.tolist()
+
+        # NOTE: one batch over every pool of the universe
+        pool_ids = np.arange(len(pools))
+        result = table.swap(pool_ids, "BTC", 10, "ETH")
+        assert result.tolist() == [p.swap("BTC", 10, "ETH") for p in pools]
+
+        pools[0].swap("BTC", 10, "ETH", do_swap=True)
+        table.sync(pools[0])
+        assert table.swap(0, "BTC", 10, "ETH")[()] == pools[0].swap("BTC", 10, "ETH")
+
+    def test_6(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        table = PoolStateTable(pools)
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+
+        for route in routes:
+            expected = route.swap(50, optimal_lv=10, mode="vectorized")
+            result = route.swap(50, optimal_lv=10, mode="vectorized", table=table)
+            assert result[0] == expected[0]
+
+    def test_7(self):
+        _, pools, _, _ = mock()
+        table = PoolStateTable(pools[:5])
+        table.units
+
+        # NOTE: added rows & tombstones swap like a table built from the live pools
+        for pool in pools[5:]:
+            table.add(pool)
+
+        table.remove("pool2")
+        table.remove("pool8")
+        live = [pool for pool in pools if pool.name not in ["pool2", "pool8"]]
+
+        for current in [table, table.compact()]:
+            fresh = PoolStateTable(live)
+            assert set(current.pool_index) == set(fresh.pool_index)
+
+            for token_in in fresh.tokens:
+                for token_out in fresh.tokens:
+                    ids = np.array([current.pool_index[p.name] for p in live])
+                    expected = fresh.swap(np.arange(len(live)), token_in, 10, token_out)
+                    assert current.swap(ids, token_in, 10, token_out).tolist() == (
+                        expected.tolist()
+                    )
+                    units = current.swap_fixed(ids, token_in, 10**9, token_out)
+                    assert (
+                        units.tolist()
+                        == (
+                            fresh.swap_fixed(
+                                np.arange(len(live)), token_in, 10**9, token_out
+                            )
+                        ).tolist()
+                    )
+
+        assert "pool2" not in table.pool_index
+        assert table.swap(1, "BTC", 10, "ETH")[()] == 0
+
+        compact = table.compact()
+        assert len(compact) == len(live) and compact.removed == 0
+        assert compact.names == [p.name for p in live]
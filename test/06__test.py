@@ -0,0 +1,85 @@
+from typing import List
+from unittest import TestCase
+
+from sor import Edge
+from sor import Pool
+from sor import PoolToken
+from sor import water_fill
+
+
+class StablePool(Pool):
+    def swap(self, token_in, amount_in, token_out, do_swap=False):
+        return amount_in if self.get_token(token_in) and self.get_token(token_out) else 0
+
+
+class WaterFillTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Water Filling **************************")
+
+    def make_pools(self, count: int) -> List[Pool]:
+        pools = []
+
+        for idx in range(count):
+            tokens = [
+                PoolToken(token="BTC", amount=100 + idx * 37),
+                PoolToken(token="ETH", amount=1300 + idx * 101),
+            ]
+            pools.append(Pool(f"pool{idx}", 0.01 + idx * 0.002, tokens))
+
+        return pools
+
+    def test_1(self):
+        pools = self.make_pools(3)
+        edge = Edge(token_in="BTC", token_out="ETH", pools=pools)
+
+        grid_out, _, _ = edge.swap(100, optimal_lv=100)
+        max_out, splits, visited = edge.swap(100, mode="water_fill")
+        print("grid:", grid_out, "water-fill:", max_out, splits)
+
+        assert max_out >= grid_out
+        assert abs(sum(splits.values()) - 100) < 1e-9
+        assert visited.pools == {p.name for p in pools}
+
+    def test_2(self):
+        pools = self.make_pools(20)
+        max_out, splits = water_fill(0.01, "BTC", "ETH", pools)
+
+        # NOTE: tiny amounts only go to the pool with the best spot rate
+        assert len([v for v in splits if v > 0]) == 1
+        assert max_out > 0
+
+        max_out, splits = water_fill(5000, "BTC", "ETH", pools)
+        assert all(v > 0 for v in splits)
+
+        # NOTE: moving volume between any two pools can not improve the output
+        def output(values: List[float]):
+            return sum(p.swap("BTC", v, "ETH") for p, v in zip(pools, values))
+
+        for i, j in [(0, 1), (5, 19), (10, 3)]:
+            moved = splits.copy()
+            moved[i] += 1
+            moved[j] -= 1
+            assert output(moved) <= max_out
+
+    def test_3(self):
+        tokens = [PoolToken(token="BTC", amount=100), PoolToken(token="ETH", amount=1300)]
+        stable = StablePool("stable", 0.01, tokens)
+        pools = [*self.make_pools(2), stable]
+        edge = Edge(token_in="BTC", token_out="ETH", pools=pools)
+
+        # NOTE: the x*y=k pools are water-filled, the grid only splits with the other pool
+        grid_out, _, _ = edge.swap(10, optimal_lv=10)
+        max_out, splits, _ = edge.swap(10, optimal_lv=10, mode="water_fill")
+        assert max_out >= grid_out
+        assert abs(sum(splits.values()) - 10) < 1e-9
+
+        cpmm_in = splits["pool0"] + splits["pool1"]
+        cpmm_out, cpmm_splits = water_fill(cpmm_in, "BTC", "ETH", pools[:2])
+        assert cpmm_splits == [splits["pool0"], splits["pool1"]]
+        assert max_out == cpmm_out + stable.swap("BTC", splits["stable"], "ETH")
+
+        # NOTE: pools water-filling cannot model at all still use the grid search
+        edge = Edge(token_in="BTC", token_out="ETH", pools=[stable])
+        assert edge.swap(10, mode="water_fill") == edge.swap(10)
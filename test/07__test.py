@@ -0,0 +1,103 @@
+from test.mock import mock
+from typing import List
+from unittest import TestCase
+
+from sor import determine_token_pair_pools
+from sor import find_routes
+from sor import Pool
+from sor import PoolChange
+from sor import PoolGraph
+from sor import PoolToken
+from sor import RouteIndex
+
+
+class PoolGraphTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Pool Graph & Route Index ***************")
+
+    def test_1(self):
+        dexes, pools, pool_map, token_pairs_pools = mock()
+        graph = PoolGraph(dexes)
+        index = RouteIndex(graph)
+
+        routes = index.find_routes("BTC", "ETH", max_hop=3)
+        expected = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+        assert [str(r) for r in routes] == [str(r) for r in expected]
+
+        # NOTE: served from the cache until the topology changes
+        assert index.find_routes("BTC", "ETH", max_hop=3) is routes
+        assert len(index) == 1
+
+        graph.pool_map["pool1"].swap("BTC", 10, "ETH", do_swap=True)
+        assert index.find_routes("BTC", "ETH", max_hop=3) is routes
+
+    def test_2(self):
+        dexes, pools, pool_map, token_pairs_pools = mock()
+        graph = PoolGraph(dexes)
+        index = RouteIndex(graph)
+
+        routes = index.find_routes("BTC", "TOMO", max_hop=3)
+        assert "BTC->TOMO" not in [str(r) for r in routes]
+
+        tokens = [PoolToken(token="BTC", amount=100), PoolToken(token="TOMO", amount=9000)]
+        graph.add_pool(Pool("pool10", 0.01, tokens))
+        assert len(index) == 0
+        assert "pool10" in graph.token_pairs_pools["TOMO"]["BTC"]
+
+        routes = index.find_routes("BTC", "TOMO", max_hop=3)
+        assert "BTC->TOMO" in [str(r) for r in routes]
+
+        graph.remove_pool("pool10")
+        assert graph.token_pairs_pools == token_pairs_pools
+        assert "pool10" not in graph
+        assert len(graph) == len(pools)
+
+        routes = index.find_routes("BTC", "TOMO", max_hop=3)
+        assert "BTC->TOMO" not in [str(r) for r in routes]
+
+    def test_3(self):
+        dexes, pools, pool_map, token_pairs_pools = mock()
+        graph = PoolGraph(dexes)
+        changes: List[PoolChange] = []
+        graph.subscribe(changes.append)
+
+        assert graph.token_pairs_pools == token_pairs_pools
+        assert graph.pool_map.keys() == pool_map.keys()
+        assert graph.version == 0
+
+        tokens = [PoolToken(token="BTC", amount=100), PoolToken(token="TOMO", amount=9000)]
+        version = graph.add_pool(Pool("pool10", 0.01, tokens), dex=dexes[0])
+        assert version == graph.version == 1
+        assert "pool10" in graph.token_pairs_pools["TOMO"]["BTC"]
+        assert graph.pool_dex["pool10"] is dexes[0]
+
+        version = graph.update_reserves("pool10", {"TOMO": 8000})
+        assert version == 2
+        assert graph.pool_map["pool10"].get_token("TOMO").amount == 8000
+        assert graph.pool_version("pool10") == 2
+        assert graph.pool_version("pool1") == 0
+
+        version = graph.remove_pool("pool10")
+        assert version == 3
+        assert graph.token_pairs_pools == token_pairs_pools
+        assert "pool10" not in graph
+
+        assert [(c.kind, c.pool, c.version) for c in changes] == [
+            ("add", "pool10", 1),
+            ("update", "pool10", 2),
+            ("remove", "pool10", 3),
+        ]
+
+        # NOTE: removing every pool of a dex gives the same adjacency as a rebuild
+        for pool in dexes[0].pools:
+            graph.remove_pool(pool.name)
+
+        assert graph.token_pairs_pools == determine_token_pair_pools(dexes[1:])
+
+        # NOTE: reserve updates keep the cached routes
+        index = RouteIndex(graph)
+        routes = index.find_routes("BTC", "ETH", max_hop=3)
+        graph.update_reserves("pool5", {"BTC": 300})
+        assert index.find_routes("BTC", "ETH", max_hop=3) is routes
@@ -0,0 +1,118 @@
+from test.mock import mock
+from math import inf
+from math import nan
+from unittest import TestCase
+
+from sor import calc_amount_out_on_multi_routes
+from sor import Edge
+from sor import find_routes
+from sor import Pool
+from sor import PoolToken
+from sor import SmartOrderRouter
+
+
+class RouterTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Smart Order Router *********************")
+
+    def test_1(self):
+        dexes, pools, pool_map, token_pairs_pools = mock()
+        router = SmartOrderRouter()
+        assert router.find_best_price_out("BTC", 100, "ETH") == (-1, [])
+
+        router.dexes = dexes
+        amount_out, allocations = router.find_best_price_out("BTC", 100, "ETH")
+
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+        expected, *_ = calc_amount_out_on_multi_routes(routes, 100, mode="water_fill")
+
+        print("amount-out:", amount_out)
+        print("allocations:", [(dex.name, volume) for dex, volume in allocations])
+        assert amount_out == expected
+        assert all(dex in dexes for dex, _ in allocations)
+
+        # NOTE: a route counts once per dex, the first hop alone covers the amount-in
+        assert sum(volume for _, volume in allocations) >= 100 - 1e-6
+        assert all(volume <= 100 + 1e-6 for _, volume in allocations)
+
+        # NOTE: Kyberswap trades both hops of BTC->SOL->ETH
+        kyberswap = dexes[4]
+        assert router.allocate([[{"pool6": 10}, {"pool5": 40}]]) == [(kyberswap, 10)]
+        allocations = router.allocate([[{"pool1": 6}], [{"pool6": 4}, {"pool5": 16}]])
+        assert allocations == [(dexes[0], 6), (kyberswap, 4)]
+
+        tokens = [PoolToken(token="BTC", amount=100), PoolToken(token="TOMO", amount=9000)]
+        router.graph.add_pool(Pool("pool10", 0.01, tokens), dexes[0])
+        assert "pool10" in router.pools[1]
+
+    def test_2(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter()
+        router.dexes = dexes
+
+        assert router.find_best_price_out("BTC", 0, "ETH") == (-1, [])
+        assert router.find_best_price_out("BTC", 10, "BTC") == (-1, [])
+
+        for amount in [nan, inf, -inf]:
+            assert router.find_best_price_out("BTC", amount, "ETH") == (-1, [])
+            assert router.find_best_price_in("ETH", amount, "BTC") == (-1, [])
+
+        curve = router.find_best_price_out_curve("BTC", [nan, 10, inf], "ETH")
+        assert curve[0] == curve[2] == (-1, [])
+        assert curve[1][0] > 0
+
+        amount_out, _ = router.find_best_price_out("BTC", 10, "ETH")
+        router.graph.update_reserves("pool3", {"USDC": 5000})
+        updated_out, _ = router.find_best_price_out("BTC", 10, "ETH")
+        assert updated_out < amount_out
+
+        router.graph.remove_pool("pool3")
+        removed_out, allocations = router.find_best_price_out("BTC", 10, "ETH")
+        assert 0 < removed_out < amount_out
+        assert "Luaswap" not in [dex.name for dex, _ in allocations]
+
+    def test_3(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter()
+        router.dexes = dexes
+
+        assert router.find_best_price_in("ETH", 0, "BTC") == (-1, [])
+        assert router.find_best_price_in("ETH", 10**9, "BTC") == (-1, [])
+
+        for amount_out in [10, 500, 1500]:
+            amount_in, allocations = router.find_best_price_in("ETH", amount_out, "BTC")
+            print(f"{amount_out} ETH <- {amount_in} BTC")
+            assert allocations
+
+            # NOTE: the quoted amount-in buys at least amount-out
+            quoted_out, _ = router.find_best_price_out("BTC", amount_in, "ETH")
+            assert quoted_out >= amount_out * (1 - 1e-6)
+
+            routes = router.route_index.find_routes("BTC", "ETH", max_hop=3)
+            bisected_in, _ = router.bisect_amount_in(routes, amount_out)
+            assert amount_in <= bisected_in * (1 + 1e-4)
+
+    def test_4(self):
+        pools = [
+            Pool(
+                "p1",
+                0.01,
+                [PoolToken(token="BTC", amount=100), PoolToken(token="ETH", amount=1300)],
+            ),
+            Pool(
+                "p2",
+                0.003,
+                [PoolToken(token="BTC", amount=30), PoolToken(token="ETH", amount=400)],
+            ),
+        ]
+        edge = Edge(token_in="BTC", token_out="ETH", pools=pools)
+
+        amount_in, splits, _ = edge.swap_in(500)
+        amount_out, *_ = edge.swap(amount_in, mode="water_fill")
+        assert abs(amount_out - 500) < 1e-3
+        assert abs(sum(splits.values()) - amount_in) < 1e-4
+
+        assert edge.swap_in(1700)[0] == inf
+        assert pools[0].swap_in("BTC", 1300, "ETH") == inf
@@ -0,0 +1,139 @@
+import pickle
+from test.mock import mock
+from unittest import TestCase
+
+from sor import calc_amount_out_on_multi_routes
+from sor import find_routes
+from sor import PoolGraph
+from sor import PoolSet
+from sor import RouteIndex
+from sor import SmartOrderRouter
+from sor import SwapCache
+
+
+class SwapCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Swap Cache & Pool Sets *****************")
+
+    def test_1(self):
+        versions = {"a": 0, "b": 0}
+        cache = SwapCache(maxsize=2, pool_version=versions.__getitem__)
+        calls = []
+
+        def compute(value):
+            calls.append(value)
+            return value
+
+        assert cache.memo("x", lambda: ["a"], lambda: compute(1)) == 1
+        assert cache.memo("x", lambda: ["a"], lambda: compute(2)) == 1
+        assert cache.memo("y", lambda: ["b"], lambda: compute(3)) == 3
+
+        # NOTE: a new state of pool `a` only drops the entries reading it
+        versions["a"] = 1
+        assert cache.memo("x", lambda: ["a"], lambda: compute(4)) == 4
+        assert cache.memo("y", lambda: ["b"], lambda: compute(5)) == 3
+        assert calls == [1, 3, 4]
+
+        cache.memo("z", lambda: [], lambda: compute(6))
+        assert len(cache) == 2
+        assert "x" not in cache
+
+        stats = cache.stats()
+        print(stats)
+        assert stats["hits"] == 2
+        assert stats["misses"] == 4
+        assert stats["stales"] == 1
+        assert stats["evictions"] == 1
+
+    def test_2(self):
+        dexes, pools, pool_map, token_pairs_pools = mock()
+        graph = PoolGraph(dexes)
+        cache = SwapCache(pool_version=graph.pool_version)
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=4)
+
+        for mode in ["grid", "water_fill"]:
+            expected = calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2, mode=mode)
+            result = calc_amount_out_on_multi_routes(
+                routes,
+                100,
+                optimal_lv=2,
+                mode=mode,
+                swap_cache=cache,
+            )
+            assert result[0] == expected[0]
+            assert result[2] == expected[2]
+
+            for path in routes:
+                assert path.swap(50, mode=mode, swap_cache=cache) == path.swap(50, mode=mode)
+
+        hits = cache.hits
+        calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2, swap_cache=cache)
+        assert cache.hits == hits + 1
+
+        graph.update_reserves("pool3", {"BTC": 20})
+        expected = calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2)
+        result = calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2, swap_cache=cache)
+        assert result[0] == expected[0]
+        assert cache.stales > 0
+
+    def test_3(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter()
+        router.dexes = dexes
+
+        amount_out, _ = router.find_best_price_out("BTC", 10, "ETH")
+        misses = router.swap_cache.misses
+        assert router.find_best_price_out("BTC", 10, "ETH")[0] == amount_out
+        assert router.swap_cache.misses == misses
+
+        router.graph.update_reserves("pool3", {"USDC": 5000})
+        assert router.find_best_price_out("BTC", 10, "ETH")[0] < amount_out
+
+    def test_4(self):
+        left = PoolSet(pools={"pool1", "pool2"})
+        right = PoolSet(pools=["pool2", "pool3"])
+
+        assert left == PoolSet(pools=["pool2", "pool1"])
+        assert hash(left) == hash(PoolSet(pools=["pool2", "pool1"]))
+        assert left.pools == {"pool1", "pool2"}
+        assert "pool1" in left and "pool3" not in left and "unknown" not in left
+
+        union = left.union(right)
+        assert union.pools == {"pool1", "pool2", "pool3"}
+        assert left.pools == {"pool1", "pool2"}
+        assert union == left | right
+        assert len(union) == 3
+        assert not PoolSet()
+
+        with self.assertRaises(AttributeError):
+            left.mask = 0
+
+        assert pickle.loads(pickle.dumps(union)) == union
+
+    def test_5(self):
+        dexes, _, _, _ = mock()
+        graph = PoolGraph(dexes)
+        ids = graph.pool_ids
+        assert len(ids) == len(graph)
+
+        routes = RouteIndex(graph).find_routes("BTC", "ETH", max_hop=3)
+        _, _, visited = routes[0].swap(10, mode="water_fill")
+        assert visited.ids is ids
+        assert visited and visited.pools <= set(routes[0].pool_names())
+
+        # NOTE: the ids of removed pools are reused, masks do not widen
+        width = max(ids.ids.values())
+
+        for _ in range(3):
+            pool = graph.pool_map["pool1"]
+            graph.remove_pool("pool1")
+            assert "pool1" not in PoolSet(mask=visited.mask, ids=ids)
+            graph.add_pool(pool, dexes[0])
+
+        assert max(ids.ids.values()) == width
+        assert len(ids) == len(graph)
+
+        with self.assertRaises(ValueError):
+            PoolSet(["pool1"], ids=ids) | PoolSet(["pool2"])
@@ -0,0 +1,80 @@
+from test.mock import mock
+from unittest import TestCase
+
+from sor import calc_amount_out_on_multi_routes
+from sor import Edge
+from sor import find_routes
+from sor import metrics
+from sor import SmartOrderRouter
+
+
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Instrumentation ************************")
+
+    def test_1(self):
+        dexes, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=4)
+        expected = calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2)
+
+        with metrics.instrument() as stats:
+            found = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=4)
+            result = calc_amount_out_on_multi_routes(found, 100, optimal_lv=2)
+
+        report = stats.report()
+        print(report)
+
+        # NOTE: measuring never changes the quote
+        assert result[0] == expected[0]
+        assert result[2] == expected[2]
+
+        assert report["counters"]["routes_found"] == len(routes)
+        assert "routes_pruned" not in report["counters"]
+        assert report["counters"]["candidate_splits"] > 0
+        assert report["counters"]["handler_calls"] > 0
+        assert report["counters"]["pool_swaps"] > 0
+        assert report["counters"]["route_explanations"] == len(result[1])
+        assert report["calls"]["find_routes"] == 1
+        assert report["calls"]["calc_amount_out_on_multi_routes"] == 1
+        assert report["calls"]["Route.swap"] > 0
+        assert report["calls"]["Edge.swap"] > 0
+        assert report["timers"]["find_optimal_distribution"] > 0
+
+        # NOTE: nothing is recorded once the sink is uninstalled, stages are left as is
+        assert metrics.SINK is None
+        calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2)
+        assert stats.report() == report
+        assert (
+            calc_amount_out_on_multi_routes
+            is metrics.STAGES[id(calc_amount_out_on_multi_routes)][0]
+        )
+        assert Edge.swap.__qualname__ == "Edge.swap" and not hasattr(Edge.swap, "__wrapped__")
+
+        with metrics.instrument() as stats:
+            find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, 4, amount_in=100)
+
+        # NOTE: only the paths cut by their bound count as pruned
+        assert stats.report()["counters"]["routes_pruned"] > 0
+
+    def test_2(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter()
+        router.dexes = dexes
+        events = []
+
+        with metrics.instrument(metrics.CallbackSink(lambda *event: events.append(event))):
+            router.find_best_price_out("BTC", 10, "ETH")
+            router.find_best_price_out("BTC", 10, "ETH")
+
+        assert ("counter", "cache_hits", 1) in events
+        assert ("counter", "cache_misses", 1) in events
+        assert any(kind == "timer" and name == "find_routes" for kind, name, _ in events)
+
+        stats = metrics.StatsSink()
+        previous = metrics.install(stats)
+        router.graph.update_reserves("pool3", {"USDC": 5000})
+        router.find_best_price_out("BTC", 10, "ETH")
+        assert metrics.install(previous) is stats
+        assert 0 < stats.report()["cache_hit_ratio"] < 1
@@ -0,0 +1,51 @@
+import asyncio
+from test.mock import MockRedis
+from unittest import TestCase
+
+from repos import PolygonPoolRepository
+from repos import Redis
+
+
+def mock_pairs(count: int):
+    data = {
+        f":pairs:0x{idx:04}-0x{idx + 1:04}": [f"0xpool{idx}", f"0xpool{idx}b"]
+        for idx in range(count)
+    }
+    data[":tokens:0x0001"] = ["ignored"]
+    return data
+
+
+class PolygonPoolRepositoryTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Polygon Pool Repository ****************")
+
+    def test_1(self):
+        client = MockRedis(mock_pairs(2500))
+        redis = Redis(client)
+
+        keys = asyncio.run(redis.scan_keys(":pairs:0x*", count=1000))
+        assert len(keys) == 2500
+        assert client.round_trips == 3
+
+        client.round_trips = 0
+        result = asyncio.run(redis.get_keys_pipelined(keys, batch_size=500, concurrency=2))
+        assert result == {key: client.data[key] for key in keys}
+        assert client.round_trips == 5
+        assert client.max_in_flight == 2
+
+    def test_2(self):
+        client = MockRedis(mock_pairs(1200))
+        repo = PolygonPoolRepository(Redis(client), batch_size=500)
+
+        pools = asyncio.run(repo.read_pools())
+        print(f"{client.round_trips} round-trips")
+        assert len(pools) == 2400
+        assert pools[0] == {"0xpool0": {"0x0000", "0x0001"}}
+        assert pools[1] == {"0xpool0b": {"0x0000", "0x0001"}}
+        # NOTE: 2 pages of SCAN & 3 pipelines instead of a ZRANGE per key
+        assert client.round_trips == 5
+
+        pools = asyncio.run(repo.read_pools(limit=10))
+        assert len(pools) == 20
@@ -0,0 +1,122 @@
+import os
+from tempfile import TemporaryDirectory
+from test.mock import mock
+from unittest import TestCase
+from unittest.mock import patch
+
+from bench import generate_market
+from sor import load_router
+from sor import Pool
+from sor import PoolToken
+from sor import read_snapshot
+from sor import SmartOrderRouter
+from sor import SnapshotPools
+from sor import write_snapshot
+
+
+class SnapshotTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Pool Snapshots *************************")
+
+    def test_1(self):
+        dexes, pools, _, token_pairs_pools = mock()
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pools.snapshot")
+            write_snapshot(path, dexes)
+            loaded_dexes, graph, table = read_snapshot(path)
+
+        assert [dex.name for dex in loaded_dexes] == [dex.name for dex in dexes]
+        assert [dex.gas for dex in loaded_dexes] == [dex.gas for dex in dexes]
+        assert graph.token_pairs_pools == token_pairs_pools
+        assert table.names == [p.name for p in pools]
+
+        for pool in pools:
+            loaded = graph.pool_map[pool.name]
+            assert loaded.dict() == pool.dict()
+            assert graph.pool_dex[pool.name].name in [d.name for d in dexes]
+            assert loaded.swap("BTC", 10, "ETH") == pool.swap("BTC", 10, "ETH")
+
+    def test_2(self):
+        dexes = generate_market(pool_count=60, seed=3)
+        router = SmartOrderRouter(max_hop=3, optimal_lv=3)
+        router.dexes = dexes
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pools.snapshot")
+            write_snapshot(path, dexes)
+            loaded = load_router(path, max_hop=3, optimal_lv=3)
+
+            for token_in, token_out in [("BTC", "ETH"), ("USDC", "KNC")]:
+                expected = router.find_best_price_out(token_in, 1, token_out)
+                result = loaded.find_best_price_out(token_in, 1, token_out)
+                assert result[0] == expected[0]
+                assert [(d.name, v) for d, v in result[1]] == [
+                    (d.name, v) for d, v in expected[1]
+                ]
+
+            # NOTE: updates are private to the process, the snapshot is left untouched
+            name = loaded.graph.pool_list[0].name
+            before = loaded.table.amounts.copy()
+            loaded.graph.update_reserves(name, {loaded.table.tokens[0]: 1})
+            assert (loaded.table.amounts != before).any()
+            _, graph, table = read_snapshot(path)
+            assert (table.amounts == before).all()
+
+    def test_3(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pools.snapshot")
+
+            with open(path, "wb") as f:
+                f.write(bytes(64))
+
+            with self.assertRaises(ValueError):
+                read_snapshot(path)
+
+    def test_4(self):
+        dexes, pools, _, token_pairs_pools = mock()
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pools.snapshot")
+            write_snapshot(path, dexes)
+            loaded_dexes, graph, table = read_snapshot(path)
+
+        # NOTE: a pool is built once, later lookups see its updates
+        pool = graph.pool_map["pool1"]
+        assert graph.pool_map["pool1"] is pool
+        assert loaded_dexes[0].pools[0] is pool
+        graph.update_reserves("pool1", {"BTC": 100})
+        assert graph.pool_map["pool1"].tokens[0].amount == 100
+
+        tokens = [PoolToken(token="BTC", amount=10), PoolToken(token="TOMO", amount=30)]
+        loaded_dexes[0].pools.append(Pool("pool10", 0.01, tokens))
+        graph.add_pool(loaded_dexes[0].pools[-1], loaded_dexes[0])
+        assert [p.name for p in loaded_dexes[0].pools] == ["pool1", "pool10"]
+        assert graph.token_pairs_pools["TOMO"]["BTC"] == {"pool10"}
+        assert "pool10" in graph and len(graph) == len(pools) + 1
+
+        graph.remove_pool("pool10")
+        loaded_dexes[0].pools[:] = [p for p in loaded_dexes[0].pools if p.name != "pool10"]
+        assert graph.token_pairs_pools == token_pairs_pools
+        assert [p.name for p in loaded_dexes[0].pools] == ["pool1"]
+        assert "pool10" not in graph.pool_map
+
+    def test_5(self):
+        dexes, _, _, _ = mock()
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pools.snapshot")
+            write_snapshot(path, dexes)
+            router = load_router(path, max_hop=2)
+
+        # NOTE: a route lookup only builds the pools of the pairs it visits
+        with patch.object(
+            SnapshotPools, "_build", autospec=True, side_effect=SnapshotPools._build
+        ) as build:
+            routes = router.route_index.find_routes("SOL", "KNC", max_hop=2)
+
+        names = {name for route in routes for name in route.pool_names()}
+        assert names == {"pool7"}
+        assert build.call_count == len(names) < len(router.graph)
@@ -0,0 +1,129 @@
+import asyncio
+import json
+from test.mock import mock
+from test.mock import MockRedis
+from unittest import TestCase
+
+from repos import Redis
+from sor import apply_event
+from sor import follow
+from sor import PoolEvent
+from sor import SmartOrderRouter
+
+
+def mock_router():
+    dexes, _, _, _ = mock()
+    router = SmartOrderRouter(max_hop=3, optimal_lv=3)
+    router.dexes = dexes
+    return router
+
+
+def reload(router: SmartOrderRouter):
+    fresh = SmartOrderRouter(max_hop=3, optimal_lv=3)
+    fresh.dexes = router.dexes
+    return fresh
+
+
+class StreamTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Streaming Pool Updates *****************")
+
+    def test_1(self):
+        router = mock_router()
+        router.find_best_price_out("BTC", 10, "ETH")
+        router.find_best_price_out("USDC", 10, "TOMO")
+        assert len(router.route_index) == 2
+
+        event = PoolEvent(kind="update", pool="pool3", reserves={"BTC": 250})
+        apply_event(router, event)
+        assert len(router.route_index) == 2
+        assert (
+            router.find_best_price_out("BTC", 10, "ETH")[0]
+            == reload(router).find_best_price_out("BTC", 10, "ETH")[0]
+        )
+
+        # NOTE: a pool on a known pair only drops the routes crossing that pair
+        tokens = [{"token": "BTC", "amount": 400}, {"token": "ETH", "amount": 900}]
+        event = PoolEvent(kind="add", pool="pool10", fee=0.01, tokens=tokens, dex="Uniswap")
+        apply_event(router, event)
+        assert len(router.route_index) == 1
+        assert "pool10" in [p.name for p in router.dexes[0].pools]
+
+        amount_out, allocations = router.find_best_price_out("BTC", 10, "ETH")
+        expected, _ = reload(router).find_best_price_out("BTC", 10, "ETH")
+        assert amount_out == expected
+
+        apply_event(router, PoolEvent(kind="remove", pool="pool10"))
+        assert "pool10" not in router.graph
+        assert "pool10" not in [p.name for p in router.dexes[0].pools]
+
+        with self.assertRaises(ValueError):
+            apply_event(router, PoolEvent(kind="add", pool="pool11", dex="Uniswap"))
+
+    def test_2(self):
+        router = mock_router()
+        client = MockRedis()
+        redis = Redis(client)
+        before, _ = router.find_best_price_out("BTC", 10, "ETH")
+
+        async def run():
+            messages = redis.subscribe("pools")
+            consumer = asyncio.create_task(follow(router, messages, limit=2))
+            await asyncio.sleep(0)
+
+            event = {"kind": "update", "pool": "pool3", "reserves": {"BTC": 20}}
+            await client.publish("pools", json.dumps(event))
+            await client.publish("pools", "not an event")
+            event = {"kind": "update", "pool": "pool4", "reserves": {"ETH": 700}}
+            await client.publish("pools", json.dumps(event))
+            return await consumer
+
+        assert asyncio.run(run()) == 2
+        assert router.graph.pool_map["pool3"].get_token("BTC").amount == 20
+        assert router.graph.pool_map["pool4"].get_token("ETH").amount == 700
+
+        after, _ = router.find_best_price_out("BTC", 10, "ETH")
+        assert after != before
+        assert after == reload(router).find_best_price_out("BTC", 10, "ETH")[0]
+
+    def test_3(self):
+        router = mock_router()
+        client = MockRedis()
+        redis = Redis(client)
+
+        async def run():
+            for amount in [100, 200, 300]:
+                event = {"kind": "update", "pool": "pool1", "reserves": {"BTC": amount}}
+                await client.xadd("pools", {"data": json.dumps(event)})
+
+            messages = redis.read_stream("pools", last_id="0-0")
+            return await follow(router, messages, limit=3)
+
+        assert asyncio.run(run()) == 3
+        assert router.graph.pool_map["pool1"].get_token("BTC").amount == 300
+        assert router.graph.pool_version("pool1") == router.graph.version
+
+    def test_4(self):
+        router = mock_router()
+        client = MockRedis()
+        redis = Redis(client)
+
+        def event(amount):
+            update = {"kind": "update", "pool": "pool1", "reserves": {"BTC": amount}}
+            return {"data": json.dumps(update)}
+
+        async def run():
+            await client.xadd("pools", event(50))
+            consumer = asyncio.create_task(follow(router, redis.read_stream("pools"), limit=2))
+            await asyncio.sleep(0)
+
+            # NOTE: appended after the first (empty) read, the entries are still read
+            for amount in [100, 200]:
+                await client.xadd("pools", event(amount))
+
+            return await consumer
+
+        assert asyncio.run(run()) == 2
+        assert router.graph.pool_map["pool1"].get_token("BTC").amount == 200
@@ -0,0 +1,97 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from test.mock import mock
+from unittest import TestCase
+from unittest.mock import patch
+
+from sor import quote
+from sor import quote_batch
+from sor import SmartOrderRouter
+from sor import summarize
+from sor import write_snapshot
+
+
+class QuoteBatchTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Batch Quotes ***************************")
+
+    def test_1(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(max_hop=3, optimal_lv=3)
+        router.dexes = dexes
+
+        requests = [
+            {"token_in": "BTC", "token_out": "ETH", "amount": amount, "id": str(amount)}
+            for amount in range(1, 20)
+        ]
+        requests.append(
+            {"token_in": "BTC", "token_out": "ETH", "amount": 5, "kind": "exact_out"}
+        )
+        lines = [json.dumps(r) for r in requests]
+        lines.insert(3, "not a request")
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pools.snapshot")
+            write_snapshot(path, dexes)
+            results = list(
+                quote_batch(lines, path, workers=2, chunksize=4, max_hop=3, optimal_lv=3)
+            )
+
+        assert len(results) == len(lines)
+        assert json.loads(results[3][0])["error"]
+        assert results[3][1] is None
+
+        # NOTE: every worker has its own router, results come back in input order
+        for line, (result, elapsed) in zip(lines, results):
+            if line == "not a request":
+                continue
+
+            response = json.loads(result)
+            expected = json.loads(quote(router, line)[0])
+            assert response["result"] == expected["result"]
+            assert response["allocations"] == expected["allocations"]
+            assert response.get("id") == json.loads(line).get("id")
+            assert elapsed is not None and elapsed > 0
+
+        assert json.loads(results[-1][0])["kind"] == "exact_out"
+
+        summary = summarize([elapsed for _, elapsed in results if elapsed], 1.5, errors=1)
+        print(summary)
+        assert summary["quotes"] == len(lines) - 1
+        assert summary["errors"] == 1
+        assert summary["p50_ms"] <= summary["p99_ms"]
+
+    def test_2(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(max_hop=3, optimal_lv=3)
+        router.dexes = dexes
+        amounts = ["1", "Infinity", "NaN", "-Infinity", "0", "-2", "3"]
+        lines = [
+            f'{{"token_in": "BTC", "token_out": "ETH", "amount": {amount}, "kind": "{kind}"}}'
+            for amount in amounts
+            for kind in ["exact_in", "exact_out"]
+        ]
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "pools.snapshot")
+            write_snapshot(path, dexes)
+            results = list(quote_batch(lines, path, workers=2, chunksize=3, max_hop=3))
+
+        # NOTE: amounts that are not finite & positive are rejected, in input order
+        assert len(results) == len(lines)
+
+        for line, (result, elapsed) in zip(lines, results):
+            valid = '"amount": 1,' in line or '"amount": 3,' in line
+            assert ("error" in json.loads(result)) != valid
+            assert (elapsed is None) != valid
+
+        # NOTE: a failing router makes an error line of the request
+        with patch.object(router, "find_best_price_out", side_effect=RuntimeError("down")):
+            result, elapsed = quote(router, lines[0])
+
+        assert elapsed is None
+        assert json.loads(result)["error"] == "RuntimeError: down"
+        assert json.loads(result)["amount"] == 1
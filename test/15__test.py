@@ -0,0 +1,108 @@
+from test.mock import mock
+from unittest import TestCase
+
+from sor import calc_amount_out_on_multi_routes
+from sor import find_optimal_distribution
+from sor import find_optimal_distribution_from
+from sor import find_routes
+from sor import ParallelSplitSearch
+from sor import Pool
+from sor import PoolToken
+from sor import SmartOrderRouter
+from sor import split_prefixes
+
+
+class ParallelTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Parallel Split Search ******************")
+
+    def test_1(self):
+        # NOTE: merging the earliest best of every prefix gives the sequential result
+        def handler(value: float, idx: int):
+            return value ** (0.5 + idx * 0.1)
+
+        for split_count, min_count in [(2, 1), (3, 8), (4, 40)]:
+            expected = find_optimal_distribution(100, split_count, handler, optimal_lv=4)
+            prefixes = split_prefixes(100, split_count, optimal_lv=4, min_count=min_count)
+            assert len(prefixes) >= min_count
+
+            result, splits = float(0), []
+
+            for prefix, remain in prefixes:
+                current, current_splits = find_optimal_distribution_from(
+                    prefix, remain, split_count, handler, optimal_lv=4
+                )
+
+                if current > result:
+                    result, splits = current, current_splits
+
+            assert (result, splits) == expected
+
+    def test_2(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+
+        with ParallelSplitSearch(pools, workers=2) as search:
+            for amount in [10, 100]:
+                expected = calc_amount_out_on_multi_routes(routes, amount, optimal_lv=3)
+                result = search.calc_amount_out_on_multi_routes(routes, amount, optimal_lv=3)
+                assert result[0] == expected[0]
+                assert result[1] == expected[1]
+                assert result[2] == expected[2]
+
+    def test_3(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(max_hop=3, optimal_lv=3, mode="grid", workers=2)
+        router.dexes = dexes
+        sequential = SmartOrderRouter(max_hop=3, optimal_lv=3, mode="grid")
+        sequential.dexes = dexes
+
+        try:
+            assert router.find_best_price_out("BTC", 10, "ETH")[0] == (
+                sequential.find_best_price_out("BTC", 10, "ETH")[0]
+            )
+            search = router.parallel
+            assert search
+
+            # NOTE: live workers pick up new reserves with their next tasks
+            for amount in [5000, 20, 800]:
+                router.graph.update_reserves("pool3", {"USDC": amount})
+                assert router.parallel is search
+                sequential.swap_cache.clear()
+                assert router.find_best_price_out("BTC", 10, "ETH")[0] == (
+                    sequential.find_best_price_out("BTC", 10, "ETH")[0]
+                )
+
+            # NOTE: pools added to the graph are shipped to the live workers
+            tokens = [PoolToken(token="BTC", amount=50), PoolToken(token="ETH", amount=300)]
+            pool = Pool("pool10", 0.01, tokens)
+            router.graph.add_pool(pool, dexes[0])
+            sequential.graph.add_pool(pool, dexes[0])
+            assert router.parallel is search
+            assert router.find_best_price_out("BTC", 10, "ETH")[0] == (
+                sequential.find_best_price_out("BTC", 10, "ETH")[0]
+            )
+            assert "pool10" in {
+                name
+                for route in router.route_index.find_routes("BTC", "ETH", 3)
+                for name in route.pool_names()
+            }
+
+            # NOTE: removed pools leave tombstones in the table until it is compacted
+            table = router.table
+
+            for name in ["pool10", "pool1", "pool2", "pool5", "pool6", "pool8"]:
+                router.graph.remove_pool(name)
+                sequential.graph.remove_pool(name)
+                assert router.find_best_price_out("BTC", 10, "ETH")[0] == (
+                    sequential.find_best_price_out("BTC", 10, "ETH")[0]
+                )
+
+            assert router.parallel is search
+            assert router.table is not table
+            assert router.table.names == [n for n in table.names if n in router.graph]
+            assert set(router.table.pool_index) == set(router.graph.pool_map)
+        finally:
+            router.close()
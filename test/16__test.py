@@ -0,0 +1,57 @@
+from test.mock import mock
+from unittest import TestCase
+
+from sor import calc_amount_out_on_multi_routes
+from sor import find_optimal_distribution
+from sor import find_optimal_distribution_adaptive
+from sor import find_routes
+
+
+class AdaptiveSplitTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Adaptive Split Search ******************")
+
+    def test_1(self):
+        calls = 0
+
+        def handler(value: float, idx: int):
+            nonlocal calls
+            calls += 1
+            weights = [3, 1, 2]
+            return weights[idx] * value / (value + 40)
+
+        calls = 0
+        fine, fine_splits = find_optimal_distribution(100, 3, handler, optimal_lv=20)
+        fine_calls = calls
+
+        calls = 0
+        result, splits = find_optimal_distribution_adaptive(100, 3, handler, optimal_lv=2)
+        print(result, splits, calls, fine, fine_splits, fine_calls)
+
+        assert result >= fine
+        assert abs(sum(splits) - 100) < 1e-4
+        assert calls < fine_calls / 4
+
+        assert find_optimal_distribution_adaptive(100, 1, handler) == (handler(100, 0), [100])
+        assert find_optimal_distribution_adaptive(0, 3, handler) == (0, [])
+
+    def test_2(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=4)
+
+        # NOTE: the 2-pass filtering of `04__test.py` done by hand
+        _, _, _, _, used_paths = calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2)
+        expected = calc_amount_out_on_multi_routes(used_paths, 100, optimal_lv=20)
+
+        result = calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2, mode="adaptive")
+        print(result[0], result[1], expected[0], expected[1])
+        assert result[0] >= expected[0]
+        assert abs(sum(result[1]) - 100) < 1e-4
+        assert len(result[2]) == len(result[4])
+
+        for route in routes:
+            grid_out, _, _ = route.swap(100, optimal_lv=2, mode="grid")
+            adaptive_out, splits, _ = route.swap(100, optimal_lv=2, mode="adaptive")
+            assert adaptive_out >= grid_out
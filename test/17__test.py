@@ -0,0 +1,61 @@
+from test.mock import mock
+from unittest import TestCase
+
+from sor import calc_amount_out_on_multi_routes
+from sor import find_routes
+from sor import greedy_quote
+from sor import route_bound
+from sor import select_routes
+from sor import SmartOrderRouter
+
+
+class RoutePruningTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Route Pruning **************************")
+
+    def test_1(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=4)
+
+        for route in routes:
+            for amount in [1, 10, 100]:
+                out, _, _ = route.swap(amount, optimal_lv=2)
+                assert greedy_quote(route, amount) <= out + 1e-5
+                assert out <= route_bound(route, amount) + 1e-5
+
+    def test_2(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        args = ("BTC", "ETH", pools, token_pairs_pools, pool_map)
+
+        for max_hop in [3, 4, 5]:
+            routes = find_routes(*args, max_hop=max_hop)
+            pruned = find_routes(*args, max_hop=max_hop, amount_in=1)
+            print(f"max_hop={max_hop}: {len(routes)} routes, {len(pruned)} kept")
+            assert 0 < len(pruned) < len(routes)
+
+            # NOTE: same routes as filtering the whole enumeration
+            expected = select_routes(routes, 1)
+            assert [str(r) for r in pruned] == [str(r) for r in expected]
+
+        capped = find_routes(*args, max_hop=5, amount_in=100, max_routes=3)
+        assert len(capped) == 3
+        quotes = [greedy_quote(r, 100) for r in capped]
+        assert quotes == sorted(quotes, reverse=True)
+
+        # NOTE: the handful of routes kept does as well as all of them
+        routes = find_routes(*args, max_hop=4)
+        capped = find_routes(*args, max_hop=4, amount_in=100, max_routes=3)
+        expected = calc_amount_out_on_multi_routes(routes, 100, optimal_lv=2)
+        result = calc_amount_out_on_multi_routes(capped, 100, optimal_lv=2)
+        print(result[0], expected[0])
+        assert result[0] >= expected[0] * 0.99
+
+    def test_3(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(max_hop=4, optimal_lv=2, mode="grid", max_routes=3)
+        router.dexes = dexes
+        amount_out, allocations = router.find_best_price_out("BTC", 100, "ETH")
+        assert amount_out > 0
+        assert allocations
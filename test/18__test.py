@@ -0,0 +1,101 @@
+import random
+from itertools import permutations
+from test.mock import mock
+from unittest import TestCase
+
+from sor import apply_event
+from sor import find_k_best_routes
+from sor import find_routes
+from sor import k_shortest_paths
+from sor import log_rate_graph
+from sor import PoolEvent
+from sor import SmartOrderRouter
+
+
+def path_cost(graph, path):
+    return sum(graph[path[i]][path[i + 1]] for i in range(len(path) - 1))
+
+
+def simple_paths(graph, source, target, max_edges):
+    paths = []
+
+    def walk(path):
+        if path[-1] == target:
+            paths.append(path)
+            return
+
+        if len(path) > max_edges:
+            return
+
+        for neighbour in graph.get(path[-1], {}):
+            if neighbour not in path:
+                walk(path + (neighbour,))
+
+    walk((source,))
+    return paths
+
+
+class KBestRoutesTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing K-Best Route Search ********************")
+
+    def test_1(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        graph = log_rate_graph(token_pairs_pools, pool_map)
+
+        for max_hop in [3, 4, 5]:
+            routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop)
+            best = find_k_best_routes(
+                "BTC", "ETH", token_pairs_pools, pool_map, k=4, max_hop=max_hop
+            )
+            assert 0 < len(best) <= 4
+            assert {str(r) for r in best} <= {str(r) for r in routes}
+
+            # NOTE: the k cheapest paths of the log-rate graph, cheapest first
+            paths = [tuple(e.token_in for e in r.edges) + ("ETH",) for r in best]
+            costs = [path_cost(graph, p) for p in paths]
+            assert costs == sorted(costs)
+            everything = sorted(
+                path_cost(graph, p) for p in simple_paths(graph, "BTC", "ETH", max_hop - 1)
+            )
+            assert all(abs(a - b) < 1e-9 for a, b in zip(costs, everything))
+
+    def test_2(self):
+        # NOTE: Yen's search against the enumeration of a random graph
+        rng = random.Random(7)
+        nodes = [f"t{i}" for i in range(12)]
+        graph = {n: {} for n in nodes}
+
+        for a, b in permutations(nodes, 2):
+            if rng.random() < 0.3:
+                graph[a][b] = rng.random()
+
+        for source, target in [("t0", "t1"), ("t2", "t9"), ("t5", "t3")]:
+            paths = k_shortest_paths(graph, source, target, k=10, max_edges=4)
+            assert all(len(set(p)) == len(p) and len(p) <= 5 for _, p in paths)
+            assert len({p for _, p in paths}) == len(paths)
+
+            everything = sorted(
+                path_cost(graph, p) for p in simple_paths(graph, source, target, 4)
+            )
+            assert len(paths) == min(10, len(everything))
+            assert all(abs(c - e) < 1e-9 for (c, _), e in zip(paths, everything))
+
+    def test_3(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(max_hop=4, optimal_lv=2, mode="grid", k_routes=3)
+        router.dexes = dexes
+        amount_out, allocations = router.find_best_price_out("BTC", 10, "ETH")
+        assert amount_out > 0
+        assert allocations
+        assert len(router.route_index.find_routes("BTC", "ETH", max_hop=4)) <= 3
+
+        # NOTE: adding a pool reranks the routes
+        tokens = [{"token": "BTC", "amount": 400}, {"token": "ETH", "amount": 900}]
+        event = PoolEvent(kind="add", pool="pool10", fee=0.01, tokens=tokens, dex="Uniswap")
+        apply_event(router, event)
+        assert len(router.route_index) == 0
+        routes = router.route_index.find_routes("BTC", "ETH", max_hop=4)
+        assert "pool10" in {name for r in routes for name in r.pool_names()}
@@ -0,0 +1,74 @@
+from test.mock import mock
+from unittest import TestCase
+
+from sor import Edge
+from sor import find_routes
+from sor import Pool
+from sor import PoolToken
+from sor import SwapOverlay
+
+
+def make_pool():
+    tokens = [PoolToken(token="BTC", amount=100), PoolToken(token="ETH", amount=1300)]
+    return Pool("pool", 0.01, tokens)
+
+
+class SwapOverlayTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Swap Overlay ***************************")
+
+    def test_1(self):
+        pool, mutated = make_pool(), make_pool()
+        overlay = SwapOverlay()
+
+        for amount in [10, 5, 20]:
+            expected = mutated.swap("BTC", amount, "ETH", do_swap=True)
+            assert pool.swap("BTC", amount, "ETH", do_swap=True, overlay=overlay) == expected
+            assert pool.swap("ETH", 100, "BTC", overlay=overlay) == mutated.swap(
+                "ETH", 100, "BTC"
+            )
+
+        # NOTE: the shared pool is untouched
+        assert pool.get_token("BTC").amount == 100
+        assert overlay.amount("pool", pool.get_token("BTC")) == 135
+        assert len(overlay) == 2
+
+        overlay.reset()
+        assert len(overlay) == 0
+        assert pool.swap("BTC", 10, "ETH", overlay=overlay) == pool.swap("BTC", 10, "ETH")
+
+    def test_2(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+        amounts = {p.name: [t.amount for t in p.tokens] for p in pools}
+        orders = [[p.name for e in route.edges for p in e.pools] for route in routes]
+
+        for mode in ["grid", "water_fill", "vectorized"]:
+            for route in routes:
+                expected, _, _ = route.swap(10, optimal_lv=3, mode=mode)
+                first, second = SwapOverlay(), SwapOverlay()
+                amount_out, path_splits, _ = route.swap(10, None, 3, mode, overlay=first)
+                assert abs(amount_out - expected) < 1e-4
+                assert len(path_splits) == len(route.edges)
+
+                # NOTE: the next quote trades on the post-trade reserves
+                again, _, _ = route.swap(10, None, 3, mode, overlay=first)
+                assert again < amount_out
+
+                # NOTE: quotes sharing the base state do not see each other
+                assert route.swap(10, None, 3, mode, overlay=second)[0] == amount_out
+
+        assert amounts == {p.name: [t.amount for t in p.tokens] for p in pools}
+        assert orders == [[p.name for e in route.edges for p in e.pools] for route in routes]
+
+    def test_3(self):
+        tokens = [PoolToken(token="BTC", amount=10), PoolToken(token="ETH", amount=130)]
+        edge = Edge("BTC", "ETH", [Pool("small", 0.01, tokens), make_pool()])
+
+        # NOTE: pools are ranked on a copy, the shared edge keeps its order
+        for overlay in [None, SwapOverlay()]:
+            _, splits, _ = edge.swap(10, optimal_lv=3, overlay=overlay)
+            assert splits["pool"] > splits.get("small", 0)
+            assert [p.name for p in edge.pools] == ["small", "pool"]
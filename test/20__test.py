@@ -0,0 +1,51 @@
+import pickle
+from test.mock import mock
+from unittest import TestCase
+
+from sor import construct_path
+from sor import find_routes
+from sor import RouteModel
+
+
+class SlottedRouteTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Slotted Routes *************************")
+
+    def test_1(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=4)
+        tokens = ["BTC", "USDC", "ETH"]
+        route = construct_path(tokens, token_pairs_pools, pool_map)
+        same = construct_path(tokens, token_pairs_pools, pool_map)
+
+        assert route == same and hash(route) == hash(same)
+        assert len(set(routes)) == len(routes)
+        assert all(p is pool_map[p.name] for e in route.edges for p in e.pools)
+
+        # NOTE: the hash does not depend on the order of the pools
+        before = hash(route)
+        route.swap(10, optimal_lv=3)
+        assert hash(route) == before == hash(same)
+
+        with self.assertRaises(AttributeError):
+            route.edges = ()
+
+        with self.assertRaises(AttributeError):
+            route.edges[0].token_in = "ETH"
+
+        assert pickle.loads(pickle.dumps(route)) == route
+
+    def test_2(self):
+        _, _, pool_map, token_pairs_pools = mock()
+        route = construct_path(["BTC", "USDC", "ETH"], token_pairs_pools, pool_map)
+
+        model = route.to_model()
+        assert '"token_in": "BTC"' in model.json()
+        assert model.to_route() == route
+        assert model.to_route().swap(10, optimal_lv=3)[0] == route.swap(10, optimal_lv=3)[0]
+
+        edges = [e.to_model() for e in reversed(route.edges)]
+        with self.assertRaises(ValueError):
+            RouteModel(edges=edges)
@@ -0,0 +1,106 @@
+from test.mock import mock
+from unittest import TestCase
+
+import numpy as np
+
+from sor import amm_swap_fixed
+from sor import batch_split
+from sor import calc_amount_out_on_multi_routes
+from sor import find_routes
+from sor import from_units
+from sor import Pool
+from sor import PoolStateTable
+from sor import PoolToken
+from sor import SmartOrderRouter
+from sor import to_units
+
+
+class FixedPointTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Fixed-Point Amounts ********************")
+
+    def test_1(self):
+        assert to_units("BTC", 1.5) == 150_000_000
+        assert from_units("USDC", 2_500_000) == 2.5
+        assert amm_swap_fixed(10, 100, 1000) == 90
+        assert amm_swap_fixed(0, 0, 1000) == 0
+
+        tokens = [PoolToken(token="BTC", amount=100), PoolToken(token="ETH", amount=1300)]
+        pool = Pool("pool", 0.01, tokens)
+
+        for amount in [0.001, 1, 10, 250]:
+            units = pool.swap_fixed("BTC", to_units("BTC", amount), "ETH")
+            assert isinstance(units, int)
+            assert abs(from_units("ETH", units) - pool.swap("BTC", amount, "ETH")) < 1e-5
+
+    def test_2(self):
+        volume = to_units("BTC", 10)
+        splits = batch_split(volume, 3, optimal_lv=7, fixed=True)
+        assert all(isinstance(v, int) for s in splits for v in s)
+        assert all(sum(s) == volume for s in splits)
+        assert len({tuple(s) for s in splits}) == len(splits)
+
+    def test_3(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+
+        for route in routes:
+            expected, _, _ = route.swap(10, optimal_lv=4, mode="grid")
+            units, path_splits, _ = route.swap(to_units("BTC", 10), optimal_lv=4, fixed=True)
+            assert abs(from_units("ETH", units) - expected) < 1e-3
+            assert all(isinstance(v, int) for split in path_splits for v in split.values())
+
+        for amount in [1, 10, 33.3]:
+            grid = SmartOrderRouter(optimal_lv=4, mode="grid")
+            fixed = SmartOrderRouter(optimal_lv=4, mode="grid", fixed=True)
+            grid.dexes, _, _, _ = mock()
+            fixed.dexes, _, _, _ = mock()
+            expected, expected_allocations = grid.find_best_price_out("BTC", amount, "ETH")
+            result, allocations = fixed.find_best_price_out("BTC", amount, "ETH")
+            assert abs(result - expected) < 1e-3
+            assert len(allocations) == len(expected_allocations)
+
+            for (dex, volume), (expected_dex, expected_volume) in zip(
+                allocations, expected_allocations
+            ):
+                assert dex.name == expected_dex.name
+                assert abs(volume - expected_volume) < 1e-3
+
+    def test_4(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+        table = PoolStateTable(pools)
+        volume = to_units("BTC", 10)
+
+        # NOTE: fixed-point amounts are orthogonal to the split mode
+        for mode in ["grid", "vectorized", "water_fill", "adaptive"]:
+            expected = calc_amount_out_on_multi_routes(routes, 10, optimal_lv=4, mode=mode)
+            result = calc_amount_out_on_multi_routes(
+                routes, volume, optimal_lv=4, mode=mode, table=table, fixed=True
+            )
+            assert isinstance(result[0], int)
+            assert abs(from_units("ETH", result[0]) - expected[0]) < 1e-3
+            assert sum(result[1]) == volume
+            assert all(
+                isinstance(value, int)
+                for route_split in result[2]
+                for edge_split in route_split
+                for value in edge_split.values()
+            )
+
+            # NOTE: the integer reserves of the table give the swaps of the pools
+            assert result == calc_amount_out_on_multi_routes(
+                routes, volume, optimal_lv=4, mode=mode, fixed=True
+            )
+
+        tokens = [PoolToken(token="BTC", amount=100), PoolToken(token="ETH", amount=1300)]
+        pool = Pool("pool", 0.01, tokens)
+        table = PoolStateTable([pool])
+        assert table.units.tolist() == [to_units("BTC", 100), to_units("ETH", 1300)]
+        pool.update_reserves({"BTC": 120})
+        table.sync(pool)
+        assert table.units[0] == to_units("BTC", 120)
+        swapped = table.swap_fixed(np.array([0]), "BTC", to_units("BTC", 3), "ETH")[0]
+        assert swapped == pool.swap_fixed("BTC", to_units("BTC", 3), "ETH")
@@ -0,0 +1,91 @@
+from test.mock import mock
+from unittest import TestCase
+
+from sor import calc_amount_out_on_multi_routes
+from sor import find_routes
+from sor import log_buckets
+from sor import PoolStateTable
+from sor import price_plan
+from sor import quote_plan
+from sor import QuoteCache
+from sor import SmartOrderRouter
+from sor import to_units
+
+
+class QuoteCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Quote Cache ****************************")
+
+    def test_1(self):
+        bucket = log_buckets(1.1)
+        assert bucket(10) == bucket(10.5)
+        assert bucket(10) != bucket(12)
+        assert bucket(0) is None
+
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+        result = calc_amount_out_on_multi_routes(routes, 10, optimal_lv=4)
+        plan = quote_plan(routes, 10, result)
+        priced = price_plan(routes, plan, 10)
+        assert abs(priced[0] - result[0]) < 1e-3
+        assert [str(r) for r in priced[4]] == [str(r) for r in result[4]]
+
+    def test_2(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+        quote_cache = QuoteCache(bucket=log_buckets(1.05))
+
+        for amount in [10, 10.1, 10.2, 10.3]:
+            expected = calc_amount_out_on_multi_routes(routes, amount, optimal_lv=4)[0]
+            result = calc_amount_out_on_multi_routes(
+                routes, amount, optimal_lv=4, quote_cache=quote_cache
+            )[0]
+            assert abs(result - expected) <= expected * 1e-3
+
+        assert quote_cache.misses == 1
+        assert quote_cache.hits == 3
+
+    def test_3(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(optimal_lv=4, mode="grid", quote_buckets=1.05)
+        router.dexes = dexes
+        first, _ = router.find_best_price_out("BTC", 10, "ETH")
+        second, allocations = router.find_best_price_out("BTC", 10.2, "ETH")
+        assert second > first and allocations
+        assert router.quote_cache.hits == 1
+
+        # NOTE: a reserve update drops the plans reading that pool
+        router.graph.update_reserves("pool3", {"BTC": 20})
+        updated, _ = router.find_best_price_out("BTC", 10.2, "ETH")
+        assert router.quote_cache.stales == 1
+
+        fresh = SmartOrderRouter(optimal_lv=4, mode="grid")
+        fresh.dexes = router.dexes
+        assert updated == fresh.find_best_price_out("BTC", 10.2, "ETH")[0]
+
+    def test_4(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=3)
+        table = PoolStateTable(pools)
+
+        # NOTE: integer shares give back the exact splits of the quoted amount
+        for amount in [to_units("BTC", 10), to_units("BTC", 3.3)]:
+            result = calc_amount_out_on_multi_routes(
+                routes, amount, optimal_lv=4, table=table, fixed=True
+            )
+            plan = quote_plan(routes, amount, result, fixed=True)
+            priced = price_plan(routes, plan, amount, fixed=True, table=table)
+            assert priced[0] == result[0]
+            assert priced[2:4] == result[2:4]
+            assert all(isinstance(v, int) for s in priced[2] for e in s for v in e.values())
+
+        # NOTE: a plan is priced on the state source it is given
+        result = calc_amount_out_on_multi_routes(routes, 10, optimal_lv=4, table=table)
+        plan = quote_plan(routes, 10, result)
+        expected = price_plan(routes, plan, 10, table=table)[0]
+        pool = plan[0][2][-1][0][0]
+        pool.update_reserves({token.token: token.amount / 2 for token in pool.tokens})
+        assert price_plan(routes, plan, 10, table=table)[0] == expected
+        assert price_plan(routes, plan, 10)[0] < expected
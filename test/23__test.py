@@ -0,0 +1,129 @@
+from test.mock import mock
+from unittest import TestCase
+
+import numpy as np
+
+from sor import calc_amount_out_curve
+from sor import calc_amount_out_on_multi_routes
+from sor import find_routes
+from sor import SmartOrderRouter
+from sor import water_fill
+from sor import water_fill_many
+
+AMOUNTS = [0, 0.5, 1, 3, 10, 25, 60]
+
+
+def disjoint_routes(routes):
+    used, picked = set(), []
+
+    for route in routes:
+        names = route.pool_names()
+
+        if not used & set(names) and len(set(names)) == len(names):
+            picked.append(route)
+            used |= set(names)
+
+    return picked
+
+
+class QuoteCurveTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Quote Curves ***************************")
+
+    def test_1(self):
+        _, pools, _, _ = mock()
+        btc_eth = [p for p in pools if p.get_token("BTC") and p.get_token("ETH")]
+        result = water_fill_many(np.array(AMOUNTS, dtype=float), "BTC", "ETH", btc_eth)
+
+        for amount, amount_out in zip(AMOUNTS, result.tolist()):
+            expected, _ = water_fill(amount, "BTC", "ETH", btc_eth)
+            assert abs(amount_out - expected) < 1e-4
+
+    def test_2(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+        routes = find_routes("BTC", "ETH", pools, token_pairs_pools, pool_map, max_hop=4)
+        picked = disjoint_routes(routes)
+        assert len(picked) > 1
+
+        # NOTE: pool-disjoint routes are scored at once, others quoted one by one
+        for candidates in [picked, routes[:4]]:
+            for mode in ["water_fill", "grid"]:
+                curve = calc_amount_out_curve(candidates, AMOUNTS, optimal_lv=4, mode=mode)
+                assert len(curve) == len(AMOUNTS)
+
+                for amount, result in zip(AMOUNTS, curve):
+                    expected = calc_amount_out_on_multi_routes(
+                        candidates, amount, optimal_lv=4, mode=mode
+                    )
+                    assert abs(result[0] - expected[0]) < 1e-4
+                    assert abs(result[0] - sum(result[3])) < 1e-9
+                    assert [str(r) for r in result[4]] == [str(r) for r in expected[4]]
+
+    def test_3(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(optimal_lv=4)
+        router.dexes = dexes
+        curve = router.find_best_price_out_curve("BTC", AMOUNTS, "ETH")
+        assert curve[0] == (-1, [])
+
+        for amount, (amount_out, allocations) in zip(AMOUNTS[1:], curve[1:]):
+            expected, expected_allocations = router.find_best_price_out("BTC", amount, "ETH")
+            assert abs(amount_out - expected) < 1e-4
+            assert [d.name for d, _ in allocations] == [
+                d.name for d, _ in expected_allocations
+            ]
+
+        outs = [amount_out for amount_out, _ in curve[1:]]
+        assert outs == sorted(outs)
+
+    def test_4(self):
+        _, pools, pool_map, token_pairs_pools = mock()
+
+        # NOTE: routes sharing pools are scored at once, ignoring the visited pools per cell
+        for token_in, token_out in [("BTC", "ETH"), ("USDC", "ETH"), ("SOL", "USDT")]:
+            routes = find_routes(
+                token_in, token_out, pools, token_pairs_pools, pool_map, max_hop=3
+            )
+            names = [name for route in routes for name in route.pool_names()]
+            assert len(set(names)) < len(names)
+
+            for mode in ["water_fill", "grid", "vectorized"]:
+                curve = calc_amount_out_curve(routes, AMOUNTS, optimal_lv=4, mode=mode)
+
+                for amount, result in zip(AMOUNTS, curve):
+                    expected = calc_amount_out_on_multi_routes(
+                        routes, amount, optimal_lv=4, mode=mode
+                    )
+                    assert abs(result[0] - expected[0]) < 1e-6
+                    assert result[2] == expected[2]
+                    assert [str(r) for r in result[4]] == [str(r) for r in expected[4]]
+
+    def test_5(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(optimal_lv=4, max_routes=2, quote_buckets=1.05)
+        router.dexes = dexes
+        reference = SmartOrderRouter(optimal_lv=4, max_routes=2)
+        reference.dexes = dexes
+
+        # NOTE: amounts are quoted over the routes `max_routes` selects for each of them
+        curve = router.find_best_price_out_curve("USDC", AMOUNTS, "ETH")
+        assert curve[0] == (-1, [])
+        assert router.quote_cache.hits == 0
+
+        for amount, (amount_out, allocations) in zip(AMOUNTS[1:], curve[1:]):
+            expected, expected_allocations = reference.find_best_price_out(
+                "USDC", amount, "ETH"
+            )
+            assert abs(amount_out - expected) < 1e-6
+            assert allocations == expected_allocations
+
+        # NOTE: the curve records the plans of its amounts for the next quotes
+        amount_out, _ = router.find_best_price_out("USDC", 10.01, "ETH")
+        assert router.quote_cache.hits == 1
+        assert abs(amount_out - reference.find_best_price_out("USDC", 10.01, "ETH")[0]) < 1e-3
+
+        again = router.find_best_price_out_curve("USDC", AMOUNTS, "ETH")
+        assert router.quote_cache.hits == 1 + len(AMOUNTS) - 1
+        assert [a for a, _ in again] == [a for a, _ in curve]
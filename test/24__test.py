@@ -0,0 +1,137 @@
+from random import Random
+from test.mock import mock
+from unittest import TestCase
+
+from sor import best_rates_to
+from sor import find_routes
+from sor import metrics
+from sor import PoolGraph
+from sor import SmartOrderRouter
+from sor import SpotRateMatrix
+
+
+def same_rates(matrix: SpotRateMatrix, graph: PoolGraph):
+    fresh = SpotRateMatrix(PoolGraph.restore(graph.pool_map, graph.token_pairs_pools, {}))
+    fresh.max_edges = matrix.max_edges
+    return all(
+        abs(matrix.rate(a, b) - fresh.rate(a, b)) <= 1e-9 * fresh.rate(a, b)
+        for a in fresh.tokens
+        for b in fresh.tokens
+    )
+
+
+class SpotRateTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Spot Rate Matrix ***********************")
+
+    def test_1(self):
+        dexes, _, _, _ = mock()
+        graph = PoolGraph(dexes)
+        matrix = SpotRateMatrix(graph, max_edges=3)
+        args = (graph.pool_list, graph.token_pairs_pools, graph.pool_map)
+
+        for token_out in matrix.tokens:
+            expected = best_rates_to(token_out, graph.token_pairs_pools, graph.pool_map, 3)
+            for hops, rates in enumerate(matrix.rates_to(token_out)):
+                assert rates.keys() == expected[hops].keys()
+                assert all(abs(r - expected[hops][t]) <= 1e-9 * r for t, r in rates.items())
+
+        # NOTE: no route quotes above the rate, the bounds prune the same routes
+        for route in find_routes("BTC", "ETH", *args, max_hop=4):
+            amount_out, _, _ = route.swap(1, optimal_lv=3)
+            assert amount_out <= matrix.rate("BTC", "ETH")
+
+        rates_to = matrix.rates_to("ETH")
+        routes = find_routes("BTC", "ETH", *args, max_hop=4, amount_in=1)
+        bounded = find_routes("BTC", "ETH", *args, max_hop=4, amount_in=1, rates_to=rates_to)
+        assert [str(r) for r in routes] == [str(r) for r in bounded]
+
+    def test_2(self):
+        dexes, _, _, _ = mock()
+        graph = PoolGraph(dexes)
+        matrix = SpotRateMatrix(graph, max_edges=3)
+        pairs = [(a, b) for a in matrix.tokens for b in matrix.tokens]
+
+        with metrics.instrument() as stats:
+            # NOTE: an update leaving the pair rates as they were recomputes nothing
+            pool = graph.pool_map["pool3"]
+            graph.update_reserves("pool3", {t.token: t.amount for t in pool.tokens})
+            assert "spot_rate_rows" not in stats.counters
+
+            # NOTE: a moved pair only recomputes the rows it went through
+            btc = graph.pool_map["pool1"].get_token("BTC")
+            graph.update_reserves("pool1", {"BTC": btc.amount * 2})
+            assert 0 < stats.counters["spot_rate_rows"] < len(matrix.tokens)
+
+            graph.update_reserves("pool3", {"BTC": 20})
+            graph.remove_pool("pool1")
+            rates = [matrix.rate(a, b) for a, b in pairs]
+
+            # NOTE: lookups never rebuild the products
+            assert "SpotRateMatrix.refresh" not in stats.calls
+
+        assert same_rates(matrix, graph)
+        assert rates == [matrix.rate(a, b) for a, b in pairs]
+
+    def test_3(self):
+        dexes, _, _, _ = mock()
+        router = SmartOrderRouter(max_hop=2, optimal_lv=3)
+        router.dexes = dexes
+
+        for amount in [0.001, 1, 10]:
+            amount_out, _ = router.find_best_price_out("BTC", amount, "ETH")
+            estimate = router.estimate_price_out("BTC", amount, "ETH")
+            assert amount_out <= estimate
+
+        # NOTE: small quotes tend to the spot rate
+        small, _ = router.find_best_price_out("BTC", 0.001, "ETH")
+        assert abs(small - router.estimate_price_out("BTC", 0.001, "ETH")) < 1e-2
+        assert router.spot_rate("BTC", "ETH") == router.spot_rates.rate("BTC", "ETH")
+
+    def test_4(self):
+        dexes, _, _, _ = mock()
+        graph = PoolGraph(dexes)
+        matrices = [SpotRateMatrix(graph, max_edges=hops) for hops in [1, 2, 3]]
+        random = Random(7)
+
+        # NOTE: raised & lowered pairs propagate to the same rates as a rebuild
+        for _ in range(50):
+            pool = random.choice(graph.pool_list)
+            reserves = {t.token: t.amount * random.uniform(0.2, 5) for t in pool.tokens}
+            graph.update_reserves(pool.name, reserves)
+            assert all(same_rates(matrix, graph) for matrix in matrices)
+
+        for name in ["pool4", "pool9", "pool8"]:
+            graph.remove_pool(name)
+            assert all(same_rates(matrix, graph) for matrix in matrices)
+
+        assert matrices[0].rate("USDC", "ETH") == 0
+
+    def test_5(self):
+        router = SmartOrderRouter(max_hop=3, optimal_lv=3, max_routes=2)
+        assert router.spot_rate("BTC", "ETH") == 0
+        assert router.estimate_price_out("BTC", 1, "ETH") == 0
+
+        dexes, _, _, _ = mock()
+        router.dexes = dexes
+        graph = router.graph
+        args = (graph.pool_list, graph.token_pairs_pools, graph.pool_map)
+
+        # NOTE: quotes with `max_routes` run the branch & bound on the live spot rates
+        for reserves in [{}, {"BTC": 30}, {"BTC": 3}]:
+            graph.update_reserves("pool1", reserves)
+
+            for amount in [0.1, 1, 10]:
+                routes = router.find_routes("BTC", amount, "ETH")
+                expected = find_routes(
+                    "BTC", "ETH", *args, max_hop=3, amount_in=amount, max_routes=2
+                )
+                assert [str(r) for r in routes] == [str(r) for r in expected]
+
+                amount_out, _ = router.find_best_price_out("BTC", amount, "ETH")
+                assert amount_out <= router.estimate_price_out("BTC", amount, "ETH")
+
+        # NOTE: bounded routes depend on the amount, they are not cached
+        assert len(router.route_index) == 0
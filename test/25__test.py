@@ -0,0 +1,100 @@
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from typer.testing import CliRunner
+
+from bench import busiest_pair
+from bench import generate_market
+from bench import grid_size
+from bench import percentile
+from bench import run_benchmarks
+from bench import write_report
+from bench.__main__ import cli
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        print("----------------------------------------------------------")
+        print("********* Testing Benchmark Suite ************************")
+
+    def test_1(self):
+        dexes = generate_market(token_count=5, pool_count=80, pools_per_pair=3, seed=7)
+        again = generate_market(token_count=5, pool_count=80, pools_per_pair=3, seed=7)
+        other = generate_market(token_count=5, pool_count=80, pools_per_pair=3, seed=8)
+
+        # NOTE: the same seed gives the same market
+        assert [d.dict() for d in dexes] == [d.dict() for d in again]
+        assert [d.dict() for d in dexes] != [d.dict() for d in other]
+
+        pools = [pool for dex in dexes for pool in dex.pools]
+        tokens = {t.token for pool in pools for t in pool.tokens}
+        pairs = [tuple(sorted(t.token for t in pool.tokens)) for pool in pools]
+        assert len(tokens) <= 5
+        assert max(pairs.count(pair) for pair in pairs) <= 3
+        assert all(dex.pools for dex in dexes)
+
+        pair = busiest_pair(dexes)
+        two_token_pairs = [p for p in pairs if len(p) == 2]
+        assert two_token_pairs.count(pair) == max(two_token_pairs.count(p) for p in pairs)
+
+        with self.assertRaises(ValueError):
+            generate_market(token_count=1)
+
+    def test_2(self):
+        assert percentile([3, 1, 2], 50) == 2
+        assert percentile([3, 1, 2], 99) == 3
+        assert grid_size(1, 5) == 1
+        assert grid_size(3, 5) == 36
+
+        records = run_benchmarks(
+            generate_market(pool_count=40, seed=1),
+            max_hops=[3],
+            optimal_lvs=[2, 50],
+            modes=["grid", "water_fill"],
+            max_candidates=1000,
+            iterations=2,
+        )
+        stages = {record["stage"] for record in records}
+        assert stages == {
+            "find_routes",
+            "Edge.swap",
+            "Route.swap",
+            "calc_amount_out_on_multi_routes",
+        }
+
+        for record in records:
+            if record.get("skipped"):
+                # NOTE: grids over `max_candidates` are skipped, not run
+                assert record["candidates"] > 1000
+                assert "p50_ms" not in record
+            else:
+                assert record["iterations"] == 2
+                assert 0 <= record["p50_ms"] <= record["p99_ms"]
+
+        assert any(record.get("skipped") for record in records)
+
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            write_report(path, records, seed=1)
+
+            with open(path) as f:
+                report = json.load(f)
+
+        assert report["meta"]["seed"] == 1
+        assert report["results"] == json.loads(json.dumps(records))
+
+    def test_3(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.json")
+            options = ["--pools", "30", "--iterations", "1", "--max-hop", "3"]
+            result = CliRunner().invoke(cli, [*options, "--output", path])
+
+            with open(path) as f:
+                report = json.load(f)
+
+        assert result.exit_code == 0, result.output
+        assert report["meta"]["market"]["pool_count"] == 30
+        assert report["results"]
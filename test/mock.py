@@ -1,4 +1,8 @@
+import asyncio
+from fnmatch import fnmatchcase
+from typing import Dict
 from typing import List
+from typing import Optional
 from typing import Tuple
 
 from sor import determine_token_pair_pools
@@ -66,3 +70,118 @@ def mock() -> Tuple[List[Dex], List[Pool], PoolMap, TokenPairsPools]:
     token_pairs_pools = determine_token_pair_pools(dexes)
     pools, pool_map = map_pool_by_name(dexes)
     return dexes, pools, pool_map, token_pairs_pools
+
+
+class MockPipeline:
+    def __init__(self, redis: "MockRedis"):
+        self._redis = redis
+        self._commands: List[str] = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        self._commands.clear()
+
+    def zrange(self, key: str, start: int, end: int):
+        self._commands.append(key)
+        return self
+
+    async def execute(self) -> List[List[str]]:
+        redis = self._redis
+        redis.round_trips += 1
+        redis.in_flight += 1
+        redis.max_in_flight = max(redis.max_in_flight, redis.in_flight)
+        await asyncio.sleep(0)
+        redis.in_flight -= 1
+        return [list(redis.data.get(key, [])) for key in self._commands]
+
+
+class MockRedis:
+    """In-process stand-in of the aioredis client, counting round-trips"""
+
+    def __init__(self, data: Optional[Dict[str, List[str]]] = None):
+        self.data = data or {}
+        self.round_trips = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.channels: Dict[str, List[asyncio.Queue]] = {}
+        self.streams: Dict[str, List[Tuple[str, Dict[str, str]]]] = {}
+
+    async def keys(self, pattern: str) -> List[str]:
+        self.round_trips += 1
+        return [key for key in self.data if fnmatchcase(key, pattern)]
+
+    async def zrange(self, key: str, start: int, end: int) -> List[str]:
+        self.round_trips += 1
+        return list(self.data.get(key, []))
+
+    async def scan_iter(self, match: str, count: int):
+        keys = list(self.data)
+
+        for start in range(0, len(keys), count):
+            end = start + count
+            self.round_trips += 1
+
+            for key in keys[start:end]:
+                if fnmatchcase(key, match):
+                    yield key
+
+    def pipeline(self, transaction=True):
+        return MockPipeline(self)
+
+    def pubsub(self):
+        return MockPubSub(self)
+
+    async def publish(self, channel: str, message: str) -> int:
+        queues = self.channels.get(channel, [])
+
+        for queue in queues:
+            queue.put_nowait({"type": "message", "channel": channel, "data": message})
+
+        return len(queues)
+
+    async def xadd(self, stream: str, fields: Dict[str, str]) -> str:
+        entries = self.streams.setdefault(stream, [])
+        message_id = f"{len(entries) + 1}-0"
+        entries.append((message_id, fields))
+        return message_id
+
+    async def xrevrange(self, stream: str, count: int):
+        self.round_trips += 1
+        return list(reversed(self.streams.get(stream, [])))[:count]
+
+    async def xread(self, streams: Dict[str, str], count: int, block: int):
+        self.round_trips += 1
+        result = []
+
+        for stream, last_id in streams.items():
+            entries = self.streams.get(stream, [])
+            start = len(entries) if last_id == "$" else int(last_id.split("-")[0])
+
+            if start < len(entries):
+                end = start + count
+                result.append((stream, entries[start:end]))
+
+        if not result:
+            # NOTE: a blocking read gives the other tasks a turn
+            await asyncio.sleep(0)
+
+        return result
+
+
+class MockPubSub:
+    def __init__(self, redis: MockRedis):
+        self._redis = redis
+        self._queue: asyncio.Queue = asyncio.Queue()
+
+    async def subscribe(self, channel: str):
+        self._redis.channels.setdefault(channel, []).append(self._queue)
+        self._queue.put_nowait({"type": "subscribe", "channel": channel, "data": 1})
+
+    async def unsubscribe(self, channel: str):
+        self._redis.channels[channel].remove(self._queue)
+
+    async def listen(self):
+        while True:
+            yield await self._queue.get()